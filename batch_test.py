@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+
+import pydantic
+import pykka
+
+import conclib
+from conclib.errors import (
+    ActorNotFoundError,
+    AskTimeoutError,
+    ClientClosedError,
+    RemoteActorError,
+)
+
+OTHER_URN = "batch_test_other"
+MISSING_URN = "batch_test_missing"
+
+
+class AddRequest(conclib.ActorMessage):
+    value: int
+
+
+class SleepRequest(conclib.ActorMessage):
+    seconds: float
+
+
+class FailRequest(conclib.ActorMessage):
+    pass
+
+
+class TotalQuery(conclib.ActorMessage):
+    pass
+
+
+class TotalResponse(conclib.ActorMessage):
+    total: int
+
+
+class NameResponse(conclib.ActorMessage):
+    name: str
+
+
+class CounterActor(conclib.Actor):
+    URN = "batch_test"
+
+    def __init__(self, urn: str | None = None):
+        super().__init__(urn)
+        self.total = 0
+
+    @conclib.handles(AddRequest)
+    def on_add(self, message: AddRequest) -> TotalResponse:
+        self.total += message.value
+        return TotalResponse(total=self.total)
+
+    @conclib.handles(SleepRequest)
+    def on_sleep(self, message: SleepRequest) -> TotalResponse:
+        time.sleep(message.seconds)
+        return TotalResponse(total=self.total)
+
+    @conclib.handles(FailRequest)
+    def on_fail(self, message: FailRequest) -> TotalResponse:
+        raise ValueError("boom")
+
+    @conclib.handles(TotalQuery)
+    def on_total(self, message: TotalQuery) -> TotalResponse:
+        return TotalResponse(total=self.total)
+
+
+# One item per way a request in a batch can end. Each one only affects its own result.
+ASKS = [
+    (CounterActor.URN, AddRequest(value=1), TotalResponse),
+    (OTHER_URN, AddRequest(value=10), TotalResponse),
+    (CounterActor.URN, FailRequest(), TotalResponse),
+    (CounterActor.URN, AddRequest(value=2), NameResponse),
+    (MISSING_URN, TotalQuery(), TotalResponse),
+    (OTHER_URN, SleepRequest(seconds=1), TotalResponse),
+    (CounterActor.URN, AddRequest(value=3), TotalResponse),
+]
+ASK_TIMEOUT = 0.5
+
+TELLS = [
+    (CounterActor.URN, AddRequest(value=100)),
+    (MISSING_URN, AddRequest(value=1)),
+    (OTHER_URN, AddRequest(value=100)),
+    (CounterActor.URN, FailRequest()),
+    (CounterActor.URN, AddRequest(value=100)),
+]
+TOTALS = [
+    (CounterActor.URN, TotalQuery(), TotalResponse),
+    (OTHER_URN, TotalQuery(), TotalResponse),
+]
+
+
+def check_ask_results(results: list):
+    assert len(results) == len(ASKS), results
+    added, other, failed, invalid, missing, slow, last = results
+    assert added == TotalResponse(total=1), added
+    assert other == TotalResponse(total=10), other
+    assert isinstance(failed, RemoteActorError) and "boom" in str(failed), failed
+    # The handler ran, only extracting its response failed
+    assert isinstance(invalid, pydantic.ValidationError), invalid
+    assert isinstance(missing, ActorNotFoundError), missing
+    assert isinstance(slow, AskTimeoutError), slow
+    assert last == TotalResponse(total=6), last
+
+
+def check_tell_results(results: list):
+    # Tells are handled in order with later asks, and errors don't reach the sender
+    assert results == [TotalResponse(total=206), TotalResponse(total=110)], results
+
+
+def start_actors():
+    CounterActor.start()
+    CounterActor.start(OTHER_URN)
+
+
+def stop_actors():
+    for urn in (CounterActor.URN, OTHER_URN):
+        actor_ref = pykka.ActorRegistry.get_by_urn(urn)
+        if actor_ref is not None:
+            actor_ref.stop()
+
+
+def check_sync(config: conclib.ConclibConfig, force_redis: bool):
+    start_actors()
+    client = conclib.ProxyClient(config=config, force_redis=force_redis)
+    try:
+        assert client.ask_many([]) == []
+        check_ask_results(client.ask_many(ASKS, timeout=ASK_TIMEOUT))
+        client.tell_many(TELLS)
+        check_tell_results(client.ask_many(TOTALS, timeout=5))
+        # Fire-and-forget requests and finished asks leave nothing behind
+        assert not client._pending, client._pending
+    finally:
+        client.close()
+        stop_actors()
+
+
+def check_close(config: conclib.ConclibConfig):
+    """Closing a client fails the asks still waiting on it instead of leaving them hung"""
+    start_actors()
+    sleep = SleepRequest(seconds=1)
+    results = []
+
+    def wait(ask):
+        try:
+            results.append(ask())
+        except ClientClosedError as e:
+            results.append(e)
+
+    try:
+        with conclib.ProxyClient(config=config, force_redis=True) as client:
+            asks = [
+                lambda: client.ask_actor(OTHER_URN, sleep, TotalResponse),
+                lambda: list(client.ask_stream(OTHER_URN, sleep, TotalResponse)),
+                lambda: client.ask_many([(OTHER_URN, sleep, TotalResponse)])[0],
+            ]
+            threads = [threading.Thread(target=wait, args=(ask,)) for ask in asks]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while len(client._pending) + len(client._streams) < len(asks):
+                assert time.monotonic() < deadline, "Timed out"
+                time.sleep(0.01)
+        # Well before the first of the slow responses arrives
+        for thread in threads:
+            thread.join(timeout=0.5)
+            assert not thread.is_alive()
+        assert len(results) == len(asks), results
+        assert all(isinstance(result, ClientClosedError) for result in results), results
+        assert not client._pending and not client._streams
+    finally:
+        stop_actors()
+
+
+def check_async(config: conclib.ConclibConfig, force_redis: bool):
+    async def run():
+        async with conclib.AsyncProxyClient(
+            config=config, force_redis=force_redis
+        ) as client:
+            assert await client.ask_many([]) == []
+            check_ask_results(await client.ask_many(ASKS, timeout=ASK_TIMEOUT))
+            await client.tell_many(TELLS)
+            check_tell_results(await client.ask_many(TOTALS, timeout=5))
+            assert not client._pending, client._pending
+
+    start_actors()
+    try:
+        asyncio.run(run())
+    finally:
+        stop_actors()
+
+
+def main():
+    config = conclib.DefaultConfig()
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        for force_redis in (True, False):
+            check_sync(config, force_redis)
+            check_async(config, force_redis)
+        check_close(config)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
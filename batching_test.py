@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pykka
+
+import conclib
+from conclib.errors import RemoteActorError
+
+
+class GateMessage(conclib.ActorMessage):
+    pass
+
+
+class StoreRequest(conclib.ActorMessage):
+    value: int
+
+
+class Stored(conclib.ActorMessage):
+    value: int
+    batch_size: int
+
+
+class BatchSizesQuery(conclib.ActorMessage):
+    pass
+
+
+class ForgetRequest(conclib.ActorMessage):
+    pass
+
+
+class WriterActor(conclib.BatchingActor):
+    URN = "batching_test"
+    BATCH_SIZE = 50
+
+    def __init__(self, release: threading.Event, waiting: threading.Event):
+        super().__init__()
+        self.release = release
+        self.waiting = waiting
+        self.batch_sizes = []
+        self.stored = []
+
+    def on_receive_batch(self, messages: list) -> list | None:
+        if any(isinstance(m, ForgetRequest) for m in messages):
+            return None
+        if any(isinstance(m, GateMessage) for m in messages):
+            self.waiting.set()
+            self.release.wait()
+            return [None] * len(messages)
+        if any(isinstance(m, BatchSizesQuery) for m in messages):
+            return [
+                self.batch_sizes if isinstance(m, BatchSizesQuery) else None
+                for m in messages
+            ]
+        if any(m.value < 0 for m in messages):
+            raise ValueError("negative value in batch")
+        self.batch_sizes.append(len(messages))
+        results = []
+        for message in messages:
+            if message.value == 13:
+                # Fails this message only
+                results.append(ValueError("unlucky"))
+                continue
+            self.stored.append(message.value)
+            results.append(Stored(value=message.value, batch_size=len(messages)))
+        return results
+
+
+class WaitingWriterActor(WriterActor):
+    URN = "batching_test_waiting"
+    BATCH_WAIT = 0.2
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    release = threading.Event()
+    waiting = threading.Event()
+    try:
+        conclib.start_proxy(config=config)
+        actor_ref = WriterActor.start(release, waiting)
+
+        # Messages that queue up while a batch is handled are handled as one batch, and
+        # every request gets its own response
+        actor_ref.tell(GateMessage())
+        assert waiting.wait(timeout=5)
+        client = conclib.ProxyClient(config=config, force_redis=True)
+        requests = [
+            (WriterActor.URN, StoreRequest(value=i), Stored) for i in range(120)
+        ]
+        sender = threading.Thread(
+            target=lambda: results.extend(client.ask_many(requests, timeout=10))
+        )
+        results = []
+        sender.start()
+        while actor_ref.actor_inbox.qsize() < 120:
+            time.sleep(0.01)
+        release.set()
+        sender.join()
+        for i, result in enumerate(results):
+            if i == 13:
+                assert isinstance(result, RemoteActorError), result
+                assert "unlucky" in str(result)
+                continue
+            assert result.value == i, result
+        sizes = actor_ref.ask(BatchSizesQuery(), timeout=5)
+        assert sizes == [50, 50, 20], sizes
+
+        # A pykka ask gets its own result
+        stored = actor_ref.ask(StoreRequest(value=7), timeout=5)
+        assert stored.value == 7 and stored.batch_size == 1, stored
+
+        # An exception from the whole batch goes to every caller, and the actor keeps going
+        try:
+            client.ask_actor(WriterActor.URN, StoreRequest(value=-1), Stored, timeout=5)
+            raise AssertionError("Expected RemoteActorError")
+        except RemoteActorError as e:
+            assert "negative value" in str(e), e
+        assert (
+            client.ask_actor(WriterActor.URN, StoreRequest(value=8), Stored).value == 8
+        )
+
+        # A request without an ActorMessage result gets an error instead of no response
+        for contents in (ForgetRequest(), BatchSizesQuery()):
+            start = time.monotonic()
+            try:
+                client.ask_actor(WriterActor.URN, contents, Stored, timeout=5)
+                raise AssertionError("Expected RemoteActorError")
+            except RemoteActorError as e:
+                assert "instead of an ActorMessage" in str(e), e
+            assert time.monotonic() - start < 1
+
+        # With BATCH_WAIT, a batch waits for more messages
+        waiting_ref = WaitingWriterActor.start(release, waiting)
+        for i in range(5):
+            waiting_ref.tell(StoreRequest(value=i))
+            time.sleep(0.02)
+        # Sent once the batch is handled, so it isn't part of it
+        time.sleep(WaitingWriterActor.BATCH_WAIT * 2)
+        sizes = waiting_ref.ask(BatchSizesQuery(), timeout=5)
+        assert sizes == [5], sizes
+
+        client.close()
+    finally:
+        release.set()
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Bytes on the wire and encode/decode time per message size for each envelope codec.
+
+"legacy" is the path used before codecs existed: model_dump_json() to encode, and
+json.loads() + RequestEnvelope(**data) to decode. Codecs whose library isn't installed
+are skipped. Doesn't need redis.
+
+    python -m benchmarks.codec_benchmark
+"""
+
+import argparse
+import json
+import timeit
+
+import conclib
+from conclib.proxy import codecs
+from conclib.proxy.envelope import RequestEnvelope
+
+
+class Record(conclib.ActorMessage):
+    id: int
+    name: str
+    score: float
+    tags: list[str]
+
+
+class RecordsMessage(conclib.ActorMessage):
+    records: list[Record]
+
+
+def make_envelope(num_records: int) -> RequestEnvelope:
+    message = RecordsMessage(
+        records=[
+            Record(id=i, name=f"record-{i}", score=i / 7, tags=["a", "bb", "ccc"])
+            for i in range(num_records)
+        ]
+    )
+    return RequestEnvelope(
+        message_id="benchmark-actor-00000000-0000-0000-0000-000000000000",
+        message_type=RecordsMessage.__name__,
+        actor_urn="benchmark-actor",
+        contents=message.model_dump(),
+        reply_to="actor2out/00000000-0000-0000-0000-000000000000",
+    )
+
+
+def legacy_encode(envelope: RequestEnvelope) -> bytes:
+    return envelope.model_dump_json().encode()
+
+
+def legacy_decode(data: bytes) -> RequestEnvelope:
+    return RequestEnvelope(**json.loads(data))
+
+
+def time_per_call(fn, min_time: float) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    repeats = max(3, int(min_time / max(timer.timeit(number) / number, 1e-9) / number))
+    return min(timer.repeat(repeat=min(repeats, 7), number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[0, 10, 100, 1000, 10000],
+        help="number of records per message",
+    )
+    parser.add_argument("--min-time", type=float, default=0.5)
+    args = parser.parse_args()
+
+    available = []
+    for name in codecs.CODEC_CLASSES:
+        try:
+            codecs.get_codec(name)
+            available.append(name)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+
+    header = f"{'records':>8} | {'codec':>8} | {'bytes':>9} | {'encode us':>10} | {'decode us':>10} | {'extract us':>10}"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        envelope = make_envelope(size)
+        rows = [("legacy", legacy_encode, legacy_decode)]
+        for name in available:
+            codec = codecs.get_codec(name)
+            rows.append(
+                (
+                    name,
+                    codec.encode,
+                    lambda data: codecs.decode(data, RequestEnvelope),
+                )
+            )
+        for name, encode, decode in rows:
+            data = encode(envelope)
+            decoded = decode(data)
+            assert decoded.extract(RecordsMessage) == envelope.extract(RecordsMessage)
+            encode_s = time_per_call(lambda: encode(envelope), args.min_time)
+            decode_s = time_per_call(lambda: decode(data), args.min_time)
+            extract_s = time_per_call(
+                lambda: decoded.extract(RecordsMessage), args.min_time
+            )
+            print(
+                f"{size:>8} | {name:>8} | {len(data):>9} | {encode_s * 1e6:>10.1f} | "
+                f"{decode_s * 1e6:>10.1f} | {extract_s * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Compare the event-driven RedisPollingThread loop with the previous sleep-poll loop.
+
+Measures, for each loop:
+- idle CPU: fraction of one core the process uses while the proxy sits idle
+- round-trip latency percentiles for ProxyClient.ask_actor, serial and in bursts
+
+Run from the repo root (starts a local redis-server on the configured port):
+
+    python -m benchmarks.inbound_loop_benchmark
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pykka
+
+import conclib
+from conclib.proxy.actor import RedisPollingThread, RespondingActor
+from conclib.utils.redisd.redisclient import RedisClient
+
+
+class LegacyRedisPollingThread(RedisPollingThread):
+    """The original loop: non-blocking get_message, sleeping 1 ms whenever it is empty"""
+
+    def run(self):
+        self.redis_client = RedisClient(config=self.config)
+        self.redis_client.pubsub.subscribe(self.channel)
+        while True:
+            if self.shutdown_event.is_set():
+                return
+            message = self.redis_client.pubsub.get_message()
+            if message:
+                self.handle_message(message)
+            else:
+                time.sleep(0.001)
+
+
+class LegacyRespondingActor(RespondingActor):
+    polling_thread_class = LegacyRedisPollingThread
+
+
+class PingMessage(conclib.ActorMessage):
+    pass
+
+
+class PongMessage(conclib.ActorMessage):
+    pass
+
+
+class PingActor(conclib.Actor):
+    URN = "inbound_loop_benchmark_ping"
+
+    def on_receive(self, message):
+        if isinstance(message, conclib.RequestEnvelope) and message.matches(
+            PingMessage
+        ):
+            message.respond(PongMessage())
+        else:
+            raise conclib.errors.UnexpectedMessageError(message)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_idle_cpu(seconds: float) -> float:
+    """Fraction of one core used by this process over `seconds` of idling"""
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    time.sleep(seconds)
+    return (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+
+def measure_latency(
+    client: conclib.ProxyClient, requests: int, concurrency: int
+) -> list[float]:
+    def timed_ask(_):
+        start = time.perf_counter()
+        client.ask_actor(PingActor.URN, PingMessage(), response_type=PongMessage)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed_ask, range(requests)))
+
+
+def run_one(
+    name: str,
+    responding_actor_class: type[RespondingActor],
+    config: conclib.ConclibConfig,
+    args: argparse.Namespace,
+) -> dict:
+    responding_actor_class.start(config)
+    PingActor.start()
+    # The actors run in this process, make sure requests still go through the proxy
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    try:
+        # Let startup settle before measuring idle usage
+        time.sleep(0.5)
+        idle_cpu = measure_idle_cpu(args.idle_seconds)
+
+        # Warm up connections and code paths
+        measure_latency(client, requests=100, concurrency=1)
+
+        serial = measure_latency(client, requests=args.requests, concurrency=1)
+        burst = measure_latency(
+            client, requests=args.requests, concurrency=args.concurrency
+        )
+    finally:
+        client.close()
+        pykka.ActorRegistry.stop_all()
+
+    return {
+        "loop": name,
+        "idle_cpu_pct": idle_cpu * 100,
+        "serial_p50_ms": statistics.median(serial) * 1000,
+        "serial_p99_ms": percentile(serial, 99) * 1000,
+        "burst_p50_ms": statistics.median(burst) * 1000,
+        "burst_p99_ms": percentile(burst, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    config = conclib.DefaultConfig()
+    redis_daemon = conclib.start_redis(config=config)
+    results = []
+    try:
+        # The proxy prints on every message, which would dominate the measurement
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name, actor_class in [
+                ("sleep-poll (old)", LegacyRespondingActor),
+                ("event-driven (new)", RespondingActor),
+            ]:
+                results.append(run_one(name, actor_class, config, args))
+                # Make sure the previous proxy threads are gone before starting the next
+                while any(
+                    isinstance(t, RedisPollingThread) for t in threading.enumerate()
+                ):
+                    time.sleep(0.01)
+    finally:
+        redis_daemon.shutdown()
+
+    columns = list(results[0].keys())
+    print(" | ".join(f"{c:>18}" for c in columns))
+    for row in results:
+        print(
+            " | ".join(
+                f"{v:>18.3f}" if isinstance(v, float) else f"{v:>18}"
+                for v in row.values()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
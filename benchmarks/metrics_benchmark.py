@@ -0,0 +1,84 @@
+"""
+Per-message overhead of conclib's metrics.
+
+Sends --messages tells to an actor with metrics enabled and disabled and reports the
+difference per message, then renders the metrics once. Doesn't need redis.
+
+    python -m benchmarks.metrics_benchmark
+"""
+
+import argparse
+import time
+
+import pykka
+
+import conclib
+from conclib import metrics
+
+
+class CountRequest(conclib.ActorMessage):
+    pass
+
+
+class TotalQuery(conclib.ActorMessage):
+    pass
+
+
+class CountingActor(conclib.Actor):
+    URN = "metrics_benchmark"
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    @conclib.handles(CountRequest)
+    def on_count(self, message: CountRequest):
+        self.count += 1
+
+    @conclib.handles(TotalQuery)
+    def on_total(self, message: TotalQuery) -> int:
+        return self.count
+
+
+def measure(actor_ref: pykka.ActorRef, enabled: bool, num_messages: int) -> float:
+    """Seconds per message, from the first tell until the actor has handled the last"""
+    metrics.ENABLED = enabled
+    message = CountRequest()
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        actor_ref.tell(message)
+    actor_ref.ask(TotalQuery())
+    return (time.perf_counter() - start) / num_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    actor_ref = CountingActor.start()
+    try:
+        # Warm up, creates the metric series
+        measure(actor_ref, True, 1000)
+        off, on = [], []
+        for _ in range(args.rounds):
+            off.append(measure(actor_ref, False, args.messages))
+            on.append(measure(actor_ref, True, args.messages))
+        best_off, best_on = min(off), min(on)
+        print(f"metrics off: {best_off * 1e6:.2f} µs/message")
+        print(f"metrics on:  {best_on * 1e6:.2f} µs/message")
+        print(f"overhead:    {(best_on - best_off) * 1e6:.2f} µs/message")
+
+        start = time.perf_counter()
+        text = metrics.registry.render()
+        print(
+            f"render: {(time.perf_counter() - start) * 1e3:.2f} ms, {len(text)} bytes"
+        )
+    finally:
+        metrics.ENABLED = True
+        pykka.ActorRegistry.stop_all()
+
+
+if __name__ == "__main__":
+    main()
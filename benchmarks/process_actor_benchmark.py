@@ -0,0 +1,88 @@
+"""
+Throughput of a CPU-bound handler in Pools of thread actors vs ProcessActors.
+
+Each request runs a pure Python loop, so thread actors share one core through the GIL
+while ProcessActors can use one core each. Requests are sent with ask(block=False) so
+every worker stays busy. Doesn't need redis.
+
+    python -m benchmarks.process_actor_benchmark
+"""
+
+import argparse
+import os
+import time
+
+import pykka
+
+import conclib
+
+
+class ScoreRequest(conclib.ActorMessage):
+    iterations: int
+
+
+class ScoreResponse(conclib.ActorMessage):
+    score: int
+
+
+def score(iterations: int) -> int:
+    total = 0
+    for i in range(iterations):
+        total = (total + i * i) % 1_000_003
+    return total
+
+
+class ThreadScorer(conclib.Actor):
+    URN = "process_actor_benchmark_thread"
+
+    @conclib.handles(ScoreRequest)
+    def on_score(self, message: ScoreRequest) -> ScoreResponse:
+        return ScoreResponse(score=score(message.iterations))
+
+
+class ProcessScorer(conclib.ProcessActor):
+    URN = "process_actor_benchmark_process"
+
+    @conclib.handles(ScoreRequest)
+    def on_score(self, message: ScoreRequest) -> ScoreResponse:
+        return ScoreResponse(score=score(message.iterations))
+
+
+def measure(actor_class: type[conclib.Actor], size: int, args) -> float:
+    """Requests per second"""
+    pool_ref = conclib.Pool(actor_class, size=size).start()
+    try:
+        # Wait for the workers (and child processes) to be ready
+        pykka.get_all(
+            [pool_ref.ask(ScoreRequest(iterations=1), block=False) for _ in range(size)]
+        )
+        start = time.perf_counter()
+        futures = [
+            pool_ref.ask(ScoreRequest(iterations=args.iterations), block=False)
+            for _ in range(args.requests)
+        ]
+        pykka.get_all(futures)
+        return args.requests / (time.perf_counter() - start)
+    finally:
+        pool_ref.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1})
+    )
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=300_000)
+    args = parser.parse_args()
+
+    print(f"cpu count: {os.cpu_count()}")
+    print(f"{'workers':>8} | {'threads req/s':>14} | {'processes req/s':>16}")
+    for size in args.sizes:
+        threads = measure(ThreadScorer, size, args)
+        processes = measure(ProcessScorer, size, args)
+        print(f"{size:>8} | {threads:>14.1f} | {processes:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
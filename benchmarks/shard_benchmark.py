@@ -0,0 +1,175 @@
+"""
+Proxy throughput with the inbound channel split over 1, 2, 4, ... shards.
+
+The proxy and the target actors run in this process. Requests come from separate client
+processes (so the clients don't compete with the proxy for the GIL), each sending
+batches with ask_many to a spread of actor URNs. Also checks that every actor received
+its messages in the order they were sent.
+
+Run from the repo root (starts a local redis-server on the configured port):
+
+    python -m benchmarks.shard_benchmark
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import multiprocessing
+import os
+import threading
+import time
+
+import pykka
+
+import conclib
+from conclib.proxy.actor import RedisPollingThread
+
+
+class Item(conclib.ActorMessage):
+    id: int
+    name: str
+    score: float
+
+
+class EchoRequest(conclib.ActorMessage):
+    TYPE_ID = "shard_benchmark.EchoRequest"
+    client: int
+    seq: int
+    items: list[Item]
+
+
+class EchoResponse(conclib.ActorMessage):
+    TYPE_ID = "shard_benchmark.EchoResponse"
+    seq: int
+
+
+class OutOfOrderQuery(conclib.ActorMessage):
+    pass
+
+
+class EchoActor(conclib.Actor):
+    def __init__(self, urn: str):
+        super().__init__(urn=urn)
+        self.last_seq: dict[int, int] = {}
+        self.out_of_order = 0
+
+    @conclib.handles(EchoRequest)
+    def on_echo(self, message: EchoRequest) -> EchoResponse:
+        if message.seq <= self.last_seq.get(message.client, -1):
+            self.out_of_order += 1
+        self.last_seq[message.client] = message.seq
+        return EchoResponse(seq=message.seq)
+
+    @conclib.handles(OutOfOrderQuery)
+    def on_query(self, message: OutOfOrderQuery) -> int:
+        return self.out_of_order
+
+
+def actor_urn(i: int) -> str:
+    return f"shard_benchmark_echo/{i}"
+
+
+def run_client(config, client_index, num_actors, requests, batch, items, ready, go):
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    payload = [Item(id=i, name=f"item-{i}", score=i / 3) for i in range(items)]
+    ready.set()
+    go.wait()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for start in range(0, requests, batch):
+            results = client.ask_many(
+                [
+                    (
+                        actor_urn(seq % num_actors),
+                        EchoRequest(client=client_index, seq=seq, items=payload),
+                        EchoResponse,
+                    )
+                    for seq in range(start, min(start + batch, requests))
+                ],
+                timeout=30,
+            )
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                raise errors[0]
+    client.close()
+
+
+def run_one(config: conclib.ConclibConfig, args: argparse.Namespace) -> dict:
+    conclib.start_proxy(config)
+    actors = [EchoActor.start(actor_urn(i)) for i in range(args.actors)]
+    ctx = multiprocessing.get_context("spawn")
+    go = ctx.Event()
+    readies, procs = [], []
+    for c in range(args.clients):
+        ready = ctx.Event()
+        proc = ctx.Process(
+            target=run_client,
+            args=(
+                config,
+                c,
+                args.actors,
+                args.requests,
+                args.batch,
+                args.items,
+                ready,
+                go,
+            ),
+        )
+        proc.start()
+        readies.append(ready)
+        procs.append(proc)
+    try:
+        for ready in readies:
+            ready.wait()
+        start = time.perf_counter()
+        go.set()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+        if any(proc.exitcode != 0 for proc in procs):
+            raise RuntimeError("A client process failed")
+        out_of_order = sum(actor.ask(OutOfOrderQuery()) for actor in actors)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        # Make sure the proxy threads are gone before starting the next run
+        while any(isinstance(t, RedisPollingThread) for t in threading.enumerate()):
+            time.sleep(0.01)
+
+    total = args.clients * args.requests
+    return {
+        "shards": config.inbound_shards,
+        "requests_per_s": total / elapsed,
+        "out_of_order": out_of_order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--actors", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--items", type=int, default=20)
+    args = parser.parse_args()
+
+    base_config = conclib.DefaultConfig()
+    redis_daemon = conclib.start_redis(config=base_config)
+    results = []
+    try:
+        for shards in args.shards:
+            config = dataclasses.replace(base_config, inbound_shards=shards)
+            # The proxy prints on every message, which would dominate the measurement
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results.append(run_one(config, args))
+    finally:
+        redis_daemon.shutdown()
+
+    print(f"{'shards':>8} | {'requests/s':>12} | {'out of order':>12}")
+    for row in results:
+        print(
+            f"{row['shards']:>8} | {row['requests_per_s']:>12.0f} | {row['out_of_order']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+The benchmark suite run by `python -m benchmarks`.
+
+Each benchmark returns a dict of Results. Tail latencies are reported but never counted as
+regressions, they vary too much between runs. The suite starts a local redis-server with
+start_redis (on the configured port) for the proxy benchmarks, writes every result to a
+JSON file and compares it against a stored baseline, exiting with status 1 when a result
+is worse than the baseline by more than the tolerance.
+
+    python -m benchmarks                      # run and compare to benchmarks/baseline.json
+    python -m benchmarks --quick              # fewer iterations, for a fast check
+    python -m benchmarks --save-baseline      # run and store the results as the baseline
+    python -m benchmarks --only ask_redis actor_ask
+
+Baselines only mean something on the machine they were recorded on, so record one before
+comparing on a new machine.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, Optional
+
+import pykka
+
+import conclib
+from conclib.pykka_extensions.ticker import Ticker
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+LOWER = "lower"
+HIGHER = "higher"
+
+
+@dataclasses.dataclass
+class Result:
+    value: float
+    unit: str
+    # Whether a lower or a higher value is better
+    better: str
+    # Tail latencies vary too much between runs to fail on. They are reported only.
+    noisy: bool = False
+
+    def change(self, baseline: "Result") -> float:
+        """Relative change against the baseline, positive when this result is worse"""
+        if baseline.value == 0:
+            return 0.0
+        change = (self.value - baseline.value) / baseline.value
+        return change if self.better == LOWER else -change
+
+
+Results = dict[str, Result]
+
+
+class Item(conclib.ActorMessage):
+    id: int
+    name: str
+    score: float
+
+
+class EchoRequest(conclib.ActorMessage):
+    TYPE_ID = "benchmarks.suite.EchoRequest"
+    items: list[Item]
+
+
+class EchoResponse(conclib.ActorMessage):
+    TYPE_ID = "benchmarks.suite.EchoResponse"
+    count: int
+
+
+class CountQuery(conclib.ActorMessage):
+    pass
+
+
+class EchoActor(conclib.Actor):
+    URN = "benchmark_suite_echo"
+
+    def __init__(self, urn: Optional[str] = None):
+        super().__init__(urn=urn)
+        self.count = 0
+
+    @conclib.handles(EchoRequest)
+    def on_echo(self, message: EchoRequest) -> EchoResponse:
+        self.count += 1
+        return EchoResponse(count=len(message.items))
+
+    @conclib.handles(CountQuery)
+    def on_count(self, message: CountQuery) -> int:
+        return self.count
+
+
+# Each measurement is repeated and the best round is kept
+ROUNDS = 3
+
+# Payload name -> number of items. An item is about 50 bytes of JSON.
+PAYLOADS = {"small": 1, "large": 200}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def measure_asks(
+    client: conclib.ProxyClient,
+    concurrency: int,
+    requests_per_thread: int,
+    items: int,
+) -> tuple[list[float], float]:
+    """Latencies of every ask, and the wall time, with `concurrency` threads asking"""
+    request = EchoRequest(
+        items=[Item(id=i, name=f"item-{i}", score=i / 3) for i in range(items)]
+    )
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(out: list[float]):
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            client.ask_actor(EchoActor.URN, request, EchoResponse)
+            out.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(out,)) for out in latencies]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return sorted(x for out in latencies for x in out), time.perf_counter() - start
+
+
+def ask_results(
+    prefix: str, rounds: list[tuple[list[float], float]], detailed: bool
+) -> Results:
+    """Results of the best of several rounds of measure_asks, which are less noisy than
+    any single round"""
+    results = {
+        f"{prefix}.p50_ms": Result(
+            min(percentile(latencies, 0.5) for latencies, _ in rounds) * 1e3,
+            "ms",
+            LOWER,
+        ),
+        f"{prefix}.throughput": Result(
+            max(len(latencies) / elapsed for latencies, elapsed in rounds),
+            "req/s",
+            HIGHER,
+        ),
+    }
+    if detailed:
+        results[f"{prefix}.p99_ms"] = Result(
+            min(percentile(latencies, 0.99) for latencies, _ in rounds) * 1e3,
+            "ms",
+            LOWER,
+            noisy=True,
+        )
+    return results
+
+
+def bench_ask_redis(config: conclib.ConclibConfig, scale: float) -> Results:
+    """ProxyClient.ask_actor through redis and the proxy, per concurrency and payload"""
+    results = {}
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    try:
+        measure_asks(client, 1, 50, 1)  # warm up
+        for payload, items in PAYLOADS.items():
+            for concurrency in (1, 8, 32):
+                per_thread = max(10, int(400 * scale) // concurrency)
+                rounds = [
+                    measure_asks(client, concurrency, per_thread, items)
+                    for _ in range(ROUNDS)
+                ]
+                results.update(
+                    ask_results(
+                        f"ask_redis.c{concurrency}.{payload}", rounds, detailed=True
+                    )
+                )
+    finally:
+        client.close()
+    return results
+
+
+def bench_ask_local(config: conclib.ConclibConfig, scale: float) -> Results:
+    """ProxyClient.ask_actor to an actor in the same process, which skips redis"""
+    results = {}
+    client = conclib.ProxyClient(config=config)
+    try:
+        measure_asks(client, 1, 100, 1)
+        for concurrency in (1, 8):
+            per_thread = max(10, int(2000 * scale) // concurrency)
+            rounds = [
+                measure_asks(client, concurrency, per_thread, 1) for _ in range(ROUNDS)
+            ]
+            results.update(
+                ask_results(f"ask_local.c{concurrency}.small", rounds, detailed=False)
+            )
+    finally:
+        client.close()
+    return results
+
+
+def bench_actor_ask(config: conclib.ConclibConfig, scale: float) -> Results:
+    """pykka ask and tell between actors in this process, without the proxy"""
+    actor_ref = pykka.ActorRegistry.get_by_urn(EchoActor.URN)
+    request = EchoRequest(items=[Item(id=0, name="item-0", score=0.0)])
+    num_asks = max(100, int(5000 * scale))
+    ask_elapsed = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(num_asks):
+            actor_ref.ask(request)
+        ask_elapsed.append(time.perf_counter() - start)
+
+    num_tells = max(1000, int(50_000 * scale))
+    tell_elapsed = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(num_tells):
+            actor_ref.tell(request)
+        # The actor has handled every tell once it answers this
+        actor_ref.ask(CountQuery())
+        tell_elapsed.append(time.perf_counter() - start)
+    ask_elapsed, tell_elapsed = min(ask_elapsed), min(tell_elapsed)
+    return {
+        "actor_ask.throughput": Result(num_asks / ask_elapsed, "msg/s", HIGHER),
+        "actor_tell.throughput": Result(num_tells / tell_elapsed, "msg/s", HIGHER),
+    }
+
+
+class RecordingTicker(Ticker):
+    def __init__(self, interval: float):
+        super().__init__(interval=interval, thread_name="benchmark_suite_ticker")
+        self.times: list[float] = []
+
+    def execute(self):
+        self.times.append(time.monotonic())
+
+
+def bench_ticker(config: conclib.ConclibConfig, scale: float) -> Results:
+    """How far the gaps between ticks drift from the interval"""
+    interval = 0.01
+    ticker = RecordingTicker(interval)
+    ticker.start()
+    time.sleep(max(0.5, 2.0 * scale))
+    ticker.stop()
+    ticker.join()
+    errors = sorted(
+        abs((b - a) - interval) for a, b in zip(ticker.times, ticker.times[1:])
+    )
+    return {
+        "ticker.jitter_mean_ms": Result(statistics.fmean(errors) * 1e3, "ms", LOWER),
+        "ticker.jitter_p99_ms": Result(
+            percentile(errors, 0.99) * 1e3, "ms", LOWER, noisy=True
+        ),
+    }
+
+
+def bench_actor_memory(config: conclib.ConclibConfig, scale: float) -> Results:
+    """Python memory allocated per started (idle) actor. Doesn't include thread stacks."""
+    num_actors = max(50, int(500 * scale))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        actor_refs = [
+            EchoActor.start(urn=f"benchmark_suite_memory/{i}")
+            for i in range(num_actors)
+        ]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    for actor_ref in actor_refs:
+        actor_ref.stop(block=False)
+    for actor_ref in actor_refs:
+        actor_ref.actor_stopped.wait()
+    return {
+        "actor_memory.per_actor_kib": Result(
+            (after - before) / num_actors / 1024, "KiB", LOWER
+        )
+    }
+
+
+# Name -> (benchmark, needs redis)
+BENCHMARKS: dict[
+    str, tuple[Callable[[conclib.ConclibConfig, float], Results], bool]
+] = {
+    "ask_redis": (bench_ask_redis, True),
+    "ask_local": (bench_ask_local, False),
+    "actor_ask": (bench_actor_ask, False),
+    "ticker": (bench_ticker, False),
+    "actor_memory": (bench_actor_memory, False),
+}
+
+
+def run(names: list[str], scale: float) -> Results:
+    config = conclib.DefaultConfig()
+    needs_redis = any(BENCHMARKS[name][1] for name in names)
+    redis_daemon = conclib.start_redis(config=config) if needs_redis else None
+    results: Results = {}
+    try:
+        if needs_redis:
+            conclib.start_proxy(config=config)
+        EchoActor.start()
+        for name in names:
+            benchmark, _ = BENCHMARKS[name]
+            print(f"Running {name}...", file=sys.stderr)
+            results.update(benchmark(config, scale))
+    finally:
+        pykka.ActorRegistry.stop_all()
+        if redis_daemon is not None:
+            redis_daemon.shutdown()
+    return results
+
+
+def metadata() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def dump(results: Results, path: Path):
+    data = {
+        "metadata": metadata(),
+        "results": {name: dataclasses.asdict(r) for name, r in results.items()},
+    }
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def load(path: Path) -> tuple[dict, Results]:
+    """The metadata and results stored by dump()"""
+    data = json.loads(path.read_text())
+    return data["metadata"], {name: Result(**r) for name, r in data["results"].items()}
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> list[str]:
+    """Print a table of results against the baseline. Returns the regressed names."""
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(
+                f"{name:<36} {'-':>12} {result.value:>12.3f} {'new':>8} {result.unit}"
+            )
+            continue
+        change = result.change(base)
+        flag = ""
+        if change > tolerance:
+            if result.noisy:
+                flag = "  (noisy, ignored)"
+            else:
+                flag = "  REGRESSION"
+                regressions.append(name)
+        print(
+            f"{name:<36} {base.value:>12.3f} {result.value:>12.3f} "
+            f"{-change:>+8.0%} {result.unit}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Run a fifth of the iterations"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark-results.json"),
+        help="Where to write the results",
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Relative change that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.only, scale=0.2 if args.quick else 1.0)
+    dump(results, args.output)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        if args.baseline.exists():
+            # Keep the baseline of benchmarks that weren't run
+            results = {**load(args.baseline)[1], **results}
+        dump(results, args.baseline)
+        print(f"Saved the baseline to {args.baseline}", file=sys.stderr)
+        return 0
+
+    baseline: Results = {}
+    if args.baseline.exists():
+        baseline_metadata, baseline = load(args.baseline)
+        current = metadata()
+        for key in ("python", "platform", "cpu_count"):
+            if baseline_metadata.get(key) != current[key]:
+                print(
+                    f"Warning: the baseline was recorded with {key}="
+                    f"{baseline_metadata.get(key)}, this machine has {current[key]}. "
+                    "Record a baseline on this machine with --save-baseline.",
+                    file=sys.stderr,
+                )
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) over {args.tolerance:.0%}: "
+            + ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
@@ -0,0 +1,96 @@
+"""
+Threads used and tick accuracy for many PeriodicActors.
+
+Starts --actors PeriodicActors with --ticks TICKS entries each, lets them run, and reports
+the number of threads in the process and how far the gaps between consecutive ticks
+drifted from the configured interval. Doesn't need redis.
+
+    python -m benchmarks.ticker_benchmark
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import pykka
+
+import conclib
+
+
+class TickA(conclib.ActorMessage):
+    pass
+
+
+class TickB(conclib.ActorMessage):
+    pass
+
+
+class TickC(conclib.ActorMessage):
+    pass
+
+
+class GapsQuery(conclib.ActorMessage):
+    pass
+
+
+TICK_TYPES = [TickA, TickB, TickC]
+
+
+def make_actor_class(interval: float, num_ticks: int) -> type[conclib.PeriodicActor]:
+    class BenchmarkPeriodicActor(conclib.PeriodicActor):
+        TICKS = {tick_type: interval for tick_type in TICK_TYPES[:num_ticks]}
+
+        def __init__(self):
+            super().__init__()
+            self.last_tick: dict[type, float] = {}
+            self.gaps: list[float] = []
+
+        def on_receive(self, message):
+            if isinstance(message, GapsQuery):
+                return self.gaps
+            now = time.monotonic()
+            last = self.last_tick.get(type(message))
+            if last is not None:
+                self.gaps.append(now - last)
+            self.last_tick[type(message)] = now
+
+    return BenchmarkPeriodicActor
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--actors", type=int, default=300)
+    parser.add_argument("--ticks", type=int, default=3, choices=[1, 2, 3])
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    actor_class = make_actor_class(args.interval, args.ticks)
+    threads_before = threading.active_count()
+    actors = [actor_class.start() for _ in range(args.actors)]
+    try:
+        time.sleep(args.seconds)
+        threads = threading.active_count() - threads_before
+        gaps = [gap for actor in actors for gap in actor.ask(GapsQuery())]
+    finally:
+        pykka.ActorRegistry.stop_all()
+
+    drift_ms = [abs(gap - args.interval) * 1000 for gap in gaps]
+    print(f"actors: {args.actors}, tickers: {args.actors * args.ticks}")
+    print(f"threads started: {threads} (including one per actor)")
+    print(f"ticks: {len(gaps) + args.actors * args.ticks}")
+    print(
+        f"gap drift from interval: p50 {statistics.median(drift_ms):.2f} ms, "
+        f"p99 {percentile(drift_ms, 99):.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
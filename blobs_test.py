@@ -0,0 +1,187 @@
+import asyncio
+import dataclasses
+import glob
+import os
+
+import pykka
+import redis
+
+import conclib
+from conclib.errors import BlobNotFoundError
+from conclib.proxy import blobs
+from conclib.proxy.envelope import RequestEnvelope
+
+THRESHOLD = 1024
+
+
+class EchoRequest(conclib.ActorMessage):
+    data: bytes
+    view: conclib.Buffer
+    chunks: list[bytes]
+
+
+class EchoResponse(conclib.ActorMessage):
+    data: bytes
+    view: conclib.Buffer
+    # Whether the handler received view without a copy
+    view_type: str
+
+
+class BlobActor(conclib.Actor):
+    URN = "blobs_test"
+
+    @conclib.handles(EchoRequest)
+    def on_echo(self, message: EchoRequest) -> EchoResponse:
+        assert isinstance(message.data, bytes), type(message.data)
+        return EchoResponse(
+            data=message.data + b"".join(message.chunks),
+            view=message.view,
+            view_type=type(message.view).__name__,
+        )
+
+
+def request(size: int) -> EchoRequest:
+    return EchoRequest(
+        data=os.urandom(size),
+        view=memoryview(os.urandom(size)),
+        chunks=[os.urandom(size), b"small"],
+    )
+
+
+def check(response: EchoResponse, sent: EchoRequest):
+    assert response.data == sent.data + b"".join(sent.chunks)
+    assert isinstance(response.view, memoryview), type(response.view)
+    assert response.view == sent.view
+    assert response.view_type == "memoryview"
+
+
+def blob_keys(redis_conn: redis.Redis) -> list:
+    return list(redis_conn.scan_iter(blobs.REDIS_KEY_PREFIX + "*"))
+
+
+def shm_files() -> list[str]:
+    return glob.glob(os.path.join(blobs.SHM_DIR, blobs.SHM_PREFIX + "*"))
+
+
+async def check_async_client(config: conclib.ConclibConfig):
+    async with conclib.AsyncProxyClient(config=config, force_redis=True) as client:
+        sent = request(THRESHOLD * 4)
+        response = await client.ask_actor(BlobActor.URN, sent, EchoResponse)
+        check(response, sent)
+        [response] = await client.ask_many([(BlobActor.URN, sent, EchoResponse)])
+        check(response, sent)
+
+
+def check_redelivered_blobs(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """Blobs of a request from a stream stay readable until they expire, in case the
+    request is redelivered"""
+    sent = request(THRESHOLD * 4)
+    envelope = RequestEnvelope(
+        message_id="redelivered",
+        message_type=EchoRequest.type_id(),
+        actor_urn=BlobActor.URN,
+        contents=sent.model_dump(),
+    )
+    envelope, writes = blobs.offload(envelope, config, "msgpack")
+    blobs.write_redis(redis_conn, writes, config.blob_ttl_s)
+    envelope.stream_id = "1-0"
+    envelope._redis_conn = redis_conn
+    envelope._config = config
+    assert envelope.extract(EchoRequest).data == sent.data
+    assert len(blob_keys(redis_conn)) == len(writes) == 3
+    assert all(redis_conn.ttl(key) > 0 for key in blob_keys(redis_conn))
+    redis_conn.delete(*blob_keys(redis_conn))
+
+
+def check_forged_refs(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """References that this module didn't write are refused, and nothing is read"""
+    victim = os.path.join(blobs.SHM_DIR, "blobs_test_victim")
+    with open(victim, "wb") as f:
+        f.write(b"secret")
+    redis_conn.set("blobs_test_victim", b"secret")
+    forged = [
+        {"store": "shm", "path": victim},
+        {"store": "shm", "path": os.path.join(blobs.SHM_DIR, blobs.SHM_PREFIX + "..")},
+        {"store": "redis", "key": "blobs_test_victim"},
+    ]
+    try:
+        for receiver_config, ref in [(conclib.DefaultConfig(), forged[0])] + [
+            (config, ref) for ref in forged
+        ]:
+            envelope = RequestEnvelope(
+                message_id="forged",
+                message_type=EchoRequest.type_id(),
+                actor_urn=BlobActor.URN,
+                contents={"data": {blobs.REF_KEY: ref}, "view": b"", "chunks": []},
+                blobs=True,
+            )
+            envelope._redis_conn = redis_conn
+            envelope._config = receiver_config
+            try:
+                envelope.extract(EchoRequest)
+                raise AssertionError(f"Expected BlobNotFoundError for {ref}")
+            except BlobNotFoundError:
+                pass
+        assert os.path.exists(victim)
+        assert redis_conn.get("blobs_test_victim") == b"secret"
+    finally:
+        os.unlink(victim)
+        redis_conn.delete("blobs_test_victim")
+
+
+def main():
+    config = conclib.DefaultConfig(blob_threshold=THRESHOLD)
+    redis_conn = redis.Redis(host=config.redis_host, port=config.redis_port)
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        BlobActor.start()
+
+        # Large values go through the redis store, small ones are inlined, for every codec
+        for codec in ("json", "msgpack"):
+            client = conclib.ProxyClient(
+                config=dataclasses.replace(config, codec=codec), force_redis=True
+            )
+            for size in (THRESHOLD * 64, 10):
+                sent = request(size)
+                check(client.ask_actor(BlobActor.URN, sent, EchoResponse), sent)
+            [response] = client.ask_many([(BlobActor.URN, sent, EchoResponse)])
+            check(response, sent)
+            client.close()
+        # Requests and responses delete their blobs once they are read
+        assert not blob_keys(redis_conn), blob_keys(redis_conn)
+        check_redelivered_blobs(config, redis_conn)
+
+        # The shm store leaves nothing behind once the request is handled
+        shm_config = dataclasses.replace(config, blob_store="shm", codec="msgpack")
+        client = conclib.ProxyClient(config=shm_config, force_redis=True)
+        sent = request(THRESHOLD * 64)
+        check(client.ask_actor(BlobActor.URN, sent, EchoResponse), sent)
+        assert not shm_files(), shm_files()
+        client.close()
+
+        # In process, the message is passed as it is
+        client = conclib.ProxyClient(config=config)
+        sent = request(THRESHOLD * 4)
+        check(client.ask_actor(BlobActor.URN, sent, EchoResponse), sent)
+        client.close()
+
+        asyncio.run(check_async_client(config))
+        assert not blob_keys(redis_conn), blob_keys(redis_conn)
+
+        check_forged_refs(config, redis_conn)
+
+        try:
+            conclib.ProxyClient(config=dataclasses.replace(config, blob_store="disk"))
+            raise AssertionError("Expected ValueError")
+        except ValueError as e:
+            assert "disk" in str(e), e
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import concurrent.futures
+import time
+import uuid
+
+import pykka
+
+import conclib
+from conclib.proxy.cache import LRUCache, RedisCache
+
+
+class LookupRequest(conclib.ActorMessage):
+    CACHE_TTL = 10.0
+    key: str
+
+
+class ShortLivedRequest(LookupRequest):
+    CACHE_TTL = 0.5
+
+
+class UncachedRequest(conclib.ActorMessage):
+    key: str
+
+
+class LookupResponse(conclib.ActorMessage):
+    key: str
+    calls: int
+
+
+class CallsQuery(conclib.ActorMessage):
+    pass
+
+
+class LookupActor(conclib.Actor):
+    URN = "cache_test"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @conclib.handles(LookupRequest, UncachedRequest)
+    def on_lookup(self, message: LookupRequest) -> LookupResponse:
+        self.calls += 1
+        # Slow enough for concurrent asks to overlap
+        time.sleep(0.2)
+        return LookupResponse(key=message.key, calls=self.calls)
+
+    @conclib.handles(CallsQuery)
+    def on_calls(self, message: CallsQuery) -> int:
+        return self.calls
+
+
+def check_abandoned_asks(config: conclib.ConclibConfig):
+    """A caller that gives up on a coalesced ask leaves the others waiting, each with its
+    own timeout"""
+    client = conclib.ProxyClient(config=config, force_redis=True, cache=LRUCache())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(
+            client.ask_actor,
+            LookupActor.URN,
+            LookupRequest(key="e"),
+            LookupResponse,
+            timeout=0.05,
+        )
+        time.sleep(0.01)
+        follower = executor.submit(
+            client.ask_actor,
+            LookupActor.URN,
+            LookupRequest(key="e"),
+            LookupResponse,
+            timeout=5,
+        )
+        try:
+            leader.result()
+            raise AssertionError("Expected AskTimeoutError")
+        except conclib.errors.AskTimeoutError:
+            pass
+        assert follower.result().key == "e"
+    client.close()
+
+    async def cancel_leader():
+        async with conclib.AsyncProxyClient(
+            config=config, cache=LRUCache()
+        ) as async_client:
+            leader = asyncio.create_task(
+                async_client.ask_actor(
+                    LookupActor.URN, LookupRequest(key="f"), LookupResponse
+                )
+            )
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(
+                async_client.ask_actor(
+                    LookupActor.URN, LookupRequest(key="f"), LookupResponse, timeout=5
+                )
+            )
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            assert (await follower).key == "f"
+            assert leader.cancelled()
+
+    asyncio.run(cancel_leader())
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        actor_ref = LookupActor.start()
+
+        def calls() -> int:
+            return actor_ref.ask(CallsQuery())
+
+        client = conclib.ProxyClient(config=config, force_redis=True, cache=LRUCache())
+
+        # Concurrent identical asks reach the actor once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(
+                executor.map(
+                    lambda _: client.ask_actor(
+                        LookupActor.URN, LookupRequest(key="a"), LookupResponse
+                    ),
+                    range(5),
+                )
+            )
+        assert calls() == 1, calls()
+        assert all(r == LookupResponse(key="a", calls=1) for r in responses)
+        # Callers don't share response objects
+        assert len({id(r) for r in responses}) == 5
+
+        # Repeated asks are answered from the cache until the TTL expires
+        client.ask_actor(LookupActor.URN, LookupRequest(key="a"), LookupResponse)
+        assert calls() == 1
+        client.ask_actor(LookupActor.URN, ShortLivedRequest(key="a"), LookupResponse)
+        assert calls() == 2
+        time.sleep(ShortLivedRequest.CACHE_TTL)
+        response = client.ask_actor(
+            LookupActor.URN, ShortLivedRequest(key="a"), LookupResponse
+        )
+        assert response.calls == 3
+
+        # Messages without CACHE_TTL always reach the actor
+        for _ in range(2):
+            client.ask_actor(LookupActor.URN, UncachedRequest(key="a"), LookupResponse)
+        assert calls() == 5
+        client.close()
+
+        # A RedisCache is shared between clients. Entries may survive in redis' dump, so
+        # this run uses its own keys.
+        prefix = f"cache_test:{uuid.uuid4()}:"
+        first = conclib.ProxyClient(
+            config=config, cache=RedisCache(config, key_prefix=prefix)
+        )
+        second = conclib.ProxyClient(
+            config=config, cache=RedisCache(config, key_prefix=prefix)
+        )
+        first.ask_actor(LookupActor.URN, LookupRequest(key="c"), LookupResponse)
+        response = second.ask_actor(
+            LookupActor.URN, LookupRequest(key="c"), LookupResponse
+        )
+        assert response.calls == 6 and calls() == 6
+        first.close()
+        second.close()
+
+        async def ask_async():
+            async with conclib.AsyncProxyClient(
+                config=config, cache=RedisCache(config, key_prefix=prefix)
+            ) as async_client:
+                responses = await asyncio.gather(
+                    *[
+                        async_client.ask_actor(
+                            LookupActor.URN, LookupRequest(key="d"), LookupResponse
+                        )
+                        for _ in range(5)
+                    ]
+                )
+                assert {r.calls for r in responses} == {7}
+                # Served from redis, which the sync clients filled
+                await async_client.ask_actor(
+                    LookupActor.URN, LookupRequest(key="c"), LookupResponse
+                )
+
+        asyncio.run(ask_async())
+        assert calls() == 7, calls()
+
+        # The LRU drops the least recently used entry
+        lru = LRUCache(max_entries=2)
+        envelope = conclib.ResponseEnvelope(
+            message_id="x", message_type="", contents={}
+        )
+        lru.set("a", envelope, ttl=10)
+        lru.set("b", envelope, ttl=10)
+        lru.get("a")
+        lru.set("c", envelope, ttl=10)
+        assert lru.get("b") is None and lru.get("a") is not None and len(lru) == 2
+
+        check_abandoned_asks(config)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
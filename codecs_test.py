@@ -0,0 +1,178 @@
+import asyncio
+import dataclasses
+
+import pykka
+import redis
+
+import conclib
+from conclib.proxy import codecs
+
+CODECS = tuple(codecs.CODEC_CLASSES)
+
+
+class Point(conclib.ActorMessage):
+    x: float
+    y: float
+
+
+class ShapeRequest(conclib.ActorMessage):
+    name: str
+    points: list[Point]
+    tags: dict[str, int]
+    note: str | None = None
+
+
+class ShapeResponse(conclib.ActorMessage):
+    name: str
+    count: int
+
+
+class ShapeActor(conclib.Actor):
+    URN = "codecs_test"
+
+    @conclib.handles(ShapeRequest)
+    def on_shape(self, message: ShapeRequest) -> ShapeResponse:
+        return ShapeResponse(name=message.name, count=len(message.points))
+
+
+def shape_request() -> ShapeRequest:
+    return ShapeRequest(
+        name="triangle ✓",
+        points=[Point(x=0, y=0), Point(x=1.5, y=-2), Point(x=1e-9, y=3e12)],
+        tags={"a": 1, "b": -2},
+    )
+
+
+def check_round_trips():
+    """Every codec decodes what it encodes, and decode() recognizes the codec by its tag"""
+    request = shape_request()
+    request_envelope = conclib.RequestEnvelope(
+        message_id="id",
+        message_type=ShapeRequest.type_id(),
+        actor_urn=ShapeActor.URN,
+        contents=request.model_dump(),
+        reply_to="reply",
+        deadline=1.5,
+        trace_id="trace",
+        timings={"sent": 1.0},
+    )
+    response_envelope = conclib.ResponseEnvelope(
+        message_id="id",
+        message_type=ShapeResponse.type_id(),
+        contents=ShapeResponse(name="x", count=3).model_dump(),
+        status="error",
+        error="boom",
+        seq=2,
+    )
+    for name in CODECS:
+        for envelope in (request_envelope, response_envelope):
+            data = codecs.encode(envelope, name)
+            decoded = codecs.decode(data, type(envelope))
+            assert decoded.codec == name, (name, decoded.codec)
+            assert decoded.model_dump() == envelope.model_dump(), name
+        decoded = codecs.decode(
+            codecs.encode(request_envelope, name), type(request_envelope)
+        )
+        assert decoded.extract(ShapeRequest) == request, name
+
+    # JSON is untagged, so older versions can read it
+    assert codecs.encode(request_envelope, "json").startswith(b"{")
+
+    try:
+        codecs.decode(codecs.TAG_PREFIX + b"z{}", conclib.ResponseEnvelope)
+        raise AssertionError("Expected ValueError")
+    except ValueError as e:
+        assert "Unknown codec tag" in str(e), e
+    try:
+        codecs.get_codec("xml")
+        raise AssertionError("Expected ValueError")
+    except ValueError as e:
+        assert "xml" in str(e), e
+
+
+def check_mixed_codecs(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """A proxy answers every client in the codec of its request, whatever its own codec"""
+    for name in CODECS:
+        client = conclib.ProxyClient(
+            config=dataclasses.replace(config, codec=name), force_redis=True
+        )
+        response = client.ask_actor(ShapeActor.URN, shape_request(), ShapeResponse)
+        assert response == ShapeResponse(name="triangle ✓", count=3), response
+        client.close()
+
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe("codecs_test_reply")
+    assert pubsub.get_message(timeout=5) is None
+    for name in CODECS:
+        envelope = conclib.RequestEnvelope(
+            message_id=f"raw-{name}",
+            message_type=ShapeRequest.type_id(),
+            actor_urn=ShapeActor.URN,
+            contents=shape_request().model_dump(),
+            reply_to="codecs_test_reply",
+        )
+        redis_conn.publish(config.inbound_channel_name, codecs.encode(envelope, name))
+        message = pubsub.get_message(timeout=5)
+        assert message is not None, name
+        response = codecs.decode(message["data"], conclib.ResponseEnvelope)
+        assert response.codec == name, (name, response.codec)
+        assert response.extract(ShapeResponse).count == 3
+    pubsub.close()
+
+
+def check_undecodable_replies(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """A message on the reply channel that can't be decoded doesn't stop the client"""
+    garbage = [codecs.TAG_PREFIX + b"z{}", b"not json"]
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    for data in garbage:
+        redis_conn.publish(client.reply_channel, data)
+    response = client.ask_actor(
+        ShapeActor.URN, shape_request(), ShapeResponse, timeout=5
+    )
+    assert response.count == 3
+    client.close()
+
+    async def ask_async():
+        async with conclib.AsyncProxyClient(config=config, force_redis=True) as client:
+            for data in garbage:
+                redis_conn.publish(client.reply_channel, data)
+            response = await client.ask_actor(
+                ShapeActor.URN, shape_request(), ShapeResponse, timeout=5
+            )
+            assert response.count == 3
+
+    asyncio.run(ask_async())
+
+
+def check_undecodable_requests(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """A request the proxy can't decode doesn't stop its polling thread"""
+    for data in [codecs.TAG_PREFIX + b"zgarbage", b"not json"]:
+        redis_conn.publish(config.inbound_channel_name, data)
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    response = client.ask_actor(
+        ShapeActor.URN, shape_request(), ShapeResponse, timeout=5
+    )
+    assert response.count == 3
+    client.close()
+
+
+def main():
+    check_round_trips()
+
+    config = conclib.DefaultConfig()
+    redis_conn = redis.Redis(host=config.redis_host, port=config.redis_port)
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        ShapeActor.start()
+        check_mixed_codecs(config, redis_conn)
+        check_undecodable_replies(config, redis_conn)
+        check_undecodable_requests(config, redis_conn)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,20 @@
 
 from conclib.config import ConclibConfig, DefaultConfig  # noqa: F401
 from conclib import constants  # noqa: F401
-from conclib.proxy.messages import ActorMessage  # noqa: F401
+from conclib.proxy.messages import ActorMessage, Priority  # noqa: F401
+from conclib.proxy.blobs import Buffer  # noqa: F401
 from conclib import errors  # noqa: F401
-from conclib.pykka_extensions.actor import Actor  # noqa: F401
+from conclib.pykka_extensions.actor import Actor, handles  # noqa: F401
 from conclib.pykka_extensions.ticker import Ticker  # noqa: F401
 from conclib.proxy.client import ProxyClient  # noqa: F401
+from conclib.proxy.asyncclient import AsyncProxyClient  # noqa: F401
 
 from conclib.proxy.envelope import RequestEnvelope, ResponseEnvelope  # noqa: F401
 from conclib.proxy.actor import start_proxy  # noqa: F401
 from conclib.pykka_extensions.periodicactor import PeriodicActor  # noqa: F401
+from conclib.pykka_extensions.batchingactor import BatchingActor  # noqa: F401
+from conclib.pykka_extensions.processactor import ProcessActor  # noqa: F401
+from conclib.pykka_extensions.pool import Pool  # noqa: F401
 
 from conclib.utils.redisd.redisserverd import start_redis  # noqa: F401
 from conclib.utils.apid.apid import start_api  # noqa: F401
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -7,13 +8,61 @@ class ConclibConfig:
     redis_host: str
     inbound_channel_name: str
     outbound_channel_prefix: str
+    # Path of redis' unix domain socket. When set, this process connects through it instead
+    # of redis_host and redis_port (faster, but only on the same host), and start_redis
+    # also listens on it.
+    redis_unix_socket: Optional[str] = None
+    # Maximum number of connections the process-wide pool opens to redis. None means no
+    # limit. Every open pubsub (each ProxyClient, and each polling thread with the pubsub
+    # transport) holds one for as long as it is subscribed, so leave room for them.
+    redis_max_connections: Optional[int] = None
+    # With redis_max_connections, how long to wait for a free connection before raising
+    redis_pool_timeout: float = 5.0
+    # How requests reach the proxy. "pubsub" publishes to inbound_channel_name and is lost
+    # if no proxy is listening. "streams" appends to a redis stream named
+    # inbound_channel_name that is read through a consumer group, so requests wait for a
+    # proxy and several proxy processes can split the load between them.
+    transport: str = "pubsub"
+    # Wire format used to send envelopes: "json", "orjson" or "msgpack". Receivers decode
+    # any of them and respond in the format the request arrived in.
+    codec: str = "json"
+    # Send the bare class name as a request's message_type instead of its type id. Actors
+    # running a conclib version from before type ids only understand bare names, so turn
+    # this on while upgrading clients ahead of the proxies, and off once all are upgraded.
+    bare_message_types: bool = False
+    # Number of inbound channels (or streams) requests are spread over, each read by its own
+    # polling thread and answered by its own RespondingActor. Requests for one actor always
+    # use the same shard. Clients and proxies must use the same value.
+    inbound_shards: int = 1
+    # Streams transport only
+    stream_consumer_group: str = "conclib_proxy"
+    stream_maxlen: int = 100_000  # approximate cap on the inbound stream length
+    # Requests delivered to a proxy but not responded to within this time are reclaimed by
+    # another proxy (e.g. because the first one crashed). Must be longer than the slowest
+    # handler, or slow requests will be delivered twice.
+    stream_claim_idle_ms: int = 30_000
+    # A request that was delivered this many times without being responded to (e.g. its
+    # handler never responds, or it crashes every proxy that reads it) is acked and dropped
+    # instead of being reclaimed again
+    stream_max_deliveries: int = 5
+    # Binary values (bytes, bytearray, memoryview) of at least this many bytes in a message
+    # sent through redis are stored separately and the envelope only carries a reference
+    # (see conclib.proxy.blobs). None (the default) sends everything inside the envelope.
+    # Receivers must run a conclib version that understands the references.
+    blob_threshold: Optional[int] = None
+    # Where those payloads go: "redis" (a key, works across hosts) or "shm" (a file in
+    # /dev/shm, only if every client and proxy runs on the same host)
+    blob_store: str = "redis"
+    # Payloads nobody read are deleted after this long
+    blob_ttl_s: int = 300
 
 
 class DefaultConfig(ConclibConfig):
-    def __init__(self):
-        super().__init__(
+    def __init__(self, **kwargs):
+        defaults = dict(
             redis_port=6379,
             redis_host="localhost",
             inbound_channel_name="out2actor",
             outbound_channel_prefix="actor2out/",
         )
+        super().__init__(**{**defaults, **kwargs})
@@ -10,7 +10,82 @@ class UnexpectedMessageError(ConclibBaseException):
     def __init__(self, message: Any):
         # TODO: We know exactly where this should be called (Actor.on_receive). Do some callstack magic
         #       to get the actor name? Potentially brittle?
-        self.message_type = message.__class__.__name__
+        from conclib.proxy.envelope import RequestEnvelope
+
+        if isinstance(message, RequestEnvelope):
+            # The type it carries, not the envelope's own
+            self.message_type = message.message_type
+        else:
+            self.message_type = message.__class__.__name__
 
     def __str__(self):
         return f"Received unexpected message type: {self.message_type}"
+
+
+class DuplicateMessageTypeError(ConclibBaseException):
+    """ When two different ActorMessage classes are registered under the same type id """
+
+    def __init__(self, type_id: str, existing: type, new: type):
+        self.type_id = type_id
+        self.existing = existing
+        self.new = new
+
+    def __str__(self):
+        return (
+            f"Message type id {self.type_id!r} is used by both "
+            f"{self.existing.__module__}.{self.existing.__qualname__} and "
+            f"{self.new.__module__}.{self.new.__qualname__}. Set a unique TYPE_ID on one of them"
+        )
+
+
+class AskTimeoutError(ConclibBaseException, TimeoutError):
+    """ When no response arrives from an actor within the timeout """
+
+    def __init__(self, actor_urn: str, timeout: float):
+        self.actor_urn = actor_urn
+        self.timeout = timeout
+
+    def __str__(self):
+        return f"No response from {self.actor_urn} within {self.timeout} seconds"
+
+
+class ProcessActorError(ConclibBaseException):
+    """ When a ProcessActor's child process dies, or raises an exception that can't be sent back """
+
+
+class InboxFullError(ConclibBaseException):
+    """ When a message is dropped or rejected because the actor's inbox is full """
+
+    def __init__(self, actor_urn: str):
+        self.actor_urn = actor_urn
+
+    def __str__(self):
+        return f"Inbox of {self.actor_urn} is full"
+
+
+class ClientClosedError(ConclibBaseException):
+    """ When a ProxyClient is closed while an ask is still waiting for its response """
+
+
+class ActorOverloadedError(ConclibBaseException):
+    """ When the actor system dropped a request from outside because the actor was overloaded """
+
+
+class ActorNotFoundError(ConclibBaseException):
+    """ When a request from outside the actor system names an actor URN the proxy doesn't know """
+
+
+class RemoteActorError(ConclibBaseException):
+    """ When the handler of a request from outside the actor system raised an exception """
+
+
+class BlobNotFoundError(ConclibBaseException):
+    """ When the out-of-band payload an envelope refers to can't be read, e.g. because it expired """
+
+
+class RedisDidntStartError(ConclibBaseException):
+    """ When start_redis times out waiting for redis to answer, or redis-server exits """
+
+
+class ProxyDidntStartError(ConclibBaseException):
+    """ When start_proxy times out waiting for the polling threads to receive requests """
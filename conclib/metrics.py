@@ -0,0 +1,366 @@
+# In-process metrics in the Prometheus text format.
+#
+# conclib records, with a few microseconds of overhead per message (see
+# benchmarks/metrics_benchmark.py):
+# - per actor URN and message type: messages handled, handler errors and a histogram of
+#   handler durations
+# - per actor URN: inbox depth (read when the metrics are rendered), messages dropped
+#   from a full inbox and requests dropped because their deadline had passed, and the
+#   size of the batches of a BatchingActor
+# - per ticker: how late each tick ran compared to its schedule, and ticks that didn't run
+# - per actor URN: ProxyClient/AsyncProxyClient ask_actor round trip times, and how
+#   their cacheable asks were answered
+#
+# Render them with `conclib.metrics.registry.render()`, serve them with
+# `conclib.metrics.start_http_server(port)`, or mount them on a FastAPI app with
+# `conclib.utils.apid.metrics.mount_metrics(app)`. Set `conclib.metrics.ENABLED = False`
+# to stop recording.
+import bisect
+import http.server
+import math
+import threading
+import time
+
+from typing import Callable, Iterable
+
+import pykka
+
+ENABLED = True
+
+# Seconds. Handlers and round trips range from microseconds to seconds.
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # One count per bucket plus the +Inf bucket. Not cumulative, render() adds them up.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    type_name: str
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """The series for these label values. Keep the result to skip the lookup on hot
+        paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, values, f'le="{_format_value(bound)}"'
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackGauge(_Metric):
+    """A gauge whose values are read from a callback when the metrics are rendered, so
+    keeping it up to date costs nothing"""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str],
+        callback: Callable[[], Iterable[tuple[LabelValues, float]]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        for values, value in self.callback():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _inbox_depths() -> Iterable[tuple[LabelValues, float]]:
+    for ref in pykka.ActorRegistry.get_all():
+        inbox = getattr(ref, "actor_inbox", None)
+        if inbox is not None:
+            yield (ref.actor_urn,), inbox.qsize()
+
+
+# message_type label of requests from outside whose type isn't a known ActorMessage, so
+# made-up types sent by a client can't each add new series
+UNKNOWN_MESSAGE_TYPE = "unknown"
+
+actor_messages = registry.register(
+    Counter(
+        "conclib_actor_messages_total",
+        "Messages handled by an actor",
+        ["urn", "message_type"],
+    )
+)
+actor_errors = registry.register(
+    Counter(
+        "conclib_actor_errors_total",
+        "Messages whose handler raised an exception",
+        ["urn", "message_type"],
+    )
+)
+actor_handler_seconds = registry.register(
+    Histogram(
+        "conclib_actor_handler_seconds",
+        "Time spent handling a message",
+        ["urn", "message_type"],
+    )
+)
+actor_expired = registry.register(
+    Counter(
+        "conclib_actor_expired_total",
+        "Requests dropped without being handled because their deadline had passed",
+        ["urn"],
+    )
+)
+actor_inbox_depth = registry.register(
+    CallbackGauge(
+        "conclib_actor_inbox_depth",
+        "Messages waiting in an actor's inbox",
+        ["urn"],
+        _inbox_depths,
+    )
+)
+actor_inbox_dropped = registry.register(
+    Counter(
+        "conclib_actor_inbox_dropped_total",
+        "Messages dropped or rejected because an actor's inbox was full",
+        ["urn"],
+    )
+)
+actor_batch_size = registry.register(
+    Histogram(
+        "conclib_actor_batch_size",
+        "Messages per batch handled by a BatchingActor",
+        ["urn"],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+)
+ticker_lateness_seconds = registry.register(
+    Histogram(
+        "conclib_ticker_lateness_seconds",
+        "How long after its scheduled time a tick started",
+        ["ticker"],
+    )
+)
+ticker_missed = registry.register(
+    Counter(
+        "conclib_ticker_missed_total",
+        "Ticks that didn't run: late (their time passed while the previous tick ran, see "
+        "the missed tick policy), pending (the previous tick wasn't handled yet) or full "
+        "(the actor's inbox was full)",
+        ["ticker", "reason"],
+    )
+)
+proxy_round_trip_seconds = registry.register(
+    Histogram(
+        "conclib_proxy_round_trip_seconds",
+        "Time for a proxy client's ask_actor to get a response",
+        ["urn", "path"],
+    )
+)
+
+proxy_cache_requests = registry.register(
+    Counter(
+        "conclib_proxy_cache_requests_total",
+        "Cacheable asks by outcome: hit, miss (sent to the actor) or coalesced (waited for "
+        "an identical ask in flight)",
+        ["urn", "result"],
+    )
+)
+
+
+def count_expired(actor_urn: str):
+    if ENABLED:
+        actor_expired.labels(actor_urn).inc()
+
+
+def count_cache_request(actor_urn: str, result: str):
+    if ENABLED:
+        proxy_cache_requests.labels(actor_urn, result).inc()
+
+
+def observe_round_trip(actor_urn: str, path: str, start: float):
+    """Record an ask_actor round trip that started at `start` (time.perf_counter())"""
+    if ENABLED:
+        proxy_round_trip_seconds.labels(actor_urn, path).observe(
+            time.perf_counter() - start
+        )
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(
+    port: int, host: str = "0.0.0.0"
+) -> http.server.ThreadingHTTPServer:
+    """Serve the metrics on every path from a daemon thread, for processes without a web
+    framework. Call shutdown() on the returned server to stop it."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="ConclibMetricsServer", daemon=True
+    )
+    thread.start()
+    return server
@@ -6,66 +6,312 @@ import conclib
 
 from conclib.config import ConclibConfig
 from conclib.utils.redisd.redisclient import RedisClient
-from conclib.proxy.envelope import RequestEnvelope, ResponseEnvelope
+from conclib.proxy.envelope import (
+    STATUS_EXPIRED,
+    RequestEnvelope,
+    ResponseEnvelope,
+    tell_request,
+)
+from conclib import metrics
+from conclib.proxy import blobs, codecs, tracing, transport
 
 from typing import Optional
 
+import dataclasses
+import logging
 import threading
-import json
-import pykka
+import os
+import socket
 import time
+import uuid
+import pykka
+import redis
+
+logger = logging.getLogger(__name__)
 
 
 class RedisPollingThread(threading.Thread):
-    def __init__(self, config: ConclibConfig):
-        super().__init__(name=f"{self.__class__.__name__}")
+    def __init__(
+        self, config: ConclibConfig, poll_timeout: float = 1.0, shard: int = 0
+    ):
+        name = self.__class__.__name__
+        if config.inbound_shards > 1:
+            name = f"{name}-{shard}"
+        super().__init__(name=name)
         self.shutdown_event = threading.Event()
         self.config = config
+        self.shard = shard
+        self.channel = transport.inbound_name(config, shard)
+        # How long to block on the socket waiting for a message before re-checking
+        # for shutdown. This bounds shutdown time, not message latency.
+        self.poll_timeout = poll_timeout
         self.redis_client = None
         self.redis_p = None
+        # Set once requests sent from now on are received
+        self.ready = threading.Event()
 
     def shutdown(self):
         self.shutdown_event.set()
 
     def run(self):
         self.redis_client = RedisClient(config=self.config)
-        self.redis_client.pubsub.subscribe(self.config.inbound_channel_name)
-        print(f"[RedisPollingThread] Subscribed to {self.config.inbound_channel_name}")
-        while True:
-            if self.shutdown_event.is_set():
-                print("[RedisPollingThread] Shutting down")
+        pubsub = self.redis_client.pubsub
+        pubsub.subscribe(self.channel)
+        # Redis confirms the subscription before delivering any message on it
+        while not self.shutdown_event.is_set():
+            message = pubsub.get_message(timeout=self.poll_timeout)
+            if message is not None and message["type"] == "subscribe":
+                break
+        logger.info("Subscribed to %s", self.channel)
+        self.ready.set()
+        while not self.shutdown_event.is_set():
+            # Block until the socket is readable (or we time out), then drain everything
+            # that is already buffered before blocking again
+            message = pubsub.get_message(timeout=self.poll_timeout)
+            while message is not None:
+                self.handle_message(message)
+                message = pubsub.get_message(timeout=0)
+        logger.info("%s shutting down", self.name)
+
+    def handle_message(self, message: dict):
+        if message["type"] != "message":
+            # These are system messages we don't need to handle
+            return
+
+        logger.debug("Received message: %s", message)
+        try:
+            req_envelope = codecs.decode(message["data"], RequestEnvelope)
+        except Exception:
+            # E.g. a request in a codec this version doesn't know (from a newer client).
+            # Its caller times out, the requests after it must still be handled.
+            logger.exception(
+                "Dropping a message on %s that can't be decoded", self.channel
+            )
+            return
+        req_envelope.shard = self.shard
+        req_envelope._redis_conn = self.redis_client.redis_client
+        req_envelope._config = self.config
+        req_envelope.mark(tracing.STAGE_PROXY_RECEIVED)
+        self.dispatch(req_envelope)
+
+    def only_subscriber(self) -> bool:
+        """Whether no other proxy is subscribed to this thread's channel"""
+        [(_, subscribers)] = self.redis_client.redis_client.pubsub_numsub(self.channel)
+        return subscribers <= 1
+
+    def dispatch(self, req_envelope: RequestEnvelope):
+        actor_urn = req_envelope.actor_urn
+        if req_envelope.expired():
+            # The client has stopped waiting, don't spend the actor's time on it
+            metrics.count_expired(actor_urn)
+            req_envelope.respond_error(
+                STATUS_EXPIRED,
+                f"Deadline passed before the request reached {actor_urn}",
+            )
+            return
+
+        actor_ref = pykka.ActorRegistry.get_by_urn(actor_urn)
+        if actor_ref is None and req_envelope.stream_id is None:
+            # Every proxy subscribed to the pubsub channel sees the request, so leave it to
+            # the one whose process runs the actor. Unless this is the only proxy, which
+            # answers not found.
+            if req_envelope.no_reply or not self.only_subscriber():
+                logger.debug("No actor with URN %s in this process", actor_urn)
                 return
+        # This is a tell because the response is routed to the RespondingActor
+        # instead of being handled by this thread (to avoid blocking). Unknown URNs get a
+        # not found response.
+        tell_request(actor_ref, req_envelope)
+
 
-            got_message = False
-            message = self.redis_client.pubsub.get_message()
-            if message:
-                got_message = True
-                if message["type"] == "message":
-                    print(f"[RedisPollingThread] Received message: {message}")
-                    data_dict = json.loads(message["data"])
-                    req_envelope = RequestEnvelope(**data_dict)
-                    actor_urn = req_envelope.actor_urn
+class RedisStreamsPollingThread(RedisPollingThread):
+    """
+    Reads requests from the inbound stream through a consumer group. Every proxy process
+    joins the same group as a separate consumer, so each request is delivered to exactly
+    one of them. A request stays pending until the RespondingActor acks it after
+    publishing the response; requests left pending by a crashed proxy for longer than
+    stream_claim_idle_ms are claimed and delivered again by a live proxy.
+    """
 
-                    # This is a tell because the response is routed to the RespondingActor
-                    # instead of being handled by this thread (to avoid blocking)
-                    actor_ref = pykka.ActorRegistry.get_by_urn(actor_urn)
-                    actor_ref.tell(req_envelope)
+    def __init__(
+        self,
+        config: ConclibConfig,
+        poll_timeout: float = 1.0,
+        shard: int = 0,
+        batch_size: int = 100,
+    ):
+        super().__init__(config, poll_timeout=poll_timeout, shard=shard)
+        self.batch_size = batch_size
+        self.stream = self.channel
+        self.group = config.stream_consumer_group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._claim_cursor = "0-0"
+        self._next_claim_time = 0.0
 
-                else:
-                    # These are system messages we don't need to handle
-                    pass
+    def run(self):
+        self.redis_client = RedisClient(config=self.config)
+        r = self.redis_client.redis_client
+        self.create_group()
+        logger.info("Reading %s as %s/%s", self.stream, self.group, self.consumer)
+        # Requests wait in the stream, so they are received once the group exists
+        self.ready.set()
+        while not self.shutdown_event.is_set():
+            if time.monotonic() >= self._next_claim_time:
+                self.claim_idle_entries()
 
-            if not got_message:
-                time.sleep(0.001)  # be nice to the system :)
+            # Blocks until there are new entries or the timeout expires, and returns
+            # up to batch_size entries at once
+            try:
+                response = r.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {self.stream: ">"},
+                    count=self.batch_size,
+                    block=int(self.poll_timeout * 1000),
+                )
+            except redis.ResponseError as e:
+                if "NOGROUP" not in str(e):
+                    raise
+                # The stream was deleted (e.g. redis was flushed), start over
+                self.create_group()
+                continue
+            for _stream, entries in response or []:
+                for entry_id, fields in entries:
+                    self.handle_entry(entry_id, fields)
+
+        self.remove_consumer()
+        logger.info("%s shutting down", self.name)
+
+    def create_group(self):
+        try:
+            # Start from the beginning of the stream so requests sent before any proxy
+            # was running are still delivered
+            self.redis_client.redis_client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def claim_idle_entries(self):
+        """Take over requests that another consumer read but never acked"""
+        self._next_claim_time = (
+            time.monotonic() + self.config.stream_claim_idle_ms / 1000 / 2
+        )
+        response = self.redis_client.redis_client.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=self.config.stream_claim_idle_ms,
+            start_id=self._claim_cursor,
+            count=self.batch_size,
+        )
+        self._claim_cursor, entries = response[0], response[1]
+        # Entries trimmed from the stream while pending have nothing to deliver
+        entries = [(entry_id, fields) for entry_id, fields in entries if entry_id]
+        for (entry_id, fields), deliveries in zip(entries, self.deliveries(entries)):
+            if deliveries > self.config.stream_max_deliveries:
+                self.drop_entry(entry_id, f"it was delivered {deliveries - 1} times")
+                continue
+            logger.info("Reclaimed %s", entry_id)
+            self.handle_entry(entry_id, fields)
+
+    def deliveries(self, entries: list) -> list[int]:
+        """How many times each (just claimed) entry has been delivered, this time included"""
+        with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+            for entry_id, _ in entries:
+                pipe.xpending_range(
+                    self.stream, self.group, min=entry_id, max=entry_id, count=1
+                )
+            replies = pipe.execute()
+        # An entry acked in the meantime has no pending info left
+        return [reply[0]["times_delivered"] if reply else 0 for reply in replies]
+
+    def drop_entry(self, entry_id: bytes, reason: str):
+        """Ack an entry without delivering it, so it is never reclaimed again"""
+        logger.warning("Dropping %s from %s because %s", entry_id, self.stream, reason)
+        self.redis_client.redis_client.xack(self.stream, self.group, entry_id)
+
+    def handle_entry(self, entry_id: bytes, fields: dict):
+        payload = fields.get(transport.STREAM_ENVELOPE_FIELD.encode())
+        if payload is None:
+            # Not something we know how to handle, don't let it be reclaimed forever
+            self.drop_entry(
+                entry_id, f"it has no {transport.STREAM_ENVELOPE_FIELD} field"
+            )
+            return
+        try:
+            req_envelope = codecs.decode(payload, RequestEnvelope)
+        except Exception:
+            # E.g. a request in a codec this version doesn't know. Reclaiming it would
+            # only make another proxy fail on it too.
+            logger.exception("Can't decode %s from %s", entry_id, self.stream)
+            self.drop_entry(entry_id, "it can't be decoded")
+            return
+        req_envelope.shard = self.shard
+        req_envelope._redis_conn = self.redis_client.redis_client
+        req_envelope._config = self.config
+        req_envelope.mark(tracing.STAGE_PROXY_RECEIVED)
+        if req_envelope.no_reply:
+            # There will be no response to ack it after, so fire-and-forget requests are
+            # delivered at most once
+            self.redis_client.redis_client.xack(self.stream, self.group, entry_id)
+        else:
+            req_envelope.stream_id = entry_id.decode()
+        self.dispatch(req_envelope)
+
+    def remove_consumer(self):
+        """Leave the group on clean shutdown, unless we still own pending requests"""
+        r = self.redis_client.redis_client
+        try:
+            pending = r.xpending_range(
+                self.stream,
+                self.group,
+                min="-",
+                max="+",
+                count=1,
+                consumername=self.consumer,
+            )
+            if not pending:
+                r.xgroup_delconsumer(self.stream, self.group, self.consumer)
+        except redis.ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            # The stream or group was deleted, there is nothing to leave
 
 
 class RespondingActor(conclib.Actor):
-    def __init__(self, config: ConclibConfig):
+    """
+    Owns the polling thread for one inbound shard and publishes the responses to the
+    requests that arrived on it. start_proxy starts one per shard.
+    """
+
+    # Override to force a specific polling loop. By default it is chosen from config.transport
+    polling_thread_class: Optional[type[RedisPollingThread]] = None
+
+    def __init__(self, config: ConclibConfig, shard: int = 0):
+        transport.check_transport(config)
+        transport.check_shards(config)
+        codecs.get_codec(config.codec)
+        blobs.check_blob_config(config)
         self.config = config
+        self.shard = shard
         self.redis_client: Optional[RedisClient] = None
-        self.redis_polling_thread = RedisPollingThread(config)
+        self.redis_polling_thread = self.create_polling_thread()
+
+        super().__init__(urn=transport.responding_actor_urn(shard))
 
-        super().__init__(urn=conclib.constants.RESPONDING_ACTOR)
+    def create_polling_thread(self) -> RedisPollingThread:
+        if self.polling_thread_class is not None:
+            return self.polling_thread_class(self.config, shard=self.shard)
+        if self.config.transport == transport.STREAMS:
+            return RedisStreamsPollingThread(self.config, shard=self.shard)
+        return RedisPollingThread(self.config, shard=self.shard)
+
+    @property
+    def ready(self) -> threading.Event:
+        """Set once the polling thread receives requests"""
+        return self.redis_polling_thread.ready
 
     def on_start(self):
         self.redis_client = RedisClient(self.config)
@@ -85,17 +331,65 @@ class RespondingActor(conclib.Actor):
         self.redis_polling_thread.join()
 
     def on_receive(self, message):
-        print("[RespondingActor] on_receive reached")
         if not isinstance(message, ResponseEnvelope):
             raise RuntimeError(
                 "RespondingActor received message that is not a ResponseEnvelope. This is an implementation bug"
             )
-        response_channel = self.config.outbound_channel_prefix + message.message_id
-        print(f"[RespondingActor] Publishing ResponseEnvelope to {response_channel}")
-        self.redis_client.redis_client.publish(
-            channel=response_channel, message=message.model_dump_json()
-        )
+        if message.status != STATUS_EXPIRED:
+            response_channel = message.reply_to or (
+                self.config.outbound_channel_prefix + message.message_id
+            )
+            logger.debug("Publishing ResponseEnvelope to %s", response_channel)
+            message.mark(tracing.STAGE_RESPONSE_PUBLISHED)
+            codec_name = message.codec or self.config.codec
+            message, writes = blobs.offload(message, self.config, codec_name)
+            # The blobs are written before the response that refers to them
+            with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+                blobs.write_redis(pipe, writes, self.config.blob_ttl_s)
+                pipe.publish(
+                    channel=response_channel,
+                    message=codecs.encode(message, codec_name),
+                )
+                pipe.execute()
+        if message.stream_id is not None:
+            # The request has been answered, so it must not be reclaimed by another proxy
+            self.redis_client.redis_client.xack(
+                transport.inbound_name(self.config, self.shard),
+                self.config.stream_consumer_group,
+                message.stream_id,
+            )
 
 
-def start_proxy(config: ConclibConfig):
-    RespondingActor.start(config)
+def start_proxy(
+    config: ConclibConfig,
+    shards: Optional[int] = None,
+    startup_timeout: Optional[float] = 10.0,
+) -> list[pykka.ActorRef]:
+    """
+    Start a RespondingActor and polling thread for each inbound shard, and return once
+    every polling thread receives requests. Raises ProxyDidntStartError if that takes
+    longer than startup_timeout seconds. With startup_timeout=None it returns right away;
+    wait on the `ready` event of each RespondingActor instead.
+
+    shards overrides config.inbound_shards; clients must be created with a config that has
+    the same number of shards, so prefer setting it on the config.
+    """
+    if shards is not None:
+        config = dataclasses.replace(config, inbound_shards=shards)
+    transport.check_shards(config)
+    actor_refs = [
+        RespondingActor.start(config, shard=shard)
+        for shard in range(config.inbound_shards)
+    ]
+    if startup_timeout is not None:
+        deadline = time.monotonic() + startup_timeout
+        for actor_ref in actor_refs:
+            ready: threading.Event = actor_ref.proxy().ready.get(
+                timeout=startup_timeout
+            )
+            if not ready.wait(max(0.0, deadline - time.monotonic())):
+                raise conclib.errors.ProxyDidntStartError(
+                    f"{actor_ref.actor_urn} didn't start receiving requests within "
+                    f"{startup_timeout} seconds"
+                )
+    return actor_refs
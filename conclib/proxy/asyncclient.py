@@ -0,0 +1,548 @@
+import conclib
+from conclib.errors import AskTimeoutError
+from conclib.utils.redisd import redisclient
+from conclib import ActorMessage, metrics
+from conclib.config import ConclibConfig
+from conclib.proxy import blobs, codecs, streaming, tracing, transport
+from conclib.proxy.messages import Priority
+from conclib.proxy.cache import ABANDONED, ResponseCache, cache_key, fresh_copy
+from conclib.proxy.client import (
+    TraceHook,
+    create_local_request_envelope,
+    create_request_envelope,
+    deadline_for,
+    report_trace,
+    trace_id_for,
+    undelivered_response,
+)
+from conclib.proxy.envelope import (
+    STATUS_OK,
+    RequestEnvelope,
+    ResponseEnvelope,
+    tell_request,
+)
+
+from typing import AsyncIterator, Callable, Optional, Sequence, TypeVar, Type
+
+import asyncio
+import logging
+import time
+import uuid
+
+import pykka
+
+ActorMessageType = TypeVar("ActorMessageType", bound=conclib.ActorMessage)
+
+logger = logging.getLogger(__name__)
+
+
+def _set_result_unless_done(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _local_reply_hook(future: asyncio.Future) -> Callable[[ResponseEnvelope], None]:
+    """A reply hook that resolves an asyncio future from the actor's thread"""
+    loop = future.get_loop()
+
+    def reply_hook(resp_envelope: ResponseEnvelope):
+        resp_envelope.mark(tracing.STAGE_CLIENT_RECEIVED)
+        loop.call_soon_threadsafe(_set_result_unless_done, future, resp_envelope)
+
+    return reply_hook
+
+
+async def _result(awaitable, actor_urn: str, timeout: Optional[float]):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise AskTimeoutError(actor_urn, timeout) from None
+
+
+class AsyncProxyClient:
+    """
+    asyncio version of ProxyClient, for use inside an event loop (e.g. a FastAPI app).
+
+    Uses the same RequestEnvelope/ResponseEnvelope wire format as ProxyClient, so actors
+    don't need to know which client sent a request. The client subscribes once to its own
+    reply channel and a single background task resolves the future of each waiting
+    ask_actor call, so any number of asks can be awaited concurrently.
+
+    Requests to actors running in the same process skip redis, as with ProxyClient (see
+    force_redis), and on_trace and cache work as with ProxyClient. The hook is called
+    from the event loop, and a RedisCache is read and written from a worker thread.
+
+    A client is bound to the event loop it is first used from. Create one per loop (e.g.
+    in a FastAPI lifespan handler) and close it with `await client.close()`, or use it as
+    an async context manager.
+    """
+
+    def __init__(
+        self,
+        config: ConclibConfig,
+        max_connections: int = 64,
+        force_redis: bool = False,
+        on_trace: Optional[TraceHook] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        transport.check_transport(config)
+        transport.check_shards(config)
+        blobs.check_blob_config(config)
+        self.config = config
+        self.codec = codecs.get_codec(config.codec)
+        self.force_redis = force_redis
+        self.on_trace = on_trace
+        self.cache = cache
+        self.client_id = str(uuid.uuid4())
+        self.reply_channel = self.config.outbound_channel_prefix + self.client_id
+        self.redis_client = redisclient.AsyncRedisClient(
+            self.config, max_connections=max_connections
+        )
+
+        self._pending: dict[str, asyncio.Future] = {}
+        # message_id -> queue of the streamed response items of an ask_stream
+        self._streams: dict[str, asyncio.Queue] = {}
+        self._receiver_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        # Cache key -> the response of the cacheable ask in flight for it
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __aenter__(self) -> "AsyncProxyClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self):
+        """Subscribe to the reply channel and start the receiver task. Called automatically
+        by the first ask_actor."""
+        async with self._start_lock:
+            if self._receiver_task is not None:
+                return
+            pubsub = self.redis_client.pubsub
+            await pubsub.subscribe(self.reply_channel)
+            # Wait for redis to confirm the subscription so no response can be published
+            # before we are listening for it
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message["type"] == "subscribe":
+                    break
+            self._receiver_task = asyncio.create_task(
+                self._receive(), name=f"AsyncProxyClient-{self.client_id}"
+            )
+            logger.info("Subscribed to %s", self.reply_channel)
+
+    async def close(self):
+        """Stop the receiver task, fail any outstanding asks and release the connections"""
+        if self._receiver_task is not None:
+            self._receiver_task.cancel()
+            try:
+                await self._receiver_task
+            except asyncio.CancelledError:
+                pass
+            self._receiver_task = None
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        await self.redis_client.aclose()
+
+    async def _receive(self):
+        async for message in self.redis_client.pubsub.listen():
+            if message["type"] != "message":
+                continue
+            try:
+                resp_envelope = codecs.decode(message["data"], ResponseEnvelope)
+            except Exception:
+                # See ProxyClientReceiverThread.run
+                logger.exception(
+                    "Dropping a message on %s that can't be decoded", self.reply_channel
+                )
+                continue
+            resp_envelope.mark(tracing.STAGE_CLIENT_RECEIVED)
+            self._deliver(resp_envelope)
+
+    def _deliver(self, resp_envelope: ResponseEnvelope):
+        """Resolve the future waiting for this response, see ProxyClient.deliver"""
+        stream = self._streams.get(resp_envelope.message_id)
+        if stream is not None:
+            stream.put_nowait(resp_envelope)
+            return
+        future = self._pending.pop(resp_envelope.message_id, None)
+        if future is None or future.done():
+            # Nobody is waiting for this response any more (e.g. the caller was cancelled)
+            return
+        future.set_result(resp_envelope)
+
+    def local_actor(self, actor_urn: str) -> Optional[pykka.ActorRef]:
+        """The actor, if it runs in this process and requests to it may bypass redis"""
+        if self.force_redis:
+            return None
+        return pykka.ActorRegistry.get_by_urn(actor_urn)
+
+    async def ask_actor(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        response_type: Type[ActorMessageType],
+        trace_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[Priority] = None,
+    ) -> ActorMessageType:
+        """Async version of ProxyClient.ask_actor"""
+        if self.cache is not None and contents.CACHE_TTL is not None:
+            resp_envelope = await self._ask_cached(
+                actor_urn, contents, trace_id, timeout, priority
+            )
+        else:
+            resp_envelope = await self._ask(
+                actor_urn, contents, trace_id, timeout, priority
+            )
+        return resp_envelope.extract(response_type)
+
+    async def _cache_call(self, method: Callable, *args):
+        if self.cache.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _ask_cached(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        """Async version of ProxyClient._ask_cached"""
+        key = cache_key(actor_urn, contents)
+        end = None if timeout is None else time.monotonic() + timeout
+        coalesced = False
+        while True:
+            remaining = None if end is None else max(0.0, end - time.monotonic())
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = (
+                    asyncio.get_running_loop().create_future()
+                )
+                return await self._lead_cached(
+                    key, future, actor_urn, contents, trace_id, remaining, priority
+                )
+            if not coalesced:
+                metrics.count_cache_request(actor_urn, "coalesced")
+                coalesced = True
+            # Shielded so that a cancelled or timed out caller doesn't cancel the others
+            resp_envelope = await _result(asyncio.shield(future), actor_urn, remaining)
+            if resp_envelope is not ABANDONED:
+                return fresh_copy(resp_envelope)
+
+    async def _lead_cached(
+        self,
+        key: str,
+        future: asyncio.Future,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        """Async version of ProxyClient._lead_cached"""
+        try:
+            resp_envelope = await self._cache_call(self.cache.get, key)
+            if resp_envelope is not None:
+                metrics.count_cache_request(actor_urn, "hit")
+            else:
+                metrics.count_cache_request(actor_urn, "miss")
+                resp_envelope = await self._ask(
+                    actor_urn, contents, trace_id, timeout, priority
+                )
+                # Blobs are read once, so a response that had some can't be served again
+                if resp_envelope.status == STATUS_OK and not resp_envelope._fetched:
+                    await self._cache_call(
+                        self.cache.set,
+                        key,
+                        resp_envelope.model_copy(
+                            update={"trace_id": None, "timings": None}
+                        ),
+                        contents.CACHE_TTL,
+                    )
+        except AskTimeoutError:
+            # Only this caller's timeout passed
+            future.set_result(ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting for it, which asyncio would log
+            future.exception()
+            raise
+        except BaseException:
+            # E.g. this caller was cancelled
+            future.set_result(ABANDONED)
+            raise
+        else:
+            future.set_result(resp_envelope)
+        finally:
+            del self._inflight[key]
+        return resp_envelope
+
+    async def _ask(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        start = time.perf_counter()
+        trace_id = trace_id_for(self.on_trace, trace_id)
+        deadline = deadline_for(timeout)
+        actor_ref = self.local_actor(actor_urn)
+        if actor_ref is not None:
+            future = asyncio.get_running_loop().create_future()
+            message = create_local_request_envelope(
+                actor_urn,
+                contents,
+                _local_reply_hook(future),
+                trace_id=trace_id,
+                deadline=deadline,
+                priority=priority,
+            )
+            tell_request(actor_ref, message)
+            resp_envelope: ResponseEnvelope = await _result(future, actor_urn, timeout)
+            metrics.observe_round_trip(actor_urn, "local", start)
+            report_trace(self.on_trace, message, resp_envelope)
+            return resp_envelope
+
+        if self._receiver_task is None:
+            await self.start()
+
+        message = create_request_envelope(
+            actor_urn,
+            contents,
+            self.reply_channel,
+            trace_id=trace_id,
+            deadline=deadline,
+            priority=priority,
+            bare_message_type=self.config.bare_message_types,
+        )
+        future = asyncio.get_running_loop().create_future()
+        # Register before publishing so a fast response can't arrive before we are waiting
+        self._pending[message.message_id] = future
+        try:
+            await self._send(message)
+            resp_envelope: ResponseEnvelope = await _result(future, actor_urn, timeout)
+            await self._fetch(resp_envelope)
+        finally:
+            self._pending.pop(message.message_id, None)
+        metrics.observe_round_trip(actor_urn, "redis", start)
+        report_trace(self.on_trace, message, resp_envelope)
+        return resp_envelope
+
+    async def ask_stream(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        response_type: Type[ActorMessageType],
+        window: int = 16,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[ActorMessageType]:
+        """Async version of ProxyClient.ask_stream. Stop early with `await stream.aclose()`
+        (or by leaving an `async for`) to cancel the stream."""
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        actor_ref = self.local_actor(actor_urn)
+        if actor_ref is not None:
+            message = create_local_request_envelope(
+                actor_urn,
+                contents,
+                lambda resp_envelope: loop.call_soon_threadsafe(
+                    items.put_nowait, resp_envelope
+                ),
+                stream_window=window,
+            )
+            credits = message._stream_credits = streaming.LocalCredits(window)
+        else:
+            if self._receiver_task is None:
+                await self.start()
+            message = create_request_envelope(
+                actor_urn,
+                contents,
+                self.reply_channel,
+                stream_window=window,
+                bare_message_type=self.config.bare_message_types,
+            )
+            credits = None
+            self._streams[message.message_id] = items
+
+        async def grant(count: int):
+            if credits is not None:
+                if count == streaming.CANCELLED:
+                    credits.cancel()
+                else:
+                    credits.grant(count)
+                return
+            async with self.redis_client.redis_client.pipeline(
+                transaction=False
+            ) as pipe:
+                streaming.send_grant(pipe, message.message_id, count)
+                await pipe.execute()
+
+        finished = False
+        try:
+            if actor_ref is not None:
+                tell_request(actor_ref, message)
+            else:
+                await self._send(message)
+            consumed = 0
+            while True:
+                resp_envelope: ResponseEnvelope = await _result(
+                    items.get(), actor_urn, timeout
+                )
+                if resp_envelope.end_of_stream or resp_envelope.seq is None:
+                    finished = True
+                if resp_envelope.end_of_stream:
+                    return
+                await self._fetch(resp_envelope)
+                yield resp_envelope.extract(response_type)
+                if finished:
+                    return
+                consumed += 1
+                if consumed == streaming.grant_batch(window):
+                    await grant(consumed)
+                    consumed = 0
+        finally:
+            self._streams.pop(message.message_id, None)
+            if not finished:
+                await grant(streaming.CANCELLED)
+
+    async def ask_many(
+        self,
+        requests: Sequence[tuple[str, ActorMessage, Type[ActorMessage]]],
+        timeout: Optional[float] = None,
+    ) -> list[ActorMessage | Exception]:
+        """Async version of ProxyClient.ask_many"""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in requests]
+        deadline = deadline_for(timeout)
+        envelopes = []
+        remote_envelopes = []
+        for (actor_urn, contents, _), future in zip(requests, futures):
+            actor_ref = self.local_actor(actor_urn)
+            if actor_ref is not None:
+                envelope = create_local_request_envelope(
+                    actor_urn,
+                    contents,
+                    _local_reply_hook(future),
+                    trace_id=trace_id_for(self.on_trace, None),
+                    deadline=deadline,
+                )
+                envelopes.append(envelope)
+                tell_request(actor_ref, envelope)
+                continue
+            envelope = create_request_envelope(
+                actor_urn,
+                contents,
+                self.reply_channel,
+                trace_id=trace_id_for(self.on_trace, None),
+                deadline=deadline,
+                bare_message_type=self.config.bare_message_types,
+            )
+            envelopes.append(envelope)
+            remote_envelopes.append(envelope)
+            self._pending[envelope.message_id] = future
+
+        try:
+            if remote_envelopes:
+                if self._receiver_task is None:
+                    await self.start()
+                await self._send_pipelined(remote_envelopes)
+            if futures:
+                await asyncio.wait(futures, timeout=timeout)
+        finally:
+            for envelope in remote_envelopes:
+                self._pending.pop(envelope.message_id, None)
+
+        results = []
+        for (actor_urn, _, response_type), future, envelope in zip(
+            requests, futures, envelopes
+        ):
+            if not future.done():
+                future.cancel()
+                results.append(AskTimeoutError(actor_urn, timeout))
+                continue
+            resp_envelope: ResponseEnvelope = future.result()
+            report_trace(self.on_trace, envelope, resp_envelope)
+            try:
+                await self._fetch(resp_envelope)
+                results.append(resp_envelope.extract(response_type))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def tell_many(self, messages: Sequence[tuple[str, ActorMessage]]):
+        """Async version of ProxyClient.tell_many"""
+        remote_envelopes = []
+        for actor_urn, contents in messages:
+            actor_ref = self.local_actor(actor_urn)
+            if actor_ref is not None:
+                tell_request(
+                    actor_ref,
+                    create_local_request_envelope(actor_urn, contents, reply_hook=None),
+                )
+            else:
+                remote_envelopes.append(
+                    create_request_envelope(
+                        actor_urn,
+                        contents,
+                        reply_to=None,
+                        no_reply=True,
+                        bare_message_type=self.config.bare_message_types,
+                    )
+                )
+        if remote_envelopes:
+            await self._send_pipelined(remote_envelopes)
+
+    async def _send(self, envelope: RequestEnvelope):
+        envelope, writes = blobs.offload(envelope, self.config, self.codec.name)
+        if not writes:
+            reply = await transport.send_request(
+                self.redis_client.redis_client,
+                self.config,
+                envelope.actor_urn,
+                self.codec.encode(envelope),
+            )
+        else:
+            async with self.redis_client.redis_client.pipeline(
+                transaction=False
+            ) as pipe:
+                blobs.write_redis(pipe, writes, self.config.blob_ttl_s)
+                transport.send_request(
+                    pipe, self.config, envelope.actor_urn, self.codec.encode(envelope)
+                )
+                reply = (await pipe.execute())[-1]
+        self._check_delivered(envelope, reply)
+
+    async def _send_pipelined(self, envelopes: list[RequestEnvelope]):
+        # Index of each request's send_request in the pipeline's replies
+        indexes = []
+        async with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+            for envelope in envelopes:
+                envelope, writes = blobs.offload(envelope, self.config, self.codec.name)
+                blobs.write_redis(pipe, writes, self.config.blob_ttl_s)
+                transport.send_request(
+                    pipe, self.config, envelope.actor_urn, self.codec.encode(envelope)
+                )
+                indexes.append(len(pipe) - 1)
+            replies = await pipe.execute()
+        for envelope, index in zip(envelopes, indexes):
+            self._check_delivered(envelope, replies[index])
+
+    def _check_delivered(self, envelope: RequestEnvelope, reply):
+        resp_envelope = undelivered_response(self.config, envelope, reply)
+        if resp_envelope is not None:
+            self._deliver(resp_envelope)
+
+    async def _fetch(self, resp_envelope: ResponseEnvelope):
+        await blobs.afetch(resp_envelope, self.redis_client.redis_client, self.config)
@@ -0,0 +1,355 @@
+# Out-of-band transport for large binary payloads.
+#
+# With config.blob_threshold set, binary values (bytes, bytearray, memoryview) of at least
+# that many bytes in the contents of an envelope sent through redis are stored separately
+# and the envelope only carries a reference to them. This keeps large payloads out of the
+# pub/sub message or stream entry, and out of the JSON encoder (which would base64 them).
+# Smaller binary values are base64 encoded inline for the JSON codecs, which can't carry
+# bytes otherwise, and left alone for msgpack.
+#
+# Stores:
+# - "redis": a key that is deleted when it is read, or expires after config.blob_ttl_s if
+#   it isn't. Works across hosts. Requests through the streams transport can be
+#   redelivered, so their keys are left to expire instead.
+# - "shm": a file in /dev/shm, mapped into memory by the receiver and removed once read.
+#   Only for deployments where every client and proxy runs on one host.
+#
+# References are only followed when this process has blob_threshold set, and only to
+# blobs this module writes: shm files named SHM_PREFIX + a uuid in SHM_DIR, and redis keys
+# under REDIS_KEY_PREFIX. Anything else raises BlobNotFoundError, so whoever can publish
+# a request can't make the proxy read (or remove) other files or keys.
+#
+# Declare a field as Buffer to receive it as a memoryview without copying it (from a shm
+# mapping, or over the bytes read from redis). Fields typed bytes get bytes.
+#
+# Requests to actors in the same process never leave it, so they are not affected.
+import base64
+import glob
+import mmap
+import os
+import re
+import time
+import uuid
+
+from typing import Annotated, Any, Callable, Optional, TypeVar
+
+from pydantic import BaseModel, PlainSerializer, PlainValidator
+from pydantic.fields import FieldInfo
+
+from conclib.config import ConclibConfig
+from conclib.errors import BlobNotFoundError
+
+REDIS = "redis"
+SHM = "shm"
+BLOB_STORES = (REDIS, SHM)
+# Small values base64 encoded in the reference itself
+INLINE = "inline"
+
+# Marks a reference in place of a binary value in envelope contents
+REF_KEY = "__conclib_blob__"
+REDIS_KEY_PREFIX = "conclib:blob:"
+SHM_DIR = "/dev/shm"
+SHM_PREFIX = "conclib-blob-"
+# Names of the blobs written by this module, see _shm_write and _Offloader.store
+_SHM_NAME = re.compile(re.escape(SHM_PREFIX) + "[0-9a-f]{32}")
+# Codecs that can carry bytes as they are
+_BINARY_CODECS = ("msgpack",)
+
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+
+# RequestEnvelope or ResponseEnvelope
+EnvelopeType = TypeVar("EnvelopeType", bound=BaseModel)
+
+
+def _validate_buffer(value: Any) -> memoryview:
+    if isinstance(value, memoryview):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return memoryview(value)
+    if isinstance(value, str):
+        # The JSON form, see _serialize_buffer
+        return memoryview(base64.b64decode(value))
+    raise ValueError(f"Expected bytes, bytearray or memoryview, got {type(value)}")
+
+
+def _serialize_buffer(value: memoryview) -> str:
+    return base64.b64encode(value).decode()
+
+
+_BUFFER_VALIDATOR = PlainValidator(_validate_buffer)
+
+# Field type for binary data that is received without copying where possible. Accepts
+# bytes, bytearray or memoryview and holds a memoryview.
+Buffer = Annotated[
+    Any, _BUFFER_VALIDATOR, PlainSerializer(_serialize_buffer, when_used="json")
+]
+
+
+def check_blob_config(config: ConclibConfig):
+    if config.blob_threshold is None:
+        return
+    if config.blob_threshold < 1:
+        raise ValueError(
+            f"blob_threshold must be at least 1, got {config.blob_threshold}"
+        )
+    if config.blob_store not in BLOB_STORES:
+        raise ValueError(
+            f"Unknown blob store {config.blob_store!r}, expected one of {BLOB_STORES}"
+        )
+    if config.blob_store == SHM and not os.path.isdir(SHM_DIR):
+        raise ValueError(f"The shm blob store needs {SHM_DIR}")
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and REF_KEY in value
+
+
+class _Offloader:
+    def __init__(self, config: ConclibConfig, codec_name: str):
+        self.config = config
+        self.inline = codec_name not in _BINARY_CODECS
+        # (redis key, payload) for the caller to write
+        self.redis_writes: list[tuple[str, Any]] = []
+        self.count = 0
+
+    def walk(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: self.walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.walk(v) for v in value]
+        if not isinstance(value, _BYTES_TYPES):
+            return value
+        view = memoryview(value)
+        if view.nbytes >= self.config.blob_threshold:
+            self.count += 1
+            return {REF_KEY: self.store(view)}
+        if self.inline:
+            self.count += 1
+            return {REF_KEY: {"store": INLINE, "data": base64.b64encode(view).decode()}}
+        return value
+
+    def store(self, view: memoryview) -> dict:
+        if self.config.blob_store == SHM:
+            return {"store": SHM, "path": _shm_write(view, self.config.blob_ttl_s)}
+        key = REDIS_KEY_PREFIX + uuid.uuid4().hex
+        self.redis_writes.append((key, view))
+        return {"store": REDIS, "key": key}
+
+
+def offload(envelope: EnvelopeType, config: ConclibConfig, codec_name: str):
+    """
+    Replace the binary values in an envelope's contents by references, before it is sent
+    with codec_name. Returns the envelope to send (a copy, if anything was replaced) and
+    the (key, payload) pairs the caller must write to redis, with write_redis(), first.
+    """
+    if config.blob_threshold is None:
+        return envelope, []
+    offloader = _Offloader(config, codec_name)
+    contents = offloader.walk(envelope.contents)
+    if offloader.count == 0:
+        return envelope, []
+    return envelope.model_copy(
+        update={"contents": contents, "blobs": True}
+    ), offloader.redis_writes
+
+
+def write_redis(redis_conn, writes: list[tuple[str, Any]], ttl_s: int):
+    """Queue the writes returned by offload() on a redis connection or pipeline"""
+    for key, payload in writes:
+        redis_conn.set(key, payload, ex=ttl_s)
+
+
+_last_sweep = 0.0
+
+
+def _shm_write(view: memoryview, ttl_s: int) -> str:
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep > 60:
+        # Remove blobs nobody read, e.g. requests that reached a proxy without their actor
+        _last_sweep = now
+        for path in glob.glob(os.path.join(SHM_DIR, SHM_PREFIX + "*")):
+            try:
+                if os.path.getmtime(path) < now - ttl_s:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+    path = os.path.join(SHM_DIR, SHM_PREFIX + uuid.uuid4().hex)
+    with open(path, "wb") as f:
+        f.write(view)
+    return path
+
+
+def _check_ref(ref: Any) -> dict:
+    """The reference, if it is one this module could have written"""
+    store = ref.get("store") if isinstance(ref, dict) else None
+    if store == INLINE and isinstance(ref.get("data"), str):
+        return ref
+    if store == REDIS:
+        key = ref.get("key")
+        if isinstance(key, str) and key.startswith(REDIS_KEY_PREFIX):
+            return ref
+    if store == SHM:
+        path = ref.get("path")
+        if (
+            isinstance(path, str)
+            and os.path.dirname(os.path.realpath(path)) == os.path.realpath(SHM_DIR)
+            and _SHM_NAME.fullmatch(os.path.basename(path))
+        ):
+            return ref
+    raise BlobNotFoundError(f"Not a blob reference: {ref!r}")
+
+
+def _shm_read(path: str) -> memoryview:
+    try:
+        # Not following a symlink put in place of the blob
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except FileNotFoundError:
+        raise BlobNotFoundError(
+            f"{path} doesn't exist. It was already read, expired, or written on another "
+            f"host (the shm blob store only works on one host)"
+        ) from None
+    except OSError as e:
+        raise BlobNotFoundError(f"{path} isn't a blob: {e}") from None
+    try:
+        mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    # The mapping stays valid after the file is removed
+    os.unlink(path)
+    return memoryview(mapping)
+
+
+def _redis_keys(value: Any, keys: list[str]):
+    if is_ref(value):
+        ref = _check_ref(value[REF_KEY])
+        if ref["store"] == REDIS:
+            keys.append(ref["key"])
+    elif isinstance(value, dict):
+        for v in value.values():
+            _redis_keys(v, keys)
+    elif isinstance(value, list):
+        for v in value:
+            _redis_keys(v, keys)
+
+
+def _replace(value: Any, load: Callable[[dict], Any]) -> Any:
+    if is_ref(value):
+        return load(value[REF_KEY])
+    if isinstance(value, dict):
+        return {k: _replace(v, load) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace(v, load) for v in value]
+    return value
+
+
+def _loader(loaded: dict[str, Optional[bytes]]) -> Callable[[dict], Any]:
+    def load(ref: Any) -> Any:
+        ref = _check_ref(ref)
+        store = ref["store"]
+        if store == INLINE:
+            return base64.b64decode(ref["data"])
+        if store == SHM:
+            return _shm_read(ref["path"])
+        payload = loaded.get(ref["key"])
+        if payload is None:
+            raise BlobNotFoundError(f"Blob {ref['key']} expired or was never written")
+        return payload
+
+    return load
+
+
+def _fetched(envelope: EnvelopeType, contents: dict):
+    envelope.contents = contents
+    envelope.blobs = False
+    envelope._fetched = True
+
+
+def _refs_allowed(envelope: EnvelopeType, config: Optional[ConclibConfig]):
+    if config is None or config.blob_threshold is None:
+        raise BlobNotFoundError(
+            f"{type(envelope).__name__} {envelope.message_id} refers to blobs, but "
+            f"blob_threshold isn't set in this process"
+        )
+
+
+def fetch(
+    envelope: EnvelopeType,
+    redis_conn,
+    config: Optional[ConclibConfig],
+    delete: bool = True,
+):
+    """Replace the references in a received envelope's contents by their payloads, reading
+    them from redis in one round trip, and deleting them unless delete is False (for a
+    request that can be redelivered). Does nothing if there are none. Raises
+    BlobNotFoundError if config doesn't enable blobs."""
+    if not envelope.blobs:
+        return
+    _refs_allowed(envelope, config)
+    keys: list[str] = []
+    _redis_keys(envelope.contents, keys)
+    loaded = {}
+    if keys:
+        if redis_conn is None:
+            raise BlobNotFoundError("No redis connection to read blobs from")
+        if delete:
+            with redis_conn.pipeline() as pipe:
+                pipe.mget(keys)
+                pipe.delete(*keys)
+                payloads = pipe.execute()[0]
+        else:
+            payloads = redis_conn.mget(keys)
+        loaded = dict(zip(keys, payloads))
+    _fetched(envelope, _replace(envelope.contents, _loader(loaded)))
+
+
+async def afetch(
+    envelope: EnvelopeType,
+    redis_conn,
+    config: Optional[ConclibConfig],
+    delete: bool = True,
+):
+    """fetch() with a redis.asyncio connection"""
+    if not envelope.blobs:
+        return
+    _refs_allowed(envelope, config)
+    keys: list[str] = []
+    _redis_keys(envelope.contents, keys)
+    loaded = {}
+    if keys:
+        if delete:
+            async with redis_conn.pipeline() as pipe:
+                pipe.mget(keys)
+                pipe.delete(*keys)
+                payloads = (await pipe.execute())[0]
+        else:
+            payloads = await redis_conn.mget(keys)
+        loaded = dict(zip(keys, payloads))
+    _fetched(envelope, _replace(envelope.contents, _loader(loaded)))
+
+
+def _is_buffer(field: Optional[FieldInfo]) -> bool:
+    return field is not None and _BUFFER_VALIDATOR in field.metadata
+
+
+def to_bytes(value: Any) -> Any:
+    """Copy the memoryviews in fetched contents into bytes, e.g. to pickle them"""
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, dict):
+        return {k: to_bytes(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_bytes(v) for v in value]
+    return value
+
+
+def contents_for(envelope: EnvelopeType, cls: type) -> dict:
+    """The contents of a fetched envelope, ready for cls.model_validate: memoryviews (from
+    the shm store) are kept for top level Buffer fields and copied into bytes elsewhere"""
+    if not envelope._fetched:
+        return envelope.contents
+    fields = cls.model_fields
+    return {
+        name: value if _is_buffer(fields.get(name)) else to_bytes(value)
+        for name, value in envelope.contents.items()
+    }
@@ -0,0 +1,124 @@
+# Response caching for proxy clients.
+#
+# An ActorMessage class with a CACHE_TTL (seconds) is treated as an idempotent lookup: a
+# client with a cache answers a repeated ask_actor for the same actor URN, message type
+# and contents from the cache for CACHE_TTL seconds after a response arrived, without
+# sending the request. Concurrent identical asks in one client are coalesced, so only the
+# first one reaches the actor and the rest wait for its response (single-flight).
+#
+# LRUCache keeps responses in the client's process. RedisCache shares them between every
+# client using the same redis. Only successful responses are cached.
+import collections
+import hashlib
+import json
+import threading
+import time
+
+from typing import Optional
+
+from conclib.config import ConclibConfig
+from conclib.proxy import codecs
+from conclib.proxy.envelope import ResponseEnvelope
+from conclib.proxy.messages import ActorMessage
+from conclib.utils.redisd import redisclient
+
+
+def cache_key(actor_urn: str, contents: ActorMessage) -> str:
+    """Identifies an ask by actor, message type and contents"""
+    digest = hashlib.sha256(
+        json.dumps(
+            contents.model_dump(mode="json"), sort_keys=True, separators=(",", ":")
+        ).encode()
+    ).hexdigest()
+    return f"{actor_urn}:{contents.type_id()}:{digest}"
+
+
+def fresh_copy(resp_envelope: ResponseEnvelope) -> ResponseEnvelope:
+    """A copy of a shared response whose extract() builds a new message, so callers can't
+    change each other's responses"""
+    copy = resp_envelope.model_copy()
+    copy._extracted = None
+    return copy
+
+
+# Result of a coalesced ask whose caller gave up on it (it timed out or was cancelled),
+# for the callers waiting for it. One of them asks again in its place, so each caller only
+# gets its own timeout or cancellation.
+ABANDONED = object()
+
+
+class ResponseCache:
+    # Whether get/set do network IO. AsyncProxyClient runs them in a thread if so.
+    blocking: bool = False
+
+    def get(self, key: str) -> Optional[ResponseEnvelope]:
+        raise NotImplementedError
+
+    def set(self, key: str, resp_envelope: ResponseEnvelope, ttl: float):
+        raise NotImplementedError
+
+
+class LRUCache(ResponseCache):
+    """In-process cache of at most max_entries responses. Thread-safe."""
+
+    def __init__(self, max_entries: int = 10_000):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+        self.max_entries = max_entries
+        # key -> (time.monotonic() it expires at, response), least recently used first
+        self._entries: collections.OrderedDict[str, tuple[float, ResponseEnvelope]] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ResponseEnvelope]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, resp_envelope = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return fresh_copy(resp_envelope)
+
+    def set(self, key: str, resp_envelope: ResponseEnvelope, ttl: float):
+        entry = (time.monotonic() + ttl, fresh_copy(resp_envelope))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache(ResponseCache):
+    """Cache shared through redis. Entries are encoded with the config's codec and expire
+    through redis' own key expiry."""
+
+    blocking = True
+
+    def __init__(self, config: ConclibConfig, key_prefix: str = "conclib:cache:"):
+        self.codec = codecs.get_codec(config.codec)
+        self.key_prefix = key_prefix
+        self.redis_client = redisclient.RedisClient(config).redis_client
+
+    def get(self, key: str) -> Optional[ResponseEnvelope]:
+        data = self.redis_client.get(self.key_prefix + key)
+        if data is None:
+            return None
+        return codecs.decode(data, ResponseEnvelope)
+
+    def set(self, key: str, resp_envelope: ResponseEnvelope, ttl: float):
+        self.redis_client.set(
+            self.key_prefix + key,
+            self.codec.encode(resp_envelope),
+            px=max(1, int(ttl * 1000)),
+        )
@@ -1,64 +1,707 @@
 import conclib
+from conclib.errors import AskTimeoutError, ClientClosedError
 from conclib.utils.redisd import redisclient
-from conclib import ActorMessage
+from conclib import ActorMessage, metrics
 from conclib.config import ConclibConfig
-from conclib.proxy.envelope import RequestEnvelope, ResponseEnvelope
+from conclib.proxy import blobs, codecs, streaming, tracing, transport
+from conclib.proxy.messages import Priority
+from conclib.proxy.cache import ABANDONED, ResponseCache, cache_key, fresh_copy
+from conclib.proxy.envelope import (
+    STATUS_NOT_FOUND,
+    STATUS_OK,
+    RequestEnvelope,
+    ResponseEnvelope,
+    tell_request,
+)
 
-from typing import TypeVar, Type
+from concurrent.futures import Future
+from typing import Callable, Iterator, Optional, Sequence, TypeVar, Type
 
+import concurrent.futures
+
+import functools
+import logging
+import queue
+import threading
 import time
-import json
 
 import uuid
 
+import pykka
+
 ActorMessageType = TypeVar("ActorMessageType", bound=conclib.ActorMessage)
 
+logger = logging.getLogger(__name__)
+
+
+def create_request_envelope(
+    actor_urn: str,
+    contents: ActorMessage,
+    reply_to: Optional[str],
+    no_reply: bool = False,
+    trace_id: Optional[str] = None,
+    deadline: Optional[float] = None,
+    priority: Optional[Priority] = None,
+    stream_window: Optional[int] = None,
+    bare_message_type: bool = False,
+) -> RequestEnvelope:
+    """Wrap an ActorMessage in a RequestEnvelope with a fresh message_id. With no_reply,
+    the actor's response is discarded. With a trace_id, the request records its timings
+    (see conclib.proxy.tracing). Requests still unhandled at the deadline (a time.time())
+    are dropped. priority defaults to the PRIORITY of the contents' class. stream_window
+    asks for a streamed response (see conclib.proxy.streaming). bare_message_type sends
+    the class name instead of the type id (see ConclibConfig.bare_message_types)."""
+    envelope = RequestEnvelope(
+        message_id=f"{actor_urn}-{uuid.uuid4()}",
+        message_type=(
+            type(contents).__name__ if bare_message_type else contents.type_id()
+        ),
+        actor_urn=actor_urn,
+        contents=contents.model_dump(),
+        reply_to=reply_to,
+        no_reply=no_reply,
+        deadline=deadline,
+        priority=contents.PRIORITY if priority is None else priority,
+        stream_window=stream_window,
+    )
+    if trace_id is not None:
+        envelope.trace_id = trace_id
+        envelope.timings = {tracing.STAGE_CLIENT_SENT: time.monotonic()}
+    return envelope
+
+
+def create_local_request_envelope(
+    actor_urn: str,
+    contents: ActorMessage,
+    reply_hook: Optional[Callable[[ResponseEnvelope], None]],
+    trace_id: Optional[str] = None,
+    deadline: Optional[float] = None,
+    priority: Optional[Priority] = None,
+    stream_window: Optional[int] = None,
+) -> RequestEnvelope:
+    """
+    A RequestEnvelope for an actor running in this process. The actor's extract() returns
+    `contents` itself without validating it again, and its response is passed to
+    reply_hook instead of going through redis. Without a reply_hook the response is
+    discarded.
+    """
+    envelope = create_request_envelope(
+        actor_urn,
+        contents,
+        reply_to=None,
+        no_reply=reply_hook is None,
+        trace_id=trace_id,
+        deadline=deadline,
+        priority=priority,
+        stream_window=stream_window,
+    )
+    envelope._extracted = contents
+    envelope._reply_hook = reply_hook
+    return envelope
+
+
+def _local_reply_hook(future: Future) -> Callable[[ResponseEnvelope], None]:
+    """A reply hook that resolves a future from the actor's thread"""
+
+    def reply_hook(resp_envelope: ResponseEnvelope):
+        resp_envelope.mark(tracing.STAGE_CLIENT_RECEIVED)
+        future.set_result(resp_envelope)
+
+    return reply_hook
+
+
+def deadline_for(timeout: Optional[float]) -> Optional[float]:
+    """The deadline of a request sent now that is waited on for timeout seconds"""
+    return None if timeout is None else time.time() + timeout
+
+
+def _result(future: Future, actor_urn: str, timeout: Optional[float]):
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        raise AskTimeoutError(actor_urn, timeout) from None
+
+
+def undelivered_response(
+    config: ConclibConfig, envelope: RequestEnvelope, reply
+) -> Optional[ResponseEnvelope]:
+    """A not found response for a sent request that no proxy received (see
+    transport.undelivered), so its caller doesn't wait for one that never comes"""
+    if envelope.no_reply or not transport.undelivered(config, reply):
+        return None
+    channel = transport.inbound_name(
+        config, transport.shard_for(config, envelope.actor_urn)
+    )
+    return ResponseEnvelope(
+        message_id=envelope.message_id,
+        message_type="",
+        contents={},
+        status=STATUS_NOT_FOUND,
+        error=f"No proxy is subscribed to {channel} to deliver to {envelope.actor_urn}",
+    )
+
+
+TraceHook = Callable[[tracing.Trace], None]
+
+
+def trace_id_for(
+    on_trace: Optional[TraceHook], trace_id: Optional[str]
+) -> Optional[str]:
+    """The trace id for a request, None if the client doesn't trace"""
+    if on_trace is None:
+        return None
+    return trace_id or uuid.uuid4().hex
+
+
+def report_trace(
+    on_trace: Optional[TraceHook],
+    request: RequestEnvelope,
+    response: ResponseEnvelope,
+):
+    """Pass the timings of an answered request to the client's on_trace hook"""
+    if on_trace is None or response.timings is None:
+        return
+    try:
+        on_trace(
+            tracing.Trace(
+                trace_id=response.trace_id,
+                message_id=request.message_id,
+                actor_urn=request.actor_urn,
+                timings=response.timings,
+            )
+        )
+    except Exception:
+        logger.exception("on_trace hook raised")
+
+
+class ProxyClientReceiverThread(threading.Thread):
+    """
+    Background thread owned by a ProxyClient. Listens on the client's reply channel and
+    routes each ResponseEnvelope to the future that is waiting for its message_id.
+    """
+
+    daemon = True
+
+    def __init__(self, client: "ProxyClient", poll_timeout: float = 1.0):
+        super().__init__(name=f"{self.__class__.__name__}-{client.client_id}")
+        self.client = client
+        self.poll_timeout = poll_timeout
+        self.shutdown_event = threading.Event()
+
+    def shutdown(self):
+        self.shutdown_event.set()
+
+    def run(self):
+        pubsub = self.client.redis_client.pubsub
+        while not self.shutdown_event.is_set():
+            # Blocks on the socket until a message arrives or the timeout expires, so we
+            # can notice shutdown without spinning
+            message = pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=self.poll_timeout
+            )
+            if message is None or message["type"] != "message":
+                continue
+            try:
+                resp_envelope = codecs.decode(message["data"], ResponseEnvelope)
+            except Exception:
+                # E.g. a response in a codec this version doesn't know. Its caller times
+                # out, the others must not.
+                logger.exception(
+                    "Dropping a message on %s that can't be decoded",
+                    self.client.reply_channel,
+                )
+                continue
+            resp_envelope.mark(tracing.STAGE_CLIENT_RECEIVED)
+            self.client.deliver(resp_envelope)
+
 
 class ProxyClient:
-    def __init__(self, config: ConclibConfig):
+    """
+    Client for asking actors questions from outside the actor system (e.g. from a web server).
+
+    A ProxyClient subscribes once to its own reply channel and runs a single receiver thread
+    that dispatches responses to waiting callers, so it is safe to share one client between
+    many threads with many requests in flight.
+
+    If the target actor runs in the same process (it is in pykka's ActorRegistry), the
+    request is put straight into its inbox and the response comes back through a local
+    future, without serialization or redis. Pass force_redis=True to always go through
+    redis, e.g. to test the proxy.
+
+    With an on_trace hook, every ask records when it passed through each stage of the
+    proxy and the hook is called with a conclib.proxy.tracing.Trace once its response
+    arrives, from the thread that asked.
+
+    With a cache (conclib.proxy.cache.LRUCache or RedisCache), ask_actor serves messages
+    whose class sets CACHE_TTL from the cache, and identical asks that are in flight at the
+    same time share one request to the actor.
+
+    With config.blob_threshold set, large binary values in requests and responses travel
+    outside the messages (see conclib.proxy.blobs).
+    """
+
+    def __init__(
+        self,
+        config: ConclibConfig,
+        force_redis: bool = False,
+        on_trace: Optional[TraceHook] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        transport.check_transport(config)
+        transport.check_shards(config)
+        blobs.check_blob_config(config)
         self.config = config
+        self.codec = codecs.get_codec(config.codec)
+        self.force_redis = force_redis
+        self.on_trace = on_trace
+        self.cache = cache
+        self.client_id = str(uuid.uuid4())
+        self.reply_channel = self.config.outbound_channel_prefix + self.client_id
         self.redis_client = redisclient.RedisClient(self.config)
 
+        self._pending: dict[str, Future] = {}
+        # message_id -> queue of the streamed response items of an ask_stream
+        self._streams: dict[str, queue.SimpleQueue] = {}
+        self._pending_lock = threading.Lock()
+        # Cache key -> the response of the cacheable ask in flight for it
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        self._subscribe()
+        self.receiver_thread = ProxyClientReceiverThread(self)
+        self.receiver_thread.start()
+
+    def _subscribe(self):
+        """Subscribe to the reply channel and wait for redis to confirm it, so that no
+        response can be published before we are listening for it"""
+        pubsub = self.redis_client.pubsub
+        pubsub.subscribe(self.reply_channel)
+        while True:
+            message = pubsub.get_message(timeout=1.0)
+            if message and message["type"] == "subscribe":
+                break
+        logger.info("Subscribed to %s", self.reply_channel)
+
+    def __enter__(self) -> "ProxyClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self):
+        """Stop the receiver thread, fail any outstanding asks and release the reply
+        channel subscription"""
+        self.receiver_thread.shutdown()
+        self.receiver_thread.join()
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            streams, self._streams = self._streams, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ClientClosedError("The client was closed"))
+        for items in streams.values():
+            items.put(ClientClosedError("The client was closed"))
+        self.redis_client.pubsub.unsubscribe(self.reply_channel)
+        self.redis_client.pubsub.close()
+
+    def deliver(self, resp_envelope: ResponseEnvelope):
+        """Resolve the future waiting for this response. Responses for requests nobody is
+        waiting on any more are dropped."""
+        with self._pending_lock:
+            stream = self._streams.get(resp_envelope.message_id)
+            future = self._pending.pop(resp_envelope.message_id, None)
+        if stream is not None:
+            stream.put(resp_envelope)
+            return
+        if future is None:
+            # Usually a response that arrived after its ask timed out
+            logger.debug(
+                "Dropping response for unknown message_id %s", resp_envelope.message_id
+            )
+            return
+        future.set_result(resp_envelope)
+
+    def local_actor(self, actor_urn: str) -> Optional[pykka.ActorRef]:
+        """The actor, if it runs in this process and requests to it may bypass redis"""
+        if self.force_redis:
+            return None
+        return pykka.ActorRegistry.get_by_urn(actor_urn)
+
     def ask_actor(
         self,
         actor_urn: str,
         contents: ActorMessage,
         response_type: Type[ActorMessageType],
+        trace_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[Priority] = None,
     ) -> ActorMessageType:
-        print("[ProxyClient] Entered ask_actor")
-        message_id = f"{actor_urn}-{uuid.uuid4()}"
-        message = RequestEnvelope(
-            message_id=message_id,
-            message_type=contents.__class__.__name__,
-            actor_urn=actor_urn,
-            contents=contents.model_dump(),
-        )
-        print("[ProxyClient] Publishing RequestEnvelope")
-        self.redis_client.redis_client.publish(
-            self.config.inbound_channel_name, message.model_dump_json()
-        )
-        print("[ProxyClient] Published RequestEnvelope")
-        response_channel = self.config.outbound_channel_prefix + message_id
-        self.redis_client.pubsub.subscribe(response_channel)
-        print(f"[ProxyClient] Subscribed to {response_channel}")
+        """
+        Send contents to the actor and wait for its response. trace_id names the request's
+        Trace (by default a random one), if the client has an on_trace hook.
 
+        Raises AskTimeoutError if no response arrives within timeout seconds. The request
+        carries the deadline, and is dropped instead of handled if it reaches the actor
+        after it. Raises ActorNotFoundError if the proxy has no actor with the URN, and
+        RemoteActorError if the handler raised.
+
+        priority overrides the PRIORITY of the contents' class for this request.
+        """
+        if self.cache is not None and contents.CACHE_TTL is not None:
+            resp_envelope = self._ask_cached(
+                actor_urn, contents, trace_id, timeout, priority
+            )
+        else:
+            resp_envelope = self._ask(actor_urn, contents, trace_id, timeout, priority)
+        return resp_envelope.extract(response_type)
+
+    def _ask_cached(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        key = cache_key(actor_urn, contents)
+        end = None if timeout is None else time.monotonic() + timeout
+        coalesced = False
         while True:
-            got_message = False
-            message = self.redis_client.pubsub.get_message()
-            if message:
-                # do something with the message
-
-                if message["type"] == "message":
-                    print(f"[ProxyClient] Received response message: {message}")
-                    data_dict = json.loads(message["data"])
-                    resp_envelope = ResponseEnvelope(**data_dict)
-                    return resp_envelope.extract(response_type)
-
-                else:
-                    print(
-                        f"[ProxyClient] Received non-actor message from redis: {message}"
+            remaining = None if end is None else max(0.0, end - time.monotonic())
+            # The first caller for a key looks it up in the cache and asks the actor,
+            # callers that arrive meanwhile wait for its response
+            with self._inflight_lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+            if leader:
+                return self._lead_cached(
+                    key, future, actor_urn, contents, trace_id, remaining, priority
+                )
+            if not coalesced:
+                metrics.count_cache_request(actor_urn, "coalesced")
+                coalesced = True
+            resp_envelope = _result(future, actor_urn, remaining)
+            if resp_envelope is not ABANDONED:
+                return fresh_copy(resp_envelope)
+
+    def _lead_cached(
+        self,
+        key: str,
+        future: Future,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        """The ask of the first caller for a key, which the callers in future wait for"""
+        try:
+            resp_envelope = self.cache.get(key)
+            if resp_envelope is not None:
+                metrics.count_cache_request(actor_urn, "hit")
+            else:
+                metrics.count_cache_request(actor_urn, "miss")
+                resp_envelope = self._ask(
+                    actor_urn, contents, trace_id, timeout, priority
+                )
+                # Blobs are read once, so a response that had some can't be served again
+                if resp_envelope.status == STATUS_OK and not resp_envelope._fetched:
+                    self.cache.set(
+                        key,
+                        resp_envelope.model_copy(
+                            update={"trace_id": None, "timings": None}
+                        ),
+                        contents.CACHE_TTL,
                     )
-                got_message = True
+        except AskTimeoutError:
+            # Only this caller's timeout passed
+            future.set_result(ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_result(ABANDONED)
+            raise
+        else:
+            future.set_result(resp_envelope)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return resp_envelope
+
+    def _ask(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        trace_id: Optional[str],
+        timeout: Optional[float],
+        priority: Optional[Priority],
+    ) -> ResponseEnvelope:
+        start = time.perf_counter()
+        trace_id = trace_id_for(self.on_trace, trace_id)
+        deadline = deadline_for(timeout)
+        actor_ref = self.local_actor(actor_urn)
+        if actor_ref is not None:
+            future = Future()
+            message = create_local_request_envelope(
+                actor_urn,
+                contents,
+                _local_reply_hook(future),
+                trace_id=trace_id,
+                deadline=deadline,
+                priority=priority,
+            )
+            tell_request(actor_ref, message)
+            resp_envelope: ResponseEnvelope = _result(future, actor_urn, timeout)
+            metrics.observe_round_trip(actor_urn, "local", start)
+            report_trace(self.on_trace, message, resp_envelope)
+            return resp_envelope
+
+        message = create_request_envelope(
+            actor_urn,
+            contents,
+            self.reply_channel,
+            trace_id=trace_id,
+            deadline=deadline,
+            priority=priority,
+            bare_message_type=self.config.bare_message_types,
+        )
+        message_id = message.message_id
+
+        # Register before publishing so a fast response can't arrive before we are waiting
+        future = Future()
+        with self._pending_lock:
+            self._pending[message_id] = future
+
+        try:
+            self._send(message)
+            resp_envelope: ResponseEnvelope = _result(future, actor_urn, timeout)
+            self._fetch(resp_envelope)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(message_id, None)
+        metrics.observe_round_trip(actor_urn, "redis", start)
+        report_trace(self.on_trace, message, resp_envelope)
+        return resp_envelope
+
+    def ask_stream(
+        self,
+        actor_urn: str,
+        contents: ActorMessage,
+        response_type: Type[ActorMessageType],
+        window: int = 16,
+        timeout: Optional[float] = None,
+    ) -> Iterator[ActorMessageType]:
+        """
+        Send contents to an actor whose handler streams its response, and iterate over the
+        items as they arrive. The request is sent when iteration starts.
+
+        At most `window` items are in flight: the handler is paused until the caller has
+        consumed enough of them. Raises AskTimeoutError if the next item doesn't arrive
+        within timeout seconds. Stopping early (e.g. break, or close()) cancels the stream.
+        A handler that responds with a single message yields just that message.
+        """
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        items = queue.SimpleQueue()
+        actor_ref = self.local_actor(actor_urn)
+        if actor_ref is not None:
+            message = create_local_request_envelope(
+                actor_urn, contents, items.put, stream_window=window
+            )
+            credits = message._stream_credits = streaming.LocalCredits(window)
+            grant, cancel = credits.grant, credits.cancel
+        else:
+            message = create_request_envelope(
+                actor_urn,
+                contents,
+                self.reply_channel,
+                stream_window=window,
+                bare_message_type=self.config.bare_message_types,
+            )
+            grant = functools.partial(self._send_grant, message.message_id)
+            cancel = functools.partial(grant, streaming.CANCELLED)
+            with self._pending_lock:
+                self._streams[message.message_id] = items
+
+        finished = False
+        try:
+            if actor_ref is not None:
+                tell_request(actor_ref, message)
+            else:
+                self._send(message)
+            consumed = 0
+            while True:
+                try:
+                    resp_envelope: ResponseEnvelope = items.get(timeout=timeout)
+                except queue.Empty:
+                    raise AskTimeoutError(actor_urn, timeout) from None
+                if isinstance(resp_envelope, ClientClosedError):
+                    raise resp_envelope
+                if resp_envelope.end_of_stream or resp_envelope.seq is None:
+                    finished = True
+                if resp_envelope.end_of_stream:
+                    return
+                self._fetch(resp_envelope)
+                yield resp_envelope.extract(response_type)
+                if finished:
+                    return
+                consumed += 1
+                if consumed == streaming.grant_batch(window):
+                    grant(consumed)
+                    consumed = 0
+        finally:
+            with self._pending_lock:
+                self._streams.pop(message.message_id, None)
+            if not finished:
+                cancel()
+
+    def _send_grant(self, message_id: str, count: int):
+        with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+            streaming.send_grant(pipe, message_id, count)
+            pipe.execute()
+
+    def ask_many(
+        self,
+        requests: Sequence[tuple[str, ActorMessage, Type[ActorMessage]]],
+        timeout: Optional[float] = None,
+    ) -> list[ActorMessage | Exception]:
+        """
+        Ask several actors at once. Takes (actor_urn, contents, response_type) tuples.
+
+        All requests are sent in a single redis pipeline and the responses are awaited
+        concurrently, so N asks cost roughly one round trip. Returns one item per request,
+        in order: the response, or the exception for that request (AskTimeoutError if no
+        response arrived within `timeout` seconds of sending).
+        """
+        futures = [Future() for _ in requests]
+        deadline = deadline_for(timeout)
+        envelopes = []
+        # Requests for actors in this process are delivered directly, the rest through redis
+        remote_envelopes = []
+        for (actor_urn, contents, _), future in zip(requests, futures):
+            actor_ref = self.local_actor(actor_urn)
+            if actor_ref is not None:
+                envelope = create_local_request_envelope(
+                    actor_urn,
+                    contents,
+                    _local_reply_hook(future),
+                    trace_id=trace_id_for(self.on_trace, None),
+                    deadline=deadline,
+                )
+                envelopes.append(envelope)
+                tell_request(actor_ref, envelope)
+                continue
+            envelope = create_request_envelope(
+                actor_urn,
+                contents,
+                self.reply_channel,
+                trace_id=trace_id_for(self.on_trace, None),
+                deadline=deadline,
+                bare_message_type=self.config.bare_message_types,
+            )
+            envelopes.append(envelope)
+            remote_envelopes.append(envelope)
+            with self._pending_lock:
+                self._pending[envelope.message_id] = future
+
+        try:
+            if remote_envelopes:
+                self._send_pipelined(remote_envelopes)
+            concurrent.futures.wait(futures, timeout=timeout)
+        finally:
+            with self._pending_lock:
+                for envelope in remote_envelopes:
+                    self._pending.pop(envelope.message_id, None)
+
+        results = []
+        for (actor_urn, _, response_type), future, envelope in zip(
+            requests, futures, envelopes
+        ):
+            if not future.done():
+                results.append(AskTimeoutError(actor_urn, timeout))
+                continue
+            if future.exception() is not None:
+                results.append(future.exception())
+                continue
+            resp_envelope: ResponseEnvelope = future.result()
+            report_trace(self.on_trace, envelope, resp_envelope)
+            try:
+                self._fetch(resp_envelope)
+                results.append(resp_envelope.extract(response_type))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def tell_many(self, messages: Sequence[tuple[str, ActorMessage]]):
+        """
+        Send (actor_urn, contents) messages without waiting for responses, in a single
+        redis pipeline. Any response the actors send is discarded.
+        """
+        remote_envelopes = []
+        for actor_urn, contents in messages:
+            actor_ref = self.local_actor(actor_urn)
+            if actor_ref is not None:
+                tell_request(
+                    actor_ref,
+                    create_local_request_envelope(actor_urn, contents, reply_hook=None),
+                )
+            else:
+                remote_envelopes.append(
+                    create_request_envelope(
+                        actor_urn,
+                        contents,
+                        reply_to=None,
+                        no_reply=True,
+                        bare_message_type=self.config.bare_message_types,
+                    )
+                )
+        if remote_envelopes:
+            self._send_pipelined(remote_envelopes)
+
+    def _send(self, envelope: RequestEnvelope):
+        envelope, writes = blobs.offload(envelope, self.config, self.codec.name)
+        if not writes:
+            reply = transport.send_request(
+                self.redis_client.redis_client,
+                self.config,
+                envelope.actor_urn,
+                self.codec.encode(envelope),
+            )
+        else:
+            # The blobs are written before the request that refers to them, in one round
+            # trip
+            with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+                blobs.write_redis(pipe, writes, self.config.blob_ttl_s)
+                transport.send_request(
+                    pipe, self.config, envelope.actor_urn, self.codec.encode(envelope)
+                )
+                reply = pipe.execute()[-1]
+        self._check_delivered(envelope, reply)
+
+    def _send_pipelined(self, envelopes: list[RequestEnvelope]):
+        # Index of each request's send_request in the pipeline's replies
+        indexes = []
+        with self.redis_client.redis_client.pipeline(transaction=False) as pipe:
+            for envelope in envelopes:
+                envelope, writes = blobs.offload(envelope, self.config, self.codec.name)
+                blobs.write_redis(pipe, writes, self.config.blob_ttl_s)
+                transport.send_request(
+                    pipe, self.config, envelope.actor_urn, self.codec.encode(envelope)
+                )
+                indexes.append(len(pipe) - 1)
+            replies = pipe.execute()
+        for envelope, index in zip(envelopes, indexes):
+            self._check_delivered(envelope, replies[index])
+
+    def _check_delivered(self, envelope: RequestEnvelope, reply):
+        resp_envelope = undelivered_response(self.config, envelope, reply)
+        if resp_envelope is not None:
+            self.deliver(resp_envelope)
 
-            if not got_message:
-                time.sleep(0.001)  # be nice to the system :)
+    def _fetch(self, resp_envelope: ResponseEnvelope):
+        """Read the blobs of a response, from the thread that waited for it"""
+        blobs.fetch(resp_envelope, self.redis_client.redis_client, self.config)
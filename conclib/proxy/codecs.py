@@ -0,0 +1,157 @@
+# Wire formats for RequestEnvelope/ResponseEnvelope.
+#
+# Every encoded message starts with a tag identifying its codec, so a receiver can decode
+# messages from senders configured with a different codec. JSON is untagged (the message
+# starts with "{"), which keeps it byte-for-byte compatible with older conclib versions.
+# Other codecs prefix their payload with a NUL byte followed by a one byte codec id.
+from pydantic import BaseModel
+import pydantic_core
+
+from typing import Any, Optional, TypeVar, Type
+
+import json
+
+EnvelopeType = TypeVar("EnvelopeType", bound=BaseModel)
+
+TAG_PREFIX = b"\x00"
+
+
+def wire_fields(envelope: BaseModel) -> dict[str, Any]:
+    """
+    The serialized fields of an envelope, without copying them. Envelope fields are plain
+    python values already (contents is produced by model_dump()), so unlike model_dump()
+    there is no need to walk and copy the contents again.
+    """
+    return {
+        name: getattr(envelope, name)
+        for name, field in envelope.model_fields.items()
+        if not field.exclude
+    }
+
+
+class Codec:
+    name: str
+    # One byte codec id, or None for the untagged JSON format
+    tag: Optional[bytes] = None
+
+    def header(self) -> bytes:
+        return b"" if self.tag is None else TAG_PREFIX + self.tag
+
+    def encode(self, envelope: BaseModel) -> bytes:
+        raise NotImplementedError
+
+    def decode(
+        self, body: bytes | memoryview, envelope_cls: Type[EnvelopeType]
+    ) -> EnvelopeType:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """The original wire format. Uses pydantic's own (Rust) JSON serializer and parser."""
+
+    name = "json"
+    tag = None
+
+    def encode(self, envelope: BaseModel) -> bytes:
+        return envelope.model_dump_json().encode()
+
+    def decode(
+        self, body: bytes | memoryview, envelope_cls: Type[EnvelopeType]
+    ) -> EnvelopeType:
+        # The stdlib parser is faster than model_validate_json for the untyped contents
+        # dict, see benchmarks/codec_benchmark.py
+        return envelope_cls.model_validate(json.loads(body))
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+    tag = b"o"
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError as e:
+            raise ImportError(
+                "The orjson codec requires orjson. Install it with `pip install conclib[orjson]`"
+            ) from e
+        self._orjson = orjson
+
+    def encode(self, envelope: BaseModel) -> bytes:
+        return self.header() + self._orjson.dumps(
+            wire_fields(envelope), default=pydantic_core.to_jsonable_python
+        )
+
+    def decode(
+        self, body: bytes | memoryview, envelope_cls: Type[EnvelopeType]
+    ) -> EnvelopeType:
+        return envelope_cls.model_validate(self._orjson.loads(body))
+
+
+class MsgpackCodec(Codec):
+    """Binary format. Smaller than JSON for numeric data and carries bytes without base64."""
+
+    name = "msgpack"
+    tag = b"m"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError(
+                "The msgpack codec requires msgpack. Install it with `pip install conclib[msgpack]`"
+            ) from e
+        self._msgpack = msgpack
+
+    def encode(self, envelope: BaseModel) -> bytes:
+        return self.header() + self._msgpack.packb(
+            wire_fields(envelope),
+            default=pydantic_core.to_jsonable_python,
+            use_bin_type=True,
+        )
+
+    def decode(
+        self, body: bytes | memoryview, envelope_cls: Type[EnvelopeType]
+    ) -> EnvelopeType:
+        return envelope_cls.model_validate(self._msgpack.unpackb(body, raw=False))
+
+
+CODEC_CLASSES: dict[str, type[Codec]] = {
+    c.name: c for c in (JsonCodec, OrjsonCodec, MsgpackCodec)
+}
+_CODEC_NAMES_BY_TAG: dict[bytes, str] = {
+    c.tag: c.name for c in CODEC_CLASSES.values() if c.tag is not None
+}
+_codecs: dict[str, Codec] = {}
+
+
+def get_codec(name: str) -> Codec:
+    """Get the (shared) codec instance for a name. Raises ImportError if the codec's
+    library isn't installed"""
+    codec = _codecs.get(name)
+    if codec is None:
+        if name not in CODEC_CLASSES:
+            raise ValueError(
+                f"Unknown codec {name!r}, expected one of {tuple(CODEC_CLASSES)}"
+            )
+        codec = _codecs[name] = CODEC_CLASSES[name]()
+    return codec
+
+
+def encode(envelope: BaseModel, codec_name: str) -> bytes:
+    return get_codec(codec_name).encode(envelope)
+
+
+def decode(data: bytes, envelope_cls: Type[EnvelopeType]) -> EnvelopeType:
+    """Decode a message in any known codec. The codec that was used is recorded on the
+    envelope (envelope.codec) so a response can be sent back in the same format."""
+    view = memoryview(data)
+    if view[:1] == TAG_PREFIX:
+        name = _CODEC_NAMES_BY_TAG.get(bytes(view[1:2]))
+        if name is None:
+            raise ValueError(f"Unknown codec tag {bytes(view[1:2])!r}")
+        codec, body = get_codec(name), view[2:]
+    else:
+        codec, body = get_codec(JsonCodec.name), data
+    envelope = codec.decode(body, envelope_cls)
+    envelope.codec = codec.name
+    return envelope
@@ -1,10 +1,31 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 import conclib
-from typing import TypeVar, Type
+from typing import Callable, Iterator, TypeVar, Type, Optional
+import logging
 import pykka
+import time
+from pykka._envelope import Envelope
+
+from conclib.config import ConclibConfig
+from conclib.proxy.messages import Priority, message_registry
+from conclib.proxy import blobs, streaming, tracing, transport
 
 ActorMessageType = TypeVar("ActorMessageType", bound=conclib.ActorMessage)
 
+logger = logging.getLogger(__name__)
+
+# ResponseEnvelope.status values
+STATUS_OK = "ok"
+# The actor's inbox was full, so the request was dropped without being handled
+STATUS_OVERLOADED = "overloaded"
+# The proxy has no actor with the request's URN
+STATUS_NOT_FOUND = "not_found"
+# The handler raised an exception
+STATUS_ERROR = "error"
+# The request's deadline passed before it was handled. Nobody is waiting for the response,
+# so it is not published.
+STATUS_EXPIRED = "expired"
+
 
 class ResponseEnvelope(BaseModel):
     """Message sent from the actor system to outside. Will be serialized through redis"""
@@ -12,10 +33,62 @@ class ResponseEnvelope(BaseModel):
     message_id: str
     message_type: str
     contents: dict
+    # Channel the RespondingActor publishes this response to. Internal to the actor
+    # system, so it is not serialized.
+    reply_to: Optional[str] = Field(default=None, exclude=True)
+    # Inbound stream entry of the request, acked once this response is published
+    stream_id: Optional[str] = Field(default=None, exclude=True)
+    # Codec the request arrived in, so the response is sent back in the same format
+    codec: Optional[str] = Field(default=None, exclude=True)
+    # Anything but STATUS_OK means the request wasn't handled, there are no contents and
+    # error says why
+    status: str = STATUS_OK
+    error: Optional[str] = None
+    # Copied from the request, see conclib.proxy.tracing
+    trace_id: Optional[str] = None
+    timings: Optional[dict[str, float]] = None
+    # Position of this item in a streamed response (see conclib.proxy.streaming), None for
+    # a single response. The stream ends with an envelope with end_of_stream set and no
+    # contents.
+    seq: Optional[int] = None
+    end_of_stream: bool = False
+    # The contents hold references to blobs, see conclib.proxy.blobs
+    blobs: bool = False
+
+    # The message itself, when it never left this process
+    _extracted: Optional[conclib.ActorMessage] = PrivateAttr(default=None)
+    # The contents hold the blobs read by blobs.fetch()
+    _fetched: bool = PrivateAttr(default=False)
+
+    def mark(self, stage: str):
+        """Record that the response reached a stage, if it is being traced"""
+        if self.timings is not None:
+            self.timings[stage] = time.monotonic()
+
+    def raise_for_status(self):
+        if self.status == STATUS_OK:
+            return
+        if self.status == STATUS_OVERLOADED:
+            raise conclib.errors.ActorOverloadedError(self.error)
+        if self.status == STATUS_NOT_FOUND:
+            raise conclib.errors.ActorNotFoundError(self.error)
+        if self.status == STATUS_ERROR:
+            raise conclib.errors.RemoteActorError(self.error)
+        raise conclib.errors.ConclibBaseException(
+            f"Request failed with status {self.status!r}: {self.error}"
+        )
 
     def extract(self, cls: Type[ActorMessageType]) -> ActorMessageType:
-        """Convert the contents to a specific ActorMessage subclass"""
-        actor_msg = cls(**self.contents)
+        """Convert the contents to a specific ActorMessage subclass. Raises if the request
+        failed (see status)."""
+        self.raise_for_status()
+        if type(self._extracted) is cls:
+            return self._extracted
+        if self.blobs:
+            raise conclib.errors.ConclibBaseException(
+                "The blobs of the response weren't fetched"
+            )
+        actor_msg = cls.model_validate(blobs.contents_for(self, cls))
         return actor_msg
 
 
@@ -26,26 +99,228 @@ class RequestEnvelope(BaseModel):
     message_type: str
     actor_urn: str
     contents: dict
+    # Channel the response should be published to. If not set, the response goes to
+    # outbound_channel_prefix + message_id (the behaviour of older clients)
+    reply_to: Optional[str] = None
+    # Fire-and-forget request (e.g. ProxyClient.tell_many). respond() does nothing.
+    no_reply: bool = False
+    # time.time() after which the sender stops waiting for the response. Expired requests
+    # are dropped instead of handled. Wall clock time, so it can be compared on any host.
+    deadline: Optional[float] = None
+    # Queue priority in the actor's inbox. Defaults to the PRIORITY of the contents' class.
+    priority: Priority = Priority.NORMAL
+    # Set by ask_stream: the caller accepts a streamed response with at most this many
+    # items in flight
+    stream_window: Optional[int] = None
+    # Set by the proxy when the request arrived through the streams transport
+    stream_id: Optional[str] = Field(default=None, exclude=True)
+    # Inbound shard the request arrived on. Its response is published by the same shard's
+    # RespondingActor.
+    shard: int = Field(default=0, exclude=True)
+    # Set when the request is decoded
+    codec: Optional[str] = Field(default=None, exclude=True)
+    # Set by clients that trace their requests, see conclib.proxy.tracing
+    trace_id: Optional[str] = None
+    timings: Optional[dict[str, float]] = None
+    # The contents hold references to blobs, see conclib.proxy.blobs
+    blobs: bool = False
+
+    # The message extracted from contents, so repeated extract() calls don't validate again.
+    # Set up front when the sender is in the same process.
+    _extracted: Optional[conclib.ActorMessage] = PrivateAttr(default=None)
+    # Set when the sender is in the same process. The response is passed straight to it
+    # instead of going through the RespondingActor and redis.
+    _reply_hook: Optional[Callable[[ResponseEnvelope], None]] = PrivateAttr(
+        default=None
+    )
+    # Flow control of a streamed response. Set by the client when it is in the same
+    # process, otherwise created from the redis connection the proxy received it on.
+    _stream_credits: Optional[streaming.Credits] = PrivateAttr(default=None)
+    _redis_conn: Optional[object] = PrivateAttr(default=None)
+    # Config of the proxy that received the request, which decides if it may have blobs
+    _config: Optional[ConclibConfig] = PrivateAttr(default=None)
+    _fetched: bool = PrivateAttr(default=False)
+
+    def mark(self, stage: str):
+        """Record that the request reached a stage, if it is being traced"""
+        if self.timings is not None:
+            self.timings[stage] = time.monotonic()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
 
     def matches(self, cls: Type[ActorMessageType]) -> bool:
         """
         Determine if the message type matches the given class. If so, return True
         """
-        return self.message_type == cls.__name__
+        # Older clients sent the bare class name as the message type
+        return self.message_type == cls.type_id() or self.message_type == cls.__name__
+
+    def message_class(self) -> Optional[Type[conclib.ActorMessage]]:
+        """The ActorMessage class named by message_type, if it is known in this process"""
+        return message_registry.get(self.message_type)
 
     def extract(self, cls: Type[ActorMessageType]) -> ActorMessageType:
         """Convert the contents to a specific ActorMessage subclass"""
-        actor_msg = cls(**self.contents)
+        if type(self._extracted) is cls:
+            return self._extracted
+        # Read from the connection the request arrived on, on first use. A request from a
+        # stream can be redelivered, so its blobs are left to expire.
+        blobs.fetch(self, self._redis_conn, self._config, delete=self.stream_id is None)
+        actor_msg = cls.model_validate(blobs.contents_for(self, cls))
+        self._extracted = actor_msg
         return actor_msg
 
     def respond(self, msg: conclib.ActorMessage):
         """Send the response. Wrap in a ResponseEnvelope and send to the RespondingActor"""
+        if self.no_reply:
+            return
         response_envelope = ResponseEnvelope(
             message_id=self.message_id,
-            message_type=msg.__class__.__name__,
+            message_type=msg.type_id(),
             contents=msg.model_dump(),
+            reply_to=self.reply_to,
+            stream_id=self.stream_id,
+            codec=self.codec,
+            trace_id=self.trace_id,
+            timings=self._response_timings(),
         )
+        response_envelope._extracted = msg
+        self.send_response(response_envelope)
+
+    def respond_stream(self, messages: Iterator[conclib.ActorMessage]):
+        """
+        Send the items of an iterator as a streamed response, each as soon as it is
+        produced, then an end-of-stream marker. Blocks while the caller has no credit left
+        (see conclib.proxy.streaming). Gives up, closing the iterator, if the caller stops
+        consuming.
+        """
+        if self.no_reply:
+            return
+        if self.stream_window is None:
+            self.respond_error(
+                STATUS_ERROR,
+                f"The handler of {self.message_type} streams its response, use ask_stream",
+            )
+            return
+        credits = self._stream_credits
+        if credits is None and self._redis_conn is not None:
+            credits = streaming.RedisCredits(
+                self._redis_conn, self.message_id, self.stream_window
+            )
+        seq = 0
+        try:
+            while credits is None or credits.acquire(streaming.IDLE_TIMEOUT):
+                try:
+                    msg = next(messages)
+                except StopIteration:
+                    break
+                response_envelope = ResponseEnvelope(
+                    message_id=self.message_id,
+                    message_type=msg.type_id(),
+                    contents=msg.model_dump(),
+                    reply_to=self.reply_to,
+                    codec=self.codec,
+                    seq=seq,
+                )
+                response_envelope._extracted = msg
+                self.send_response(response_envelope)
+                seq += 1
+            else:
+                logger.info("Stream %s was cancelled or stalled", self.message_id)
+        finally:
+            close = getattr(messages, "close", None)
+            if close is not None:
+                close()
+            if credits is not None:
+                credits.close()
+        # Also acks the request with the streams transport, so it is sent even if the
+        # caller is gone
+        self.send_response(
+            ResponseEnvelope(
+                message_id=self.message_id,
+                message_type="",
+                contents={},
+                reply_to=self.reply_to,
+                stream_id=self.stream_id,
+                codec=self.codec,
+                trace_id=self.trace_id,
+                timings=self._response_timings(),
+                seq=seq,
+                end_of_stream=True,
+            )
+        )
+
+    def respond_error(self, status: str, error: str):
+        """Tell the caller that the request wasn't handled, e.g. with STATUS_OVERLOADED.
+        The caller's extract() raises the matching error."""
+        if self.no_reply:
+            return
+        self.send_response(
+            ResponseEnvelope(
+                message_id=self.message_id,
+                message_type="",
+                contents={},
+                status=status,
+                error=error,
+                reply_to=self.reply_to,
+                stream_id=self.stream_id,
+                codec=self.codec,
+                trace_id=self.trace_id,
+                timings=self._response_timings(),
+            )
+        )
+
+    def _response_timings(self) -> Optional[dict[str, float]]:
+        if self.timings is None:
+            return None
+        return {**self.timings, tracing.STAGE_HANDLER_FINISHED: time.monotonic()}
+
+    def send_response(self, response_envelope: ResponseEnvelope):
+        """Deliver a ResponseEnvelope built for this request, e.g. by a copy of this
+        request in another process. respond() does this for you."""
+        if self._reply_hook is not None:
+            self._reply_hook(response_envelope)
+            return
         responding_actor_ref = pykka.ActorRegistry.get_by_urn(
-            conclib.constants.RESPONDING_ACTOR
+            transport.responding_actor_urn(self.shard)
         )
         responding_actor_ref.tell(response_envelope)
+
+    def __getstate__(self):
+        # The reply hook and stream flow control belong to this process (and usually can't
+        # be pickled), so a copy sent to another process has none
+        state = super().__getstate__()
+        private = state.get("__pydantic_private__")
+        if private:
+            state["__pydantic_private__"] = {
+                **private,
+                "_reply_hook": None,
+                "_stream_credits": None,
+                "_redis_conn": None,
+            }
+        return state
+
+
+def tell_request(actor_ref: Optional[pykka.ActorRef], req_envelope: RequestEnvelope):
+    """
+    Put a RequestEnvelope in an actor's inbox. If there is no actor or its inbox is full,
+    the caller gets an error response instead of waiting for one that never comes.
+
+    Never waits for space in a full inbox, whatever its overflow policy: the sender is
+    usually a proxy polling thread, which every actor on its shard shares.
+    """
+    if actor_ref is None or not actor_ref.is_alive():
+        req_envelope.respond_error(
+            STATUS_NOT_FOUND, f"No actor with URN {req_envelope.actor_urn}"
+        )
+        return
+    if not hasattr(actor_ref, "actor_inbox"):
+        # Not a single actor, e.g. a PoolRef, which passes the request on to one
+        actor_ref.tell(req_envelope)
+        return
+    try:
+        # ActorRef.tell, without blocking
+        actor_ref.actor_inbox.put(Envelope(req_envelope), block=False)
+    except conclib.errors.InboxFullError as e:
+        req_envelope.respond_error(STATUS_OVERLOADED, str(e))
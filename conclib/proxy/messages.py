@@ -1,5 +1,101 @@
 from pydantic import BaseModel
+from collections import defaultdict
+from enum import IntEnum
+from typing import Any, ClassVar, Optional
+
+from conclib.errors import DuplicateMessageTypeError
+
+import threading
+
+
+class Priority(IntEnum):
+    """Order in which an actor with PRIORITY_LANES handles queued messages. Lower values
+    are handled first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
 
 
 class ActorMessage(BaseModel):
-    pass
+    # Identifies the message type on the wire. Defaults to "<module>.<qualname>", which
+    # can't collide between modules. Set it explicitly if the sending and receiving sides
+    # import the class under different module paths (e.g. one side defines it in a script
+    # that runs as __main__).
+    TYPE_ID: ClassVar[Optional[str]] = None
+    # Seconds a response to this message may be served from a proxy client's cache. Only
+    # set it on read-only requests whose response depends on nothing but their contents.
+    # See conclib.proxy.cache.
+    CACHE_TTL: ClassVar[Optional[float]] = None
+    # Queue priority in the inbox of an actor with PRIORITY_LANES. Requests from proxy
+    # clients carry it in RequestEnvelope.priority.
+    PRIORITY: ClassVar[Priority] = Priority.NORMAL
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        message_registry.register(cls)
+
+    @classmethod
+    def type_id(cls) -> str:
+        return message_registry.type_id(cls)
+
+
+class MessageRegistry:
+    """
+    Maps type ids to ActorMessage classes. Every ActorMessage subclass is registered when
+    it is defined.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_type_id: dict[str, type[ActorMessage]] = {}
+        self._type_ids: dict[type[ActorMessage], str] = {}
+        # Bare class name -> classes, to resolve envelopes from older clients which sent
+        # cls.__name__ as the message_type
+        self._by_name: dict[str, list[type[ActorMessage]]] = defaultdict(list)
+
+    @staticmethod
+    def default_type_id(cls: type[ActorMessage]) -> str:
+        module = cls.__module__
+        if module == "__mp_main__":
+            # The main script, as imported by a multiprocessing "spawn" child process
+            module = "__main__"
+        return cls.__dict__.get("TYPE_ID") or f"{module}.{cls.__qualname__}"
+
+    def register(self, cls: type[ActorMessage]):
+        type_id = self.default_type_id(cls)
+        with self._lock:
+            existing = self._by_type_id.get(type_id)
+            if existing is not None and (
+                existing.__module__,
+                existing.__qualname__,
+            ) != (cls.__module__, cls.__qualname__):
+                raise DuplicateMessageTypeError(type_id, existing, cls)
+            if existing is not None:
+                # The same class defined again (e.g. a module reload). The newest wins.
+                self._by_name[existing.__name__].remove(existing)
+            self._by_type_id[type_id] = cls
+            self._type_ids[cls] = type_id
+            self._by_name[cls.__name__].append(cls)
+
+    def type_id(self, cls: type[ActorMessage]) -> str:
+        type_id = self._type_ids.get(cls)
+        return type_id if type_id is not None else self.default_type_id(cls)
+
+    def get(self, message_type: str) -> Optional[type[ActorMessage]]:
+        """
+        Resolve the message_type of an envelope to a class. Falls back to the bare class
+        name if it is unambiguous, for envelopes sent by older clients, and to the last
+        dotted component of an unknown type id, for classes imported under a different
+        module path by the other side.
+        """
+        cls = self._by_type_id.get(message_type)
+        if cls is None:
+            candidates = self._by_name.get(message_type.rsplit(".", 1)[-1], [])
+            if len(candidates) == 1:
+                cls = candidates[0]
+        return cls
+
+
+message_registry = MessageRegistry()
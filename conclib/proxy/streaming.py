@@ -0,0 +1,108 @@
+# Streaming responses.
+#
+# A @handles method that returns an iterator of ActorMessages (e.g. a generator) streams
+# its response to a request from ProxyClient.ask_stream or AsyncProxyClient.ask_stream:
+# every item is sent as its own ResponseEnvelope (seq 0, 1, ...) as soon as it is produced,
+# followed by an end-of-stream marker. Neither side holds the whole response in memory.
+#
+# Flow control is credit based. The client lets `window` items be in flight and returns
+# credit as it consumes them, and the handler is only asked for its next item when there
+# is credit. A slow consumer therefore pauses the handler instead of piling items up in
+# redis, the RespondingActor or the client. Credit is sent through a redis list per
+# stream, or through a LocalCredits object when the client and the actor share a process.
+import threading
+
+from typing import Optional
+
+# Pushed instead of a credit count when the client stops consuming a stream early
+CANCELLED = -1
+# Redis list the client pushes credit for a stream to
+CREDIT_KEY_PREFIX = "conclib:stream_credits:"
+# How long a streaming handler waits for credit before giving up on the client
+IDLE_TIMEOUT = 60.0
+
+
+def credit_key(message_id: str) -> str:
+    return CREDIT_KEY_PREFIX + message_id
+
+
+def grant_batch(window: int) -> int:
+    """How many consumed items the client returns credit for at once"""
+    return max(1, window // 2)
+
+
+class Credits:
+    """The producer's side of a stream's flow control"""
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one credit, waiting up to timeout seconds for the client to grant more.
+        False if the client cancelled the stream or granted nothing in time."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalCredits(Credits):
+    """Credit for a stream whose client runs in the same process. The client calls grant()
+    and cancel() directly."""
+
+    def __init__(self, window: int):
+        self._credits = window
+        self._cancelled = False
+        self._condition = threading.Condition()
+
+    def grant(self, count: int):
+        with self._condition:
+            self._credits += count
+            self._condition.notify()
+
+    def cancel(self):
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify()
+
+    def acquire(self, timeout: float) -> bool:
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: self._credits > 0 or self._cancelled, timeout
+            )
+            if not ready or self._cancelled:
+                return False
+            self._credits -= 1
+            return True
+
+
+class RedisCredits(Credits):
+    """Credit for a stream whose client is in another process, read from the stream's
+    credit list"""
+
+    def __init__(self, redis_conn, message_id: str, window: int):
+        self.redis_conn = redis_conn
+        self.key = credit_key(message_id)
+        self._credits = window
+
+    def acquire(self, timeout: float) -> bool:
+        while self._credits == 0:
+            item: Optional[tuple] = self.redis_conn.blpop([self.key], timeout=timeout)
+            if item is None:
+                return False
+            count = int(item[1])
+            if count == CANCELLED:
+                return False
+            self._credits += count
+        self._credits -= 1
+        return True
+
+    def close(self):
+        self.redis_conn.delete(self.key)
+
+
+def send_grant(redis_conn, message_id: str, count: int):
+    """Client side: return credit for count consumed items, or cancel the stream with
+    CANCELLED. Works with a pipeline, or a redis.asyncio pipeline whose execute() must be
+    awaited."""
+    key = credit_key(message_id)
+    redis_conn.rpush(key, count)
+    # Left over if the producer is gone
+    redis_conn.expire(key, int(IDLE_TIMEOUT) * 2)
@@ -0,0 +1,59 @@
+# Per-stage timings of proxied requests, to find where a slow ask_actor spent its time.
+#
+# A client with an on_trace hook gives each request a trace id and an empty timings dict.
+# Every stage the request passes through records time.monotonic() under its name, and the
+# response carries the timings back to the client, which passes them to the hook as a
+# Trace. Envelopes without timings (the default) record nothing.
+#
+# CLOCK_MONOTONIC is shared by all processes on a Linux host, so hops between processes
+# on the same host are meaningful. Hops between hosts (client_sent -> proxy_received and
+# response_published -> client_received when the client runs elsewhere) are not.
+import dataclasses
+
+from typing import Optional
+
+STAGE_CLIENT_SENT = "client_sent"  # the client created the request, before encoding it
+STAGE_PROXY_RECEIVED = "proxy_received"  # the proxy decoded it from redis
+STAGE_HANDLER_STARTED = "handler_started"  # the actor took it out of its inbox
+STAGE_HANDLER_FINISHED = "handler_finished"  # the actor responded
+STAGE_RESPONSE_PUBLISHED = "response_published"  # the RespondingActor is publishing it
+STAGE_CLIENT_RECEIVED = "client_received"  # the client got the response
+# In the order a request goes through them. Local requests skip the proxy stages.
+STAGES = (
+    STAGE_CLIENT_SENT,
+    STAGE_PROXY_RECEIVED,
+    STAGE_HANDLER_STARTED,
+    STAGE_HANDLER_FINISHED,
+    STAGE_RESPONSE_PUBLISHED,
+    STAGE_CLIENT_RECEIVED,
+)
+
+
+@dataclasses.dataclass
+class Trace:
+    """The timings of one request, passed to a client's on_trace hook"""
+
+    trace_id: str
+    message_id: str
+    actor_urn: str
+    # Stage name -> time.monotonic() when the request reached it
+    timings: dict[str, float]
+
+    def hops(self) -> list[tuple[str, float]]:
+        """Seconds between consecutive recorded stages, e.g.
+        [("client_sent->proxy_received", 0.0003), ...]"""
+        stages = [stage for stage in STAGES if stage in self.timings]
+        return [
+            (f"{a}->{b}", self.timings[b] - self.timings[a])
+            for a, b in zip(stages, stages[1:])
+        ]
+
+    def slowest_hop(self) -> Optional[tuple[str, float]]:
+        return max(self.hops(), key=lambda hop: hop[1], default=None)
+
+    @property
+    def total(self) -> float:
+        """Seconds from the first to the last recorded stage"""
+        if not self.timings:
+            return 0.0
+        return max(self.timings.values()) - min(self.timings.values())
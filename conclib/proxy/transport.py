@@ -0,0 +1,80 @@
+# How RequestEnvelopes travel from clients to the proxy. Shared by the clients, which
+# send requests, and the RedisPollingThreads, which receive them.
+#
+# The inbound channel (or stream) can be split into config.inbound_shards shards, each
+# read by its own polling thread. A client picks the shard from a stable hash of the
+# actor_urn, so all requests for one actor go through the same shard and arrive in order.
+from conclib.config import ConclibConfig
+import conclib.constants
+
+import zlib
+
+PUBSUB = "pubsub"
+STREAMS = "streams"
+TRANSPORTS = (PUBSUB, STREAMS)
+
+# Field of a stream entry that holds the serialized RequestEnvelope
+STREAM_ENVELOPE_FIELD = "envelope"
+
+
+def check_transport(config: ConclibConfig):
+    if config.transport not in TRANSPORTS:
+        raise ValueError(
+            f"Unknown transport {config.transport!r}, expected one of {TRANSPORTS}"
+        )
+
+
+def check_shards(config: ConclibConfig):
+    if config.inbound_shards < 1:
+        raise ValueError(
+            f"inbound_shards must be at least 1, got {config.inbound_shards}"
+        )
+
+
+def shard_for(config: ConclibConfig, actor_urn: str) -> int:
+    """The shard that carries requests for actor_urn. Must be the same in every process,
+    so this uses crc32 rather than the (randomized) builtin hash()"""
+    if config.inbound_shards == 1:
+        return 0
+    return zlib.crc32(actor_urn.encode()) % config.inbound_shards
+
+
+def inbound_name(config: ConclibConfig, shard: int) -> str:
+    """Name of the channel/stream for a shard. A single shard uses inbound_channel_name
+    unchanged, so unsharded clients and proxies stay compatible."""
+    if config.inbound_shards == 1:
+        return config.inbound_channel_name
+    return f"{config.inbound_channel_name}/{shard}"
+
+
+def responding_actor_urn(shard: int) -> str:
+    """URN of the RespondingActor that publishes responses for requests from a shard"""
+    if shard == 0:
+        return conclib.constants.RESPONDING_ACTOR
+    return f"{conclib.constants.RESPONDING_ACTOR}/{shard}"
+
+
+def send_request(redis_conn, config: ConclibConfig, actor_urn: str, payload: str):
+    """
+    Send a serialized RequestEnvelope for actor_urn to the proxy. Returns the reply of
+    redis, for undelivered().
+
+    redis_conn may be a redis.Redis, a pipeline or a redis.asyncio.Redis (in which case
+    the returned coroutine must be awaited).
+    """
+    name = inbound_name(config, shard_for(config, actor_urn))
+    if config.transport == STREAMS:
+        return redis_conn.xadd(
+            name,
+            {STREAM_ENVELOPE_FIELD: payload},
+            maxlen=config.stream_maxlen,
+            approximate=True,
+        )
+    return redis_conn.publish(name, payload)
+
+
+def undelivered(config: ConclibConfig, reply) -> bool:
+    """Whether the reply of redis to send_request says that no proxy received the
+    request: PUBLISH returns how many proxies are subscribed to the channel. A stream keeps
+    requests until a proxy reads them."""
+    return config.transport == PUBSUB and reply == 0
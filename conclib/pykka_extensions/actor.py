@@ -1,17 +1,79 @@
+import collections.abc
+import logging
 import uuid
 import threading
+import time
 import pykka
 from pykka import ActorRef
-from typing import Optional
+from typing import Any, Callable, Optional
+
+from conclib import metrics
+from conclib.errors import InboxFullError, UnexpectedMessageError
+from conclib.proxy.envelope import (
+    STATUS_ERROR,
+    STATUS_EXPIRED,
+    STATUS_OVERLOADED,
+    RequestEnvelope,
+)
+from conclib.proxy import tracing
+from conclib.pykka_extensions import inbox
+from conclib.proxy.messages import ActorMessage
+
+logger = logging.getLogger(__name__)
+
+
+def handles(*message_types: type[ActorMessage]) -> Callable:
+    """
+    Register an Actor method as the handler for one or more ActorMessage types.
+
+    The method is called with the message, both when it is sent directly (tell/ask) and
+    when it arrives from outside the actor system in a RequestEnvelope. For a
+    RequestEnvelope, a returned ActorMessage is sent back as the response, and a returned
+    iterator of ActorMessages (e.g. from a generator method) is streamed back to
+    ask_stream one item at a time (see conclib.proxy.streaming).
+
+        class ExampleActor(conclib.Actor):
+            @conclib.handles(ExampleRequestMessage)
+            def on_example(self, message: ExampleRequestMessage):
+                return ExampleResponseMessage()
+    """
+
+    def decorator(method: Callable) -> Callable:
+        method.__conclib_handles__ = message_types
+        return method
+
+    return decorator
 
 
 # Overwrite the logic we don't like in pykka.Actor.
 # Changelog:
 # - Changed the actor urn so that it can be passed in at creation time.
 # - Changed to use a daemon thread.
+# - Added dispatch to @handles methods in on_receive, including streamed responses.
+# - Added optionally bounded inboxes.
+# - Added optional priority lanes in the inbox.
+# - Added per message type metrics around message handling.
+# - Added the handler_started stage to traced RequestEnvelopes.
+# - RequestEnvelopes past their deadline are dropped, and handler exceptions are sent back
+#   as error responses instead of stopping the actor.
 class Actor(pykka.ThreadingActor):
     URN: str | None = None  # CHANGED
     use_daemon_thread = True  # CHANGED
+    # Max number of queued messages, None for unbounded. When the inbox is full,
+    # INBOX_OVERFLOW decides what happens to a new message (see inbox.OVERFLOW_POLICIES).
+    # Dropped RequestEnvelopes get an "overloaded" response.
+    INBOX_CAPACITY: int | None = None  # CHANGED
+    INBOX_OVERFLOW: str = inbox.BLOCK  # CHANGED
+    # Handle queued messages by priority (ActorMessage.PRIORITY, or RequestEnvelope.priority
+    # for requests from outside) instead of in arrival order. A queued message gains one
+    # priority level for every PRIORITY_AGING seconds it waits, so lower priorities are
+    # delayed but never starved.
+    PRIORITY_LANES: bool = False  # CHANGED
+    PRIORITY_AGING: float = 1.0  # CHANGED
+
+    # Filled in for each subclass from its @handles methods
+    _message_handlers: dict[type[ActorMessage], str] = {}  # CHANGED
+    _request_handlers: dict[str, tuple[type[ActorMessage], str]] = {}  # CHANGED
 
     def __init__(self, urn: Optional[str] = None, *args, **kwargs):  # noqa  # CHANGED
 
@@ -29,3 +91,169 @@ class Actor(pykka.ThreadingActor):
         self.actor_inbox = self._create_actor_inbox()
         self.actor_stopped = threading.Event()
         self._actor_ref = ActorRef(self)
+        # Metric series per message type, so labels are only looked up once
+        self._metrics_series: dict[Any, tuple] = {}  # CHANGED
+
+    ### CHANGED ###
+    def _create_actor_inbox(self):
+        if self.INBOX_CAPACITY is None:
+            if self.PRIORITY_LANES:
+                return inbox.PriorityInbox(self.PRIORITY_AGING)
+            return super()._create_actor_inbox()
+        if self.PRIORITY_LANES:
+            return inbox.BoundedPriorityInbox(
+                self.actor_urn,
+                self.INBOX_CAPACITY,
+                self.INBOX_OVERFLOW,
+                on_shed=self._on_shed,
+                aging=self.PRIORITY_AGING,
+            )
+        return inbox.BoundedInbox(
+            self.actor_urn,
+            self.INBOX_CAPACITY,
+            self.INBOX_OVERFLOW,
+            on_shed=self._on_shed,
+        )
+
+    def _on_shed(self, envelope: Any):
+        """Called (in the sender's thread) with a message dropped from the full inbox"""
+        message = envelope.message
+        logger.warning(
+            "Inbox of %s is full, dropped %s", self.actor_urn, type(message).__name__
+        )
+        if isinstance(message, RequestEnvelope):
+            message.respond_error(STATUS_OVERLOADED, f"{self.actor_urn} is overloaded")
+        if envelope.reply_to is not None:
+            error = InboxFullError(self.actor_urn)
+            envelope.reply_to.set_exception(exc_info=(type(error), error, None))
+
+    def _handle_receive(self, message: Any) -> Any:
+        if not isinstance(message, RequestEnvelope):
+            return self._handle_measured(message)
+        message.mark(tracing.STAGE_HANDLER_STARTED)
+        if message.expired():
+            metrics.count_expired(self.actor_urn)
+            message.respond_error(
+                STATUS_EXPIRED,
+                f"Deadline passed before {self.actor_urn} handled the request",
+            )
+            return None
+        try:
+            return self._handle_measured(message)
+        except Exception as e:
+            # As with an exception in a pykka ask, the error goes back to the caller and
+            # the actor keeps running
+            logger.warning(
+                "%s raised handling %s",
+                self.actor_urn,
+                message.message_type,
+                exc_info=True,
+            )
+            message.respond_error(STATUS_ERROR, f"{type(e).__name__}: {e}")
+            return None
+
+    def _handle_measured(self, message: Any) -> Any:
+        if not metrics.ENABLED or isinstance(message, inbox.SYSTEM_MESSAGES):
+            return self._handle_message(message)
+        key = self._metrics_key(message)
+        series = self._metrics_series.get(key)
+        if series is None:
+            series = self._metrics_series[key] = self._create_metrics_series(key)
+        handled, errors, seconds = series
+        start = time.perf_counter()
+        try:
+            return self._handle_message(message)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start)
+            handled.inc()
+
+    def _metrics_key(self, message: Any) -> Any:
+        """What the metric series of a message are looked up by. The message_type of a
+        RequestEnvelope comes from the wire, so it is resolved to a class first."""
+        if isinstance(message, RequestEnvelope):
+            return message.message_class() or metrics.UNKNOWN_MESSAGE_TYPE
+        return type(message)
+
+    def _create_metrics_series(self, key: Any) -> tuple:
+        if isinstance(key, str):
+            message_type = key
+        elif issubclass(key, ActorMessage):
+            message_type = key.type_id()
+        else:
+            message_type = key.__name__
+        labels = (self.actor_urn, message_type)
+        return (
+            metrics.actor_messages.labels(*labels),
+            metrics.actor_errors.labels(*labels),
+            metrics.actor_handler_seconds.labels(*labels),
+        )
+
+    def _handle_message(self, message: Any) -> Any:
+        """pykka's message handling, wrapped by _handle_measured to record metrics"""
+        return super()._handle_receive(message)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        handlers = {}
+        # Walk the MRO from the base so that subclasses override their parents' handlers
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                for message_type in getattr(attr, "__conclib_handles__", ()):
+                    handlers[message_type] = name
+        cls._message_handlers = handlers
+        cls._request_handlers = {
+            message_type.type_id(): (message_type, name)
+            for message_type, name in handlers.items()
+        }
+
+    def on_receive(self, message: Any) -> Any:
+        """
+        Dispatch to the @handles method for the message's type. Actors without any
+        @handles methods keep pykka's default behaviour.
+        """
+        if not self._message_handlers:
+            return super().on_receive(message)
+        if isinstance(message, RequestEnvelope):
+            return self._dispatch_request(message)
+        method_name = self._find_handler(type(message))
+        if method_name is None:
+            raise UnexpectedMessageError(message)
+        return getattr(self, method_name)(message)
+
+    def _find_handler(self, message_type: type) -> Optional[str]:
+        method_name = self._message_handlers.get(message_type)
+        if method_name is None and issubclass(message_type, ActorMessage):
+            # A subclass of a handled message. Resolve it once and cache it.
+            for base in message_type.__mro__[1:]:
+                method_name = self._message_handlers.get(base)
+                if method_name is not None:
+                    self._message_handlers[message_type] = method_name
+                    break
+        return method_name
+
+    def _dispatch_request(self, req_envelope: RequestEnvelope) -> Any:
+        handler = self._request_handlers.get(req_envelope.message_type)
+        if handler is None:
+            # Unknown type id, e.g. the bare class name sent by an older client
+            message_class = req_envelope.message_class()
+            method_name = message_class and self._find_handler(message_class)
+            if method_name is None:
+                raise UnexpectedMessageError(req_envelope)
+            handler = (message_class, method_name)
+            # Only bare names are cached, since a sender can make up any number of
+            # dotted ones
+            if req_envelope.message_type == message_class.__name__:
+                self._request_handlers[req_envelope.message_type] = handler
+        message_class, method_name = handler
+        response = getattr(self, method_name)(req_envelope.extract(message_class))
+        if isinstance(response, ActorMessage):
+            req_envelope.respond(response)
+        elif isinstance(response, collections.abc.Iterator):
+            # A generator handler streams its response
+            req_envelope.respond_stream(response)
+            return None
+        return response
+    ### END CHANGED ###
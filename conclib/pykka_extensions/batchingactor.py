@@ -0,0 +1,226 @@
+import logging
+import queue
+import sys
+import time
+
+from typing import Any, Optional
+
+from pykka import ActorRegistry
+
+import conclib
+from conclib import metrics
+from conclib.errors import UnexpectedMessageError
+from conclib.proxy import tracing
+from conclib.proxy.envelope import STATUS_ERROR, STATUS_EXPIRED, RequestEnvelope
+from conclib.pykka_extensions import inbox
+
+logger = logging.getLogger(__name__)
+
+
+class _Item:
+    """A message of a batch, and where its result goes"""
+
+    __slots__ = ("envelope", "message", "request")
+
+    def __init__(self, envelope: Any, message: Any, request: Optional[RequestEnvelope]):
+        self.envelope = envelope
+        self.message = message
+        self.request = request
+
+    @property
+    def has_caller(self) -> bool:
+        return self.request is not None or self.envelope.reply_to is not None
+
+    def set_result(self, result: Any):
+        if isinstance(result, Exception):
+            self.set_exception(result)
+            return
+        if self.request is not None:
+            if isinstance(result, conclib.ActorMessage):
+                self.request.respond(result)
+            else:
+                # The handler only saw the extracted message, so nothing else will answer
+                # the caller
+                self.request.respond_error(
+                    STATUS_ERROR,
+                    f"on_receive_batch returned {type(result).__name__} instead of an "
+                    f"ActorMessage for {self.request.message_type}",
+                )
+        if self.envelope.reply_to is not None:
+            self.envelope.reply_to.set(None if self.request is not None else result)
+
+    def set_exception(self, e: Exception):
+        if self.request is not None:
+            self.request.respond_error(STATUS_ERROR, f"{type(e).__name__}: {e}")
+        if self.envelope.reply_to is not None:
+            self.envelope.reply_to.set_exception(exc_info=(type(e), e, e.__traceback__))
+
+
+class BatchingActor(conclib.Actor):
+    """
+    Actor that handles its messages in batches, e.g. to write them to a database with one
+    query instead of one per message.
+
+    Once a message arrives, the actor takes up to BATCH_SIZE messages from its inbox,
+    waiting up to BATCH_WAIT seconds for more if fewer are queued, and calls
+    on_receive_batch with all of them. With the default BATCH_WAIT of 0 it doesn't wait:
+    batches are whatever queued up while the previous batch was handled, so they grow
+    with the load without delaying anything when it is light.
+
+    on_receive_batch returns one result per message, in order (or None if there are no
+    results). A RequestEnvelope from outside the actor system is passed as the
+    ActorMessage it contains, and its result must be an ActorMessage, which is sent back
+    as its response (any other result is sent back as an error). A pykka ask gets its
+    result. A result that is an exception fails just that message. If on_receive_batch raises, every request and ask in the batch gets the
+    error; a batch that also has tells fails the actor, as an exception in on_receive
+    does.
+
+    pykka's own messages (stop, and proxy calls) end the batch and are handled after it.
+    """
+
+    BATCH_SIZE: int = 100
+    BATCH_WAIT: float = 0.0
+
+    def on_receive_batch(self, messages: list[Any]) -> Optional[list[Any]]:
+        raise NotImplementedError
+
+    def _actor_loop_running(self) -> None:
+        while not self.actor_stopped.is_set():
+            envelope = self.actor_inbox.get()
+            if isinstance(envelope.message, inbox.SYSTEM_MESSAGES):
+                self._handle_envelope(envelope)
+                continue
+            batch = [envelope]
+            deferred = self._fill_batch(batch)
+            try:
+                self._handle_batch(batch)
+            except BaseException:
+                # As in pykka's loop: e.g. KeyboardInterrupt stops every actor
+                logger.debug(f"{sys.exc_info()[1]!r} in {self}. Stopping all actors.")
+                self._stop()
+                ActorRegistry.stop_all()
+                return
+            if deferred is not None:
+                self._handle_envelope(deferred)
+
+    def _fill_batch(self, batch: list) -> Optional[Any]:
+        """Add queued messages to the batch. Returns a system message that ended it."""
+        deadline = time.monotonic() + self.BATCH_WAIT
+        while len(batch) < self.BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    envelope = self.actor_inbox.get(timeout=remaining)
+                else:
+                    envelope = self.actor_inbox.get_nowait()
+            except queue.Empty:
+                return None
+            if isinstance(envelope.message, inbox.SYSTEM_MESSAGES):
+                return envelope
+            batch.append(envelope)
+        return None
+
+    def _handle_envelope(self, envelope: Any):
+        """Handle one message the way pykka's actor loop does"""
+        try:
+            response = self._handle_receive(envelope.message)
+            if envelope.reply_to is not None:
+                envelope.reply_to.set(response)
+        except Exception:
+            if envelope.reply_to is not None:
+                envelope.reply_to.set_exception()
+            else:
+                self._handle_failure(*sys.exc_info())
+                try:
+                    self.on_failure(*sys.exc_info())
+                except Exception:
+                    self._handle_failure(*sys.exc_info())
+
+    def _handle_batch(self, batch: list):
+        items = []
+        for envelope in batch:
+            item = self._prepare(envelope)
+            if item is not None:
+                items.append(item)
+        if not items:
+            return
+
+        start = time.perf_counter()
+        try:
+            results = self.on_receive_batch([item.message for item in items])
+            if results is None:
+                results = [None] * len(items)
+            elif len(results) != len(items):
+                raise RuntimeError(
+                    f"on_receive_batch returned {len(results)} results for "
+                    f"{len(items)} messages"
+                )
+        except Exception as e:
+            self._record_batch(items, start, [e] * len(items))
+            logger.warning(
+                "%s raised handling a batch of %d",
+                self.actor_urn,
+                len(items),
+                exc_info=True,
+            )
+            for item in items:
+                item.set_exception(e)
+            if not all(item.has_caller for item in items):
+                self._handle_failure(*sys.exc_info())
+                try:
+                    self.on_failure(*sys.exc_info())
+                except Exception:
+                    self._handle_failure(*sys.exc_info())
+            return
+        self._record_batch(items, start, results)
+        for item, result in zip(items, results):
+            if isinstance(result, Exception) and not item.has_caller:
+                logger.warning(
+                    "%s failed to handle %s: %r",
+                    self.actor_urn,
+                    type(item.message).__name__,
+                    result,
+                )
+            item.set_result(result)
+
+    def _prepare(self, envelope: Any) -> Optional[_Item]:
+        """The batch item for a queued message, None if it is answered straight away"""
+        message = envelope.message
+        if not isinstance(message, RequestEnvelope):
+            return _Item(envelope, message, None)
+        message.mark(tracing.STAGE_HANDLER_STARTED)
+        if message.expired():
+            metrics.count_expired(self.actor_urn)
+            message.respond_error(
+                STATUS_EXPIRED,
+                f"Deadline passed before {self.actor_urn} handled the request",
+            )
+        else:
+            message_class = message.message_class()
+            try:
+                if message_class is None:
+                    raise UnexpectedMessageError(message)
+                return _Item(envelope, message.extract(message_class), message)
+            except Exception as e:
+                message.respond_error(STATUS_ERROR, f"{type(e).__name__}: {e}")
+        if envelope.reply_to is not None:
+            envelope.reply_to.set(None)
+        return None
+
+    def _record_batch(self, items: list[_Item], start: float, results: list[Any]):
+        if not metrics.ENABLED:
+            return
+        # The batch's time is shared between its messages
+        seconds = (time.perf_counter() - start) / len(items)
+        for item, result in zip(items, results):
+            # Requests are only batched once their message_type resolved to a class
+            key = type(item.message)
+            series = self._metrics_series.get(key)
+            if series is None:
+                series = self._metrics_series[key] = self._create_metrics_series(key)
+            handled, errors, handler_seconds = series
+            handled.inc()
+            handler_seconds.observe(seconds)
+            if isinstance(result, Exception):
+                errors.inc()
+        metrics.actor_batch_size.labels(self.actor_urn).observe(len(items))
@@ -0,0 +1,189 @@
+import collections
+import queue
+import time
+
+from typing import Any, Callable
+
+from pykka import messages
+
+from conclib import metrics
+from conclib.errors import InboxFullError
+from conclib.proxy.envelope import RequestEnvelope
+from conclib.proxy.messages import ActorMessage, Priority
+
+# What to do with a message sent to a full inbox
+BLOCK = "block"  # wait for space, slowing the sender down
+DROP_OLDEST = "drop_oldest"  # make space by dropping the oldest queued message
+DROP_NEWEST = "drop_newest"  # drop the new message
+REJECT = "reject"  # raise InboxFullError in the sender
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, REJECT)
+
+# pykka's own messages (stop, proxy calls). They are always admitted and never dropped, so
+# a full actor can still be stopped.
+SYSTEM_MESSAGES = (
+    messages._ActorStop,  # noqa: SLF001
+    messages.ProxyCall,
+    messages.ProxyGetAttr,
+    messages.ProxySetAttr,
+)
+
+
+def _is_system(envelope: Any) -> bool:
+    return isinstance(envelope.message, SYSTEM_MESSAGES)
+
+
+class BoundedInbox(queue.Queue):
+    """
+    Actor inbox that holds at most `capacity` messages, applying `overflow` (one of
+    OVERFLOW_POLICIES) when it is full. Dropped envelopes are passed to on_shed. System
+    messages don't count towards the capacity.
+    """
+
+    def __init__(
+        self,
+        actor_urn: str,
+        capacity: int,
+        overflow: str,
+        on_shed: Callable[[Any], None],
+    ):
+        if capacity < 1:
+            raise ValueError(f"Inbox capacity must be at least 1, got {capacity}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown inbox overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            )
+        # The underlying queue is unbounded, the capacity is enforced in put() so that
+        # system messages can always get in
+        super().__init__()
+        self.actor_urn = actor_urn
+        self.capacity = capacity
+        self.overflow = overflow
+        self.on_shed = on_shed
+        self._system_count = 0
+
+    def put(self, item: Any, block: bool = True, timeout: float | None = None):
+        # The overflow policy decides what happens when the inbox is full. block=False
+        # turns waiting for space (the block policy) into raising InboxFullError, for
+        # senders that must not wait. timeout is only here for compatibility with
+        # queue.Queue.
+        shed = None
+        with self.not_full:
+            if _is_system(item):
+                self._system_count += 1
+            else:
+                while self._qsize() - self._system_count >= self.capacity:
+                    if self.overflow == BLOCK and block:
+                        self.not_full.wait()
+                    elif self.overflow == DROP_OLDEST:
+                        shed = self._remove_oldest()
+                        break
+                    elif self.overflow == DROP_NEWEST:
+                        shed = item
+                        break
+                    else:
+                        self._count_dropped()
+                        raise InboxFullError(self.actor_urn)
+            if shed is not item:
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+        if shed is not None:
+            self._count_dropped()
+            self.on_shed(shed)
+
+    def _count_dropped(self):
+        if metrics.ENABLED:
+            metrics.actor_inbox_dropped.labels(self.actor_urn).inc()
+
+    def _get(self) -> Any:
+        item = super()._get()
+        if _is_system(item):
+            self._system_count -= 1
+        return item
+
+    def _remove_oldest(self) -> Any:
+        for index, envelope in enumerate(self.queue):
+            if not _is_system(envelope):
+                del self.queue[index]
+                self.unfinished_tasks -= 1
+                return envelope
+        raise AssertionError("A full inbox has no regular messages")
+
+
+def _check_aging(aging: float) -> float:
+    if aging <= 0:
+        raise ValueError(f"Priority aging must be positive, got {aging}")
+    return aging
+
+
+def _priority(envelope: Any) -> int:
+    message = envelope.message
+    if isinstance(message, RequestEnvelope):
+        return message.priority
+    if isinstance(message, ActorMessage):
+        return message.PRIORITY
+    if isinstance(message, messages._ActorStop):  # noqa: SLF001
+        # Behind the messages that were queued before it, as in a FIFO inbox
+        return Priority.LOW
+    return Priority.NORMAL
+
+
+class PriorityInbox(queue.Queue):
+    """
+    Actor inbox with a FIFO lane per Priority. get() takes the message with the best
+    priority, where a message gains one level for every `aging` seconds it has waited, so
+    a steady stream of high priority messages delays lower ones by a bounded amount
+    instead of starving them.
+    """
+
+    def __init__(self, aging: float = 1.0):
+        super().__init__()
+        self.aging = _check_aging(aging)
+
+    def _init(self, maxsize: int):
+        # One deque of (time.monotonic() it was queued, envelope) per priority
+        self.lanes = [collections.deque() for _ in Priority]
+
+    def _qsize(self) -> int:
+        return sum(len(lane) for lane in self.lanes)
+
+    def _put(self, item: Any):
+        self.lanes[_priority(item)].append((time.monotonic(), item))
+
+    def _get(self) -> Any:
+        now = time.monotonic()
+        best_lane, best_score = None, None
+        for level, lane in enumerate(self.lanes):
+            if lane:
+                score = level - (now - lane[0][0]) / self.aging
+                if best_score is None or score < best_score:
+                    best_lane, best_score = lane, score
+        return best_lane.popleft()[1]
+
+    def _remove_oldest(self) -> Any:
+        """Remove the oldest regular message of the lowest priority"""
+        for lane in reversed(self.lanes):
+            for index, (_, envelope) in enumerate(lane):
+                if not _is_system(envelope):
+                    del lane[index]
+                    self.unfinished_tasks -= 1
+                    return envelope
+        raise AssertionError("A full inbox has no regular messages")
+
+
+class BoundedPriorityInbox(BoundedInbox, PriorityInbox):
+    """A BoundedInbox with priority lanes. drop_oldest sheds the lowest priority first."""
+
+    def __init__(
+        self,
+        actor_urn: str,
+        capacity: int,
+        overflow: str,
+        on_shed: Callable[[Any], None],
+        aging: float = 1.0,
+    ):
+        # Runs PriorityInbox.__init__ with the default aging
+        super().__init__(actor_urn, capacity, overflow, on_shed)
+        self.aging = _check_aging(aging)
+
+    _remove_oldest = PriorityInbox._remove_oldest
@@ -1,7 +1,7 @@
 import conclib
-from conclib.pykka_extensions.ticker import ChildTicker
+from conclib.pykka_extensions.ticker import COALESCE, ChildTicker
 from types import TracebackType
-from typing import Optional
+from typing import Any, Optional
 
 TickFrequency = float
 ActorMessageType = type[conclib.ActorMessage]
@@ -15,6 +15,12 @@ class PeriodicActor(conclib.Actor):
     super() on them so that startup and cleanup happen.
     """
     TICKS: dict[ActorMessageType, TickFrequency] = {}
+    # What to do about ticks that are due while the previous tick is still being sent
+    # (see conclib.pykka_extensions.ticker.MISSED_TICK_POLICIES)
+    MISSED_TICKS: str = COALESCE
+    # Don't send a tick while the previous tick of the same type is still in the inbox or
+    # being handled, so a slow handler doesn't build up a backlog of identical ticks
+    SKIP_PENDING_TICKS: bool = False
 
     def __init__(self):
         super().__init__()
@@ -23,9 +29,14 @@ class PeriodicActor(conclib.Actor):
             new_ticker = ChildTicker(
                 interval=interval,
                 actor_ref=self.actor_ref,
-                message_type=message_type
+                message_type=message_type,
+                missed_ticks=self.MISSED_TICKS,
+                skip_if_pending=self.SKIP_PENDING_TICKS,
             )
             self.tickers.append(new_ticker)
+        self._tickers_by_type = {
+            child_ticker.message_type: child_ticker for child_ticker in self.tickers
+        }
 
     def start_tickers(self):
         for ticker in self.tickers:
@@ -52,6 +63,21 @@ class PeriodicActor(conclib.Actor):
         """ If this is overridden, super().on_failure() must be called. """
         self.stop_tickers()
 
+    def _handle_message(self, message: Any) -> Any:
+        try:
+            return super()._handle_message(message)
+        finally:
+            self._tick_done(message)
+
+    def _on_shed(self, envelope: Any):
+        super()._on_shed(envelope)
+        self._tick_done(envelope.message)
+
+    def _tick_done(self, message: Any):
+        child_ticker = self._tickers_by_type.get(type(message))
+        if child_ticker is not None:
+            child_ticker.tick_done()
+
 
 class ExampleTickMessage(conclib.ActorMessage):
     pass
@@ -0,0 +1,199 @@
+import bisect
+import itertools
+import zlib
+
+from typing import Any, Callable, Optional
+
+import pykka
+
+import conclib
+from conclib.errors import UnexpectedMessageError
+from conclib.proxy.envelope import STATUS_ERROR, RequestEnvelope, tell_request
+
+ROUND_ROBIN = "round_robin"
+LEAST_BUSY = "least_busy"
+CONSISTENT_HASH = "consistent_hash"
+ROUTINGS = (ROUND_ROBIN, LEAST_BUSY, CONSISTENT_HASH)
+
+# Points per worker on the consistent hash ring. More points spread keys more evenly.
+HASH_RING_REPLICAS = 64
+
+
+def _hash(value: Any) -> int:
+    data = value if isinstance(value, bytes) else str(value).encode()
+    return zlib.crc32(data)
+
+
+class PoolRef(pykka.ActorRef):
+    """
+    Reference to a Pool of workers, registered in pykka.ActorRegistry under the pool's
+    URN. tell() and ask() pass each message to one worker, so anything that looks the URN
+    up (the proxy, ProxyClient's local fast path, other actors) uses the pool like a single
+    actor.
+    """
+
+    def __init__(
+        self,
+        actor_class: type[conclib.Actor],
+        urn: str,
+        workers: list[pykka.ActorRef],
+        routing: str,
+        key: Optional[Callable[[Any], Any]],
+    ):
+        # Not a reference to one actor, so ActorRef.__init__ doesn't apply
+        self.actor_class = actor_class
+        self.actor_urn = urn
+        self.workers = workers
+        self.routing = routing
+        self.key = key
+        self._round_robin = itertools.count()
+        self._ring: list[tuple[int, int]] = sorted(
+            (_hash(f"{worker.actor_urn}#{replica}"), index)
+            for index, worker in enumerate(workers)
+            for replica in range(HASH_RING_REPLICAS)
+        )
+        self._ring_hashes = [point for point, _ in self._ring]
+
+    def __repr__(self) -> str:
+        return f"<PoolRef for {self}>"
+
+    def __str__(self) -> str:
+        return f"Pool of {len(self.workers)} {self.actor_class.__name__} ({self.actor_urn})"
+
+    def is_alive(self) -> bool:
+        return any(worker.is_alive() for worker in self.workers)
+
+    def route(self, message: Any) -> pykka.ActorRef:
+        """The worker that should handle message"""
+        if self.routing == CONSISTENT_HASH:
+            point = _hash(self.key(self._routed_message(message)))
+            index = bisect.bisect(self._ring_hashes, point) % len(self._ring)
+            return self.workers[self._ring[index][1]]
+
+        start = next(self._round_robin) % len(self.workers)
+        if self.routing == ROUND_ROBIN:
+            return self.workers[start]
+        # Least busy: fewest messages waiting in the inbox. Start the scan at the round
+        # robin position so ties don't all go to the first worker.
+        best, best_depth = None, None
+        for offset in range(len(self.workers)):
+            worker = self.workers[(start + offset) % len(self.workers)]
+            depth = worker.actor_inbox.qsize()
+            if best_depth is None or depth < best_depth:
+                best, best_depth = worker, depth
+                if depth == 0:
+                    break
+        return best
+
+    @staticmethod
+    def _routed_message(message: Any) -> Any:
+        """What the key function is called with: the ActorMessage inside a RequestEnvelope,
+        otherwise the message itself. Raises UnexpectedMessageError if the class of the
+        envelope's contents isn't known here."""
+        if isinstance(message, RequestEnvelope):
+            message_class = message.message_class()
+            if message_class is None:
+                raise UnexpectedMessageError(message)
+            return message.extract(message_class)
+        return message
+
+    def tell(self, message: Any) -> None:
+        try:
+            worker = self.route(message)
+        except Exception as e:
+            if not isinstance(message, RequestEnvelope):
+                raise
+            # E.g. an unknown message type, or the key function raised. Answer the request
+            # instead of failing the proxy thread that delivers it.
+            message.respond_error(STATUS_ERROR, f"{type(e).__name__}: {e}")
+            return
+        if isinstance(message, RequestEnvelope):
+            tell_request(worker, message)
+        else:
+            worker.tell(message)
+
+    def ask(
+        self, message: Any, *, block: bool = True, timeout: Optional[float] = None
+    ) -> Any:
+        return self.route(message).ask(message, block=block, timeout=timeout)
+
+    def stop(self, *, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """Stop every worker. Returns whether any of them was running (or a future of it)"""
+        pykka.ActorRegistry.unregister(self)
+        futures = [worker.stop(block=False) for worker in self.workers]
+        future = futures[0].join(*futures[1:]).map(any)
+        if block:
+            return future.get(timeout=timeout)
+        return future
+
+    def proxy(self):
+        raise TypeError("Pools don't support proxies, use tell() or ask()")
+
+
+class Pool:
+    """
+    N copies of an Actor behind a single URN. Each message sent to the URN is handled by
+    one worker, chosen by `routing`:
+
+    - "round_robin": the workers take turns
+    - "least_busy": the worker with the fewest queued messages
+    - "consistent_hash": the same worker for the same `key(message)`, so messages with the
+      same key are handled in order. `key` is called with the ActorMessage (also for
+      requests arriving through the proxy).
+
+    Workers are started with the URNs "<urn>/0" ... "<urn>/<size-1>".
+
+        pool_ref = conclib.Pool(ExampleActor, size=4, urn="example").start()
+    """
+
+    def __init__(
+        self,
+        actor_class: type[conclib.Actor],
+        size: int,
+        urn: Optional[str] = None,
+        routing: str = ROUND_ROBIN,
+        key: Optional[Callable[[Any], Any]] = None,
+    ):
+        if size < 1:
+            raise ValueError(f"A pool needs at least one worker, got size={size}")
+        if routing not in ROUTINGS:
+            raise ValueError(f"Unknown routing {routing!r}, expected one of {ROUTINGS}")
+        if routing == CONSISTENT_HASH and key is None:
+            raise ValueError("consistent_hash routing needs a key function")
+        urn = urn or actor_class.URN
+        if not urn:
+            raise ValueError(
+                "A pool needs a URN, pass urn= or set URN on the actor class"
+            )
+        self.actor_class = actor_class
+        self.size = size
+        self.urn = urn
+        self.routing = routing
+        self.key = key
+
+    def start(self, *args, **kwargs) -> PoolRef:
+        """Start the workers, passing args and kwargs to each of them, and register the
+        pool under its URN"""
+        workers = []
+        try:
+            for index in range(self.size):
+                workers.append(self.worker_class(index).start(*args, **kwargs))
+        except Exception:
+            for worker in workers:
+                worker.stop()
+            raise
+        pool_ref = PoolRef(self.actor_class, self.urn, workers, self.routing, self.key)
+        pykka.ActorRegistry.register(pool_ref)
+        return pool_ref
+
+    def worker_class(self, index: int) -> type[conclib.Actor]:
+        """The actor class with its URN set for one worker"""
+        return type(
+            self.actor_class.__name__,
+            (self.actor_class,),
+            {
+                "URN": f"{self.urn}/{index}",
+                "__qualname__": self.actor_class.__qualname__,
+                "__module__": self.actor_class.__module__,
+            },
+        )
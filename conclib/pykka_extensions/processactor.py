@@ -0,0 +1,167 @@
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import sys
+import traceback
+
+from types import TracebackType
+from typing import Any, Optional
+
+import conclib
+from conclib.errors import ProcessActorError
+from conclib.proxy import blobs
+from conclib.proxy.envelope import RequestEnvelope, ResponseEnvelope
+from conclib.pykka_extensions.inbox import SYSTEM_MESSAGES
+
+
+def _importable_class(cls: type) -> type:
+    """The first class in cls's MRO that pickle can find by name. Pool workers are dynamic
+    subclasses that only exist in the parent process."""
+    for klass in cls.__mro__:
+        obj = sys.modules.get(klass.__module__)
+        for part in klass.__qualname__.split("."):
+            obj = getattr(obj, part, None)
+        if obj is klass:
+            return klass
+    raise TypeError(f"{cls} can't be imported by a child process")
+
+
+def _sendable_exception(e: BaseException) -> BaseException:
+    try:
+        # Exceptions with custom __init__ arguments often pickle but can't be unpickled
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return ProcessActorError(
+            "".join(traceback.format_exception_only(type(e), e)).strip()
+        )
+
+
+def _child_main(
+    actor_class: type["ProcessActor"],
+    args: tuple,
+    kwargs: dict,
+    actor_urn: str,
+    conn: multiprocessing.connection.Connection,
+):
+    """Runs in the child process: handle messages from the pipe until it is closed"""
+    actor = actor_class(*args, **kwargs)
+    actor.actor_urn = actor_urn
+    actor.on_process_start()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        # Responses are collected and sent back with the result, the parent delivers them
+        responses: list[ResponseEnvelope] = []
+        if isinstance(message, RequestEnvelope):
+            message._reply_hook = responses.append
+        try:
+            result = actor.on_receive(message)
+        except Exception as e:
+            conn.send((False, _sendable_exception(e), responses))
+        else:
+            conn.send((True, result, responses))
+
+
+class ProcessActor(conclib.Actor):
+    """
+    Actor whose on_receive runs in a child process, for CPU heavy handlers that would
+    otherwise hold the GIL and stall every other actor.
+
+    The actor is addressed like any other (URN, tell/ask, RequestEnvelopes from the proxy)
+    and queues messages in the parent process. Each message is sent to the child through a
+    pipe and handled there by a separate instance of the class, created with the same
+    constructor arguments, which keeps its state between messages. Calls to respond() in
+    the child are sent back and delivered from the parent, and on_receive's return value
+    (or exception) is returned to ask().
+
+    Messages, constructor arguments and return values must be picklable, and the class must
+    be importable by the child (the child is started with the "spawn" method, so scripts
+    need an `if __name__ == "__main__"` guard). on_start/on_stop/on_failure run in the
+    parent; override on_process_start for per-process setup in the child. Use a Pool of
+    ProcessActors to use several cores.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        obj = super().__new__(cls)
+        # Recorded so the child can build its own instance
+        obj._process_args = (args, kwargs)
+        return obj
+
+    def on_process_start(self) -> None:
+        """Called in the child process before the first message. Override to e.g. load a
+        model once per process."""
+
+    def on_start(self) -> None:
+        """If this is overridden, super().on_start() must be called."""
+        args, kwargs = self._process_args
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_child_main,
+            args=(
+                _importable_class(type(self)),
+                args,
+                kwargs,
+                self.actor_urn,
+                child_conn,
+            ),
+            name=f"{self.__class__.__name__}-{self.actor_urn}",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+    def on_stop(self) -> None:
+        """If this is overridden, super().on_stop() must be called."""
+        self.stop_process()
+
+    def on_failure(
+        self,
+        exception_type: Optional[type[BaseException]],
+        exception_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """If this is overridden, super().on_failure() must be called."""
+        self.stop_process()
+
+    def stop_process(self, timeout: float = 5.0):
+        """Close the pipe, which ends the child's loop, and wait for it to exit"""
+        process = getattr(self, "_process", None)
+        if process is None:
+            return
+        self._conn.close()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        self._process = None
+
+    def _handle_message(self, message: Any) -> Any:
+        if isinstance(message, SYSTEM_MESSAGES):
+            # pykka handles these itself, in the parent process
+            return super()._handle_message(message)
+        if isinstance(message, RequestEnvelope) and message.blobs:
+            # The child has no redis connection, and memoryviews can't be pickled
+            blobs.fetch(
+                message,
+                message._redis_conn,
+                message._config,
+                delete=message.stream_id is None,
+            )
+            message.contents = blobs.to_bytes(message.contents)
+        try:
+            self._conn.send(message)
+            ok, result, responses = self._conn.recv()
+        except (EOFError, OSError) as e:
+            raise ProcessActorError(
+                f"The child process of {self.actor_urn} exited"
+            ) from e
+        if isinstance(message, RequestEnvelope):
+            for response_envelope in responses:
+                message.send_response(response_envelope)
+        if not ok:
+            raise result
+        return result
@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import queue
+import threading
+import logging
+import time
+
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """Handle for a callback scheduled on a Scheduler. Cancelling is O(1)."""
+
+    __slots__ = ("when", "callback", "scheduler", "_state")
+
+    PENDING, FIRED, CANCELLED = range(3)
+
+    def __init__(
+        self, when: float, callback: Callable[[], None], scheduler: "Scheduler"
+    ):
+        self.when = when
+        self.callback = callback
+        self.scheduler = scheduler
+        self._state = Timer.PENDING
+
+    @property
+    def cancelled(self) -> bool:
+        return self._state == Timer.CANCELLED
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+
+class Scheduler:
+    """
+    Runs callbacks at given times (time.monotonic()) for any number of timers, using one
+    scheduling thread and a small pool of worker threads.
+
+    Timers are kept in a heap, so adding one is O(log n). Cancelled timers are only marked
+    and are dropped when they reach the top of the heap (or when they make up most of it),
+    so cancelling is O(1). Due callbacks are handed to the workers, so a slow callback
+    delays other callbacks only once all workers are busy.
+    """
+
+    def __init__(self, workers: int = 4, name: str = "ConclibScheduler"):
+        self.name = name
+        self._heap: list[tuple[float, int, Timer]] = []
+        # Breaks ties between timers that are due at the same time
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._work: queue.SimpleQueue[Callable[[], None]] = queue.SimpleQueue()
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._workers = [
+            threading.Thread(
+                target=self._work_loop, name=f"{name}-worker-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __len__(self) -> int:
+        """Number of pending timers"""
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> Timer:
+        timer = Timer(when, callback, self)
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._sequence), timer))
+            if self._heap[0][2] is timer:
+                # New earliest timer, the scheduling thread has to wake up sooner
+                self._condition.notify()
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def cancel(self, timer: Timer):
+        with self._condition:
+            if timer._state != Timer.PENDING:
+                return
+            timer._state = Timer.CANCELLED
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._heap and (
+                    self._heap[0][0] <= now or self._heap[0][2].cancelled
+                ):
+                    _, _, timer = heapq.heappop(self._heap)
+                    if timer.cancelled:
+                        self._cancelled -= 1
+                        continue
+                    timer._state = Timer.FIRED
+                    self._work.put(timer.callback)
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+
+    def _work_loop(self):
+        while True:
+            callback = self._work.get()
+            try:
+                callback()
+            except Exception:
+                logger.exception(
+                    "[%s] Scheduled callback %r raised", self.name, callback
+                )
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """The scheduler shared by every Ticker in the process, started on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
@@ -1,4 +1,4 @@
-import queue
+import logging
 import threading
 import uuid
 
@@ -7,65 +7,203 @@ import time
 from typing import Optional
 
 import pykka
+from pykka._envelope import Envelope
 
 import conclib
+from conclib import metrics
+from conclib.errors import InboxFullError
+from conclib.pykka_extensions.scheduler import Scheduler, Timer, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# What a ticker does about ticks whose time passed while execute() was still running (or
+# while the scheduler was busy):
+# - SKIP: drop them and wait for the next tick that is still in the future
+# - COALESCE: run once straight away in place of all of them, then continue on schedule
+# - CATCH_UP: run every one of them, back to back, until the ticker is on schedule again
+SKIP = "skip"
+COALESCE = "coalesce"
+CATCH_UP = "catch_up"
+MISSED_TICK_POLICIES = (SKIP, COALESCE, CATCH_UP)
 
 
 # Class to run code every X seconds. This type of work doesn't fit well into the pykka actor model.
 # This should generally be used to send a message to an actor every X second and have the logic
 # exist inside that actor.
-class Ticker(threading.Thread):
+#
+# Tickers used to be one thread each. They now all share one Scheduler (a timer heap on one
+# thread, plus a few worker threads that run execute()), but keep the Thread-like
+# start/stop/join/is_alive interface. A ticker's executions never overlap. Ticks are at a
+# fixed rate, every `interval` seconds of time.monotonic() from the first one, so slow
+# executions and late wakeups don't shift the ones after them. missed_ticks decides what
+# happens to ticks whose time passed while the previous execute() was running.
+class Ticker:
     def __init__(
             self,
             interval: float = 10,
-            thread_name: str | None = None
+            thread_name: str | None = None,
+            scheduler: Optional[Scheduler] = None,
+            missed_ticks: str = COALESCE,
     ) -> None:
-        self.shutdown_queue = queue.Queue()
+        if missed_ticks not in MISSED_TICK_POLICIES:
+            raise ValueError(
+                f"Unknown missed tick policy {missed_ticks!r}, expected one of {MISSED_TICK_POLICIES}"
+            )
         self.interval = interval
-        self.next_scheduled_time: Optional[int] = None
-        thread_name = thread_name or f"{self.__class__.__name__}-{uuid.uuid4()}"
-        super().__init__(name=thread_name)
+        self.missed_ticks = missed_ticks
+        # time.monotonic() of the next execution
+        self.next_scheduled_time: Optional[float] = None
+        self.name = thread_name or f"{self.__class__.__name__}-{uuid.uuid4()}"
+        # Label of the ticker's lateness metric. Unnamed tickers of a class share one.
+        self.metrics_name = thread_name or self.__class__.__name__
+        self.scheduler = scheduler
+
+        self._lock = threading.Lock()
+        self._timer: Optional[Timer] = None
+        self._started = False
+        self._stopped = False
+        self._executing = False
+        self._done = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                raise RuntimeError("Tickers can only be started once")
+            self._started = True
+            if self.scheduler is None:
+                self.scheduler = get_scheduler()
+            if self._stopped:
+                self._done.set()
+                return
+            self._schedule(time.monotonic())
 
     def stop(self):
-        self.shutdown_queue.put(None)
+        with self._lock:
+            self._stopped = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._started and not self._executing:
+                self._done.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait until the ticker is stopped and any running execute() has returned"""
+        if not self._started:
+            raise RuntimeError("Cannot join a ticker before it is started")
+        self._done.wait(timeout)
+
+    def is_alive(self) -> bool:
+        return self._started and not self._done.is_set()
 
     # This should be overwritten by subclass
     def execute(self):
         print(time.time())
 
-    def run(self):
-        self.next_scheduled_time = time.time()
-        while True:
-            try:
-                wait_time = max(0.0, self.next_scheduled_time - time.time())
+    def _schedule(self, scheduled_time: float, when: Optional[float] = None):
+        """Schedule the tick due at scheduled_time, to run at `when` (by default on time)"""
+        self.next_scheduled_time = scheduled_time
+        self._timer = self.scheduler.call_at(
+            scheduled_time if when is None else when, self._tick
+        )
 
-                # Block for wait_time unless we receive a shutdown message. If we don't get a
-                # shutdown message, EXCEPT clause gets executed
-                _ = self.shutdown_queue.get(block=True, timeout=wait_time)
+    def _schedule_next(self):
+        scheduled_time = self.next_scheduled_time + self.interval
+        now = time.monotonic()
+        if scheduled_time >= now or self.missed_ticks == CATCH_UP:
+            self._schedule(scheduled_time)
+            return
+        # Ticks due at or before now besides the one at scheduled_time
+        behind = int((now - scheduled_time) // self.interval)
+        if self.missed_ticks == SKIP:
+            missed = behind + 1
+            self._schedule(scheduled_time + missed * self.interval)
+        else:
+            # Run now for the latest tick that is due
+            missed = behind
+            self._schedule(scheduled_time + behind * self.interval, when=now)
+        if missed and metrics.ENABLED:
+            metrics.ticker_missed.labels(self.metrics_name, "late").inc(missed)
 
+    def _tick(self):
+        with self._lock:
+            if self._stopped:
                 return
+            self._timer = None
+            self._executing = True
 
-            except queue.Empty:
-                self.next_scheduled_time = time.time() + self.interval
-                self.execute()
+        started = time.monotonic()
+        if metrics.ENABLED:
+            metrics.ticker_lateness_seconds.labels(self.metrics_name).observe(
+                max(0.0, started - self.next_scheduled_time)
+            )
+        try:
+            self.execute()
+        except Exception:
+            # Same outcome as the exception ending the ticker's thread used to have
+            logger.exception("%s execute() raised, stopping the ticker", self.name)
+            with self._lock:
+                self._stopped = True
+        finally:
+            with self._lock:
+                self._executing = False
+                if self._stopped:
+                    self._done.set()
+                else:
+                    self._schedule_next()
 
 
 class ChildTicker(Ticker):
     """
     A ticker that is created by a parent actor and sends a type of message to the parent actor.
     This is a utility class to be able to create a PeriodicActor which reduces boilerplate.
+
+    With skip_if_pending, a tick is not sent while the previous one is still waiting in the
+    actor's inbox or being handled, so a slow actor doesn't build up a backlog of ticks. The
+    actor must call tick_done() once it is finished with each one (PeriodicActor does).
+
+    A tick is never waited on: if the actor's inbox is full (with any overflow policy that
+    doesn't drop messages), the tick is missed and the ticker carries on.
     """
     def __init__(
             self,
             interval: float,
             actor_ref: pykka.ActorRef,
-            message_type: type[conclib.ActorMessage]
+            message_type: type[conclib.ActorMessage],
+            missed_ticks: str = COALESCE,
+            skip_if_pending: bool = False,
     ) -> None:
         self.actor_ref = actor_ref
         self.message_type = message_type
+        self.skip_if_pending = skip_if_pending
+        self._pending = threading.Event()
         # Generate a name based on the Actor class, the frequency, and the message type
         thread_name = f"{self.actor_ref.actor_class.__name__}-{interval}-{self.message_type.__name__}"
-        super().__init__(interval=interval, thread_name=thread_name)
+        super().__init__(interval=interval, thread_name=thread_name, missed_ticks=missed_ticks)
 
     def execute(self):
-        self.actor_ref.tell(self.message_type())
+        if self.skip_if_pending:
+            if self._pending.is_set():
+                if metrics.ENABLED:
+                    metrics.ticker_missed.labels(self.metrics_name, "pending").inc()
+                return
+            self._pending.set()
+        try:
+            self._send()
+        except InboxFullError:
+            self._pending.clear()
+            if metrics.ENABLED:
+                metrics.ticker_missed.labels(self.metrics_name, "full").inc()
+        except Exception:
+            self._pending.clear()
+            raise
+
+    def _send(self):
+        # ActorRef.tell, without waiting for space in a full inbox: that would hold up one
+        # of the scheduler's workers, which every Ticker in the process shares
+        if not self.actor_ref.is_alive():
+            raise pykka.ActorDeadError(f"{self.actor_ref} not found")
+        self.actor_ref.actor_inbox.put(Envelope(self.message_type()), block=False)
+
+    def tick_done(self):
+        """Called by the actor when it has handled (or dropped) a tick"""
+        self._pending.clear()
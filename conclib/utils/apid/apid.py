@@ -1,3 +1,5 @@
+import os
+import signal
 import threading
 import time
 import subprocess
@@ -27,6 +29,8 @@ class RestApiDaemonThread(threading.Thread):
         self.fast_api_command = fast_api_command
         self._run_started = False
         self.fast_api_parent_proc = None
+        # Set once the healthcheck returned a 200, see wait_for_healthy
+        self.ready = threading.Event()
 
     def run(self):
         self._run_started = True
@@ -35,6 +39,8 @@ class RestApiDaemonThread(threading.Thread):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             shell=True,
+            # Its own process group, so shutdown() reaches the server and not just the shell
+            start_new_session=True,
         )
 
         for line in iter(self.fast_api_parent_proc.stdout.readline, b""):
@@ -43,15 +49,20 @@ class RestApiDaemonThread(threading.Thread):
     def shutdown(self):
         if not self._run_started:
             raise RestApiDaemonImplementationError("Trying to shutdown before starting")
-        self.fast_api_parent_proc.terminate()
+        try:
+            os.killpg(self.fast_api_parent_proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            # Already exited
+            pass
 
     def wait_for_healthy(
         self,
         healthcheck_url: str,
         startup_healthcheck_timeout: int,
-        startup_healthcheck_poll_interval: float = 0.5,
+        startup_healthcheck_poll_interval: float = 0.05,
     ):
-        """Query the healthcheck endpoint until either it returns a 200 or we timeout."""
+        """Query the healthcheck endpoint until either it returns a 200 or we timeout.
+        Raises RestApiDidntStartError straight away if the server process exits."""
         if not self._run_started:
             raise RestApiDaemonImplementationError(
                 "Trying to wait for healthy before starting"
@@ -63,21 +74,33 @@ class RestApiDaemonThread(threading.Thread):
 
         start_time = time.time()
         max_time = start_time + startup_healthcheck_timeout
-        while time.time() < max_time:
-            try:
-                response = requests.get(healthcheck_url, timeout=0.5)
-                if response.status_code == 200:
-                    print("✅  REST API is healthy")
-                    return
-            except requests.exceptions.ConnectionError:
-                print(
-                    f"⏳  ConnectionError when trying to connect to {healthcheck_url}"
-                )
-                pass
-            except requests.exceptions.ReadTimeout:
-                print(f"⌛️ ReadTimeout when trying to connect to {healthcheck_url}")
-                pass
-            time.sleep(startup_healthcheck_poll_interval)
+        reported = set()
+        with requests.Session() as session:
+            while time.time() < max_time:
+                if self.fast_api_parent_proc.poll() is not None:
+                    raise RestApiDidntStartError(
+                        f"FastAPI exited with code {self.fast_api_parent_proc.returncode}"
+                    )
+                try:
+                    response = session.get(healthcheck_url, timeout=0.5)
+                    if response.status_code == 200:
+                        print("✅  REST API is healthy")
+                        self.ready.set()
+                        return
+                except requests.exceptions.ConnectionError as e:
+                    # Expected until the server listens, only report it once
+                    if type(e) not in reported:
+                        print(
+                            f"⏳  ConnectionError when trying to connect to {healthcheck_url}"
+                        )
+                        reported.add(type(e))
+                except requests.exceptions.ReadTimeout as e:
+                    if type(e) not in reported:
+                        print(
+                            f"⌛️ ReadTimeout when trying to connect to {healthcheck_url}"
+                        )
+                        reported.add(type(e))
+                time.sleep(startup_healthcheck_poll_interval)
         raise RestApiDidntStartError(
             f"FastAPI didn't start within {startup_healthcheck_timeout} seconds"
         )
@@ -87,7 +110,7 @@ def start_api(
     fast_api_command: str,
     healthcheck_url: str,
     startup_healthcheck_timeout: int,
-    startup_healthcheck_poll_interval: float = 0.5,
+    startup_healthcheck_poll_interval: float = 0.05,
 ):
     api_thread = RestApiDaemonThread(fast_api_command)
     api_thread.start()
@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 
+from conclib.utils.apid.metrics import mount_metrics
+
 app = FastAPI()
+mount_metrics(app)
 
 
 @app.get("/healthz")
@@ -0,0 +1,14 @@
+from conclib import metrics
+
+
+def mount_metrics(app, path: str = "/metrics"):
+    """Serve conclib's metrics in the Prometheus text format from a FastAPI app"""
+    from fastapi.responses import PlainTextResponse
+
+    @app.get(path, response_class=PlainTextResponse, include_in_schema=False)
+    def get_metrics():
+        return PlainTextResponse(
+            metrics.registry.render(), media_type=metrics.CONTENT_TYPE
+        )
+
+    return app
@@ -1,15 +1,77 @@
 import redis
+import redis.asyncio
 from conclib import ConclibConfig
 
-from typing import Optional
+from typing import Any, Optional
+
+import os
+import threading
+
+# Connection pools shared by every RedisClient in this process, keyed by redis address
+_pools: dict[tuple, redis.ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked child (e.g. a pre-fork web server worker) must not use the parent's sockets,
+    # and the lock may have been held by a parent thread at the time of the fork
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def connection_kwargs(config: ConclibConfig, asyncio: bool = False) -> dict[str, Any]:
+    """Arguments for a redis connection pool that connects to the configured redis, through
+    its unix socket if it has one"""
+    if config.redis_unix_socket is None:
+        return dict(host=config.redis_host, port=config.redis_port)
+    module = redis.asyncio if asyncio else redis
+    return dict(
+        path=config.redis_unix_socket,
+        connection_class=module.UnixDomainSocketConnection,
+    )
+
+
+def connection_pool(config: ConclibConfig) -> redis.ConnectionPool:
+    """
+    The connection pool for the configured redis, shared by the whole process. Without
+    config.redis_max_connections connections are opened as needed. With it, callers wait
+    up to redis_pool_timeout seconds for a free connection once that many are in use.
+    """
+    key = (
+        config.redis_host,
+        config.redis_port,
+        config.redis_unix_socket,
+        config.redis_max_connections,
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if config.redis_max_connections is None:
+                pool = redis.ConnectionPool(**connection_kwargs(config))
+            else:
+                pool = redis.BlockingConnectionPool(
+                    max_connections=config.redis_max_connections,
+                    timeout=config.redis_pool_timeout,
+                    **connection_kwargs(config),
+                )
+            _pools[key] = pool
+        return pool
 
 
 class RedisClient:
+    """
+    Connections to the configured redis, from the process-wide pool (see connection_pool),
+    so creating a RedisClient is cheap and opens no connection by itself. A pubsub holds a
+    connection of its own for as long as it is open.
+    """
+
     def __init__(self, config: ConclibConfig):
         self.config = config
-        self.redis_client = redis.Redis(
-            host=self.config.redis_host, port=self.config.redis_port
-        )
+        self.redis_client = redis.Redis(connection_pool=connection_pool(config))
         self._pubsub: Optional[redis.client.PubSub] = None
 
     @property
@@ -17,3 +79,31 @@ class RedisClient:
         if self._pubsub is None:
             self._pubsub = self.redis_client.pubsub()
         return self._pubsub
+
+
+class AsyncRedisClient:
+    """asyncio counterpart of RedisClient. Must be used from a single event loop."""
+
+    def __init__(self, config: ConclibConfig, max_connections: int = 64):
+        self.config = config
+        # Blocking pool so that thousands of concurrent callers queue for a connection
+        # instead of each opening their own. asyncio connections belong to one event loop,
+        # so the pool is the client's own.
+        self.connection_pool = redis.asyncio.BlockingConnectionPool(
+            max_connections=max_connections,
+            **connection_kwargs(config, asyncio=True),
+        )
+        self.redis_client = redis.asyncio.Redis(connection_pool=self.connection_pool)
+        self._pubsub: Optional[redis.asyncio.client.PubSub] = None
+
+    @property
+    def pubsub(self) -> redis.asyncio.client.PubSub:
+        if self._pubsub is None:
+            self._pubsub = self.redis_client.pubsub()
+        return self._pubsub
+
+    async def aclose(self):
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self.redis_client.aclose()
+        await self.connection_pool.disconnect()
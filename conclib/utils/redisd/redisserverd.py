@@ -1,4 +1,7 @@
 from conclib.config import ConclibConfig
+from conclib.errors import RedisDidntStartError
+from conclib.utils.redisd.redisclient import connection_kwargs
+import redis
 import subprocess
 import threading
 import sys
@@ -10,25 +13,80 @@ class RedisDaemonThread(threading.Thread):
         super().__init__(name=f"{self.__class__.__name__}", daemon=True)
         self.config = config
         self.redis_proc = None
+        self._proc_created = threading.Event()
+        # Set once redis answers a PING, see wait_until_ready
+        self.ready = threading.Event()
+
+    def redis_command(self) -> list[str]:
+        command = ["redis-server", "--port", str(self.config.redis_port)]
+        if self.config.redis_unix_socket is not None:
+            # Only this user may connect through the socket
+            command += [
+                "--unixsocket",
+                self.config.redis_unix_socket,
+                "--unixsocketperm",
+                "700",
+            ]
+        return command
 
     def run(self):
-        redis_command = f"redis-server --port {self.config.redis_port}"
-        self.redis_proc = subprocess.Popen(
-            redis_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
-        )
+        try:
+            self.redis_proc = subprocess.Popen(
+                self.redis_command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        finally:
+            self._proc_created.set()
 
         # TODO: Add clean shutdown mechanism?
         for line in iter(self.redis_proc.stdout.readline, b""):
             sys.stdout.write(line.decode())
 
+    def wait_until_ready(self, timeout: float, poll_interval: float = 0.01):
+        """PING redis until our redis-server answers. Raises RedisDidntStartError if it
+        exits (e.g. because the port is taken) or doesn't answer within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        self._proc_created.wait(timeout)
+        if self.redis_proc is None:
+            raise RedisDidntStartError("redis-server couldn't be launched")
+        # Our own pool, so the shared one doesn't keep a connection that failed
+        pool = redis.ConnectionPool(
+            socket_connect_timeout=poll_interval * 10, **connection_kwargs(self.config)
+        )
+        conn = redis.Redis(connection_pool=pool)
+        try:
+            while True:
+                if self.redis_proc.poll() is not None:
+                    raise RedisDidntStartError(
+                        f"redis-server exited with code {self.redis_proc.returncode}"
+                    )
+                try:
+                    conn.ping()
+                    # Another redis on the port answers too, until ours fails to listen
+                    # and exits
+                    if conn.info("server")["process_id"] == self.redis_proc.pid:
+                        self.ready.set()
+                        return
+                except (redis.ConnectionError, redis.BusyLoadingError):
+                    # Not listening yet, or still loading its dataset from disk
+                    pass
+                if time.monotonic() > deadline:
+                    raise RedisDidntStartError(
+                        f"redis didn't answer within {timeout} seconds"
+                    )
+                time.sleep(poll_interval)
+        finally:
+            pool.disconnect()
+
     def shutdown(self):
         self.redis_proc.terminate()
 
 
-def start_redis(config: ConclibConfig) -> RedisDaemonThread:
+def start_redis(
+    config: ConclibConfig, startup_timeout: float = 10.0
+) -> RedisDaemonThread:
+    """Start redis-server in the background and return once it answers. It listens on
+    config.redis_port, and on config.redis_unix_socket if it is set."""
     redis_thread = RedisDaemonThread(config=config)
     redis_thread.start()
-    time.sleep(2)
-
-    # TODO: Add blocking check until redis is ready
+    redis_thread.wait_until_ready(startup_timeout)
     return redis_thread
@@ -1,7 +1,6 @@
 import pykka
 
 import conclib
-import time
 
 
 class ExampleReqMessage(conclib.ActorMessage):
@@ -48,11 +47,9 @@ def main():
     redis_daemon = conclib.start_redis(config=config)
     try:
         conclib.start_proxy(config=config)
-        time.sleep(2)
 
         # Start the example actor
         ExampleActor.start()
-        time.sleep(2)
 
         # Make a request to the actor system
         client = conclib.ProxyClient(config=config)
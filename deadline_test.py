@@ -0,0 +1,184 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import time
+
+import pykka
+
+import conclib
+from conclib import metrics
+from conclib.errors import ActorNotFoundError, AskTimeoutError, RemoteActorError
+
+
+class SleepRequest(conclib.ActorMessage):
+    seconds: float
+
+
+class FailRequest(conclib.ActorMessage):
+    pass
+
+
+class CallsQuery(conclib.ActorMessage):
+    pass
+
+
+class CallsResponse(conclib.ActorMessage):
+    calls: int
+
+
+class SlowActor(conclib.Actor):
+    URN = "deadline_test"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @conclib.handles(SleepRequest)
+    def on_sleep(self, message: SleepRequest) -> CallsResponse:
+        self.calls += 1
+        time.sleep(message.seconds)
+        return CallsResponse(calls=self.calls)
+
+    @conclib.handles(FailRequest)
+    def on_fail(self, message: FailRequest) -> CallsResponse:
+        raise ValueError("boom")
+
+    @conclib.handles(CallsQuery)
+    def on_calls(self, message: CallsQuery) -> CallsResponse:
+        return CallsResponse(calls=self.calls)
+
+
+def expired_count() -> float:
+    return metrics.actor_expired.labels(SlowActor.URN).value
+
+
+def check_client(client: conclib.ProxyClient):
+    def ask(contents: conclib.ActorMessage, timeout=None) -> int:
+        return client.ask_actor(
+            SlowActor.URN, contents, CallsResponse, timeout=timeout
+        ).calls
+
+    try:
+        client.ask_actor("no_such_actor", CallsQuery(), CallsResponse)
+        raise AssertionError("Expected ActorNotFoundError")
+    except ActorNotFoundError:
+        pass
+
+    # The handler's exception comes back to the caller, and the actor keeps running
+    try:
+        ask(FailRequest())
+        raise AssertionError("Expected RemoteActorError")
+    except RemoteActorError as e:
+        assert "ValueError: boom" in str(e), e
+    calls = ask(SleepRequest(seconds=0), timeout=5)
+
+    # A request that waits in the inbox past its deadline times out and isn't handled
+    expired = expired_count()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        slow = executor.submit(ask, SleepRequest(seconds=0.5))
+        time.sleep(0.1)
+        start = time.monotonic()
+        try:
+            ask(SleepRequest(seconds=0), timeout=0.1)
+            raise AssertionError("Expected AskTimeoutError")
+        except AskTimeoutError:
+            assert time.monotonic() - start < 0.4
+        assert slow.result() == calls + 1
+    assert ask(CallsQuery()) == calls + 1
+    assert expired_count() == expired + 1
+
+
+async def check_async_client(config: conclib.ConclibConfig):
+    async with conclib.AsyncProxyClient(config=config, force_redis=True) as client:
+
+        async def ask(contents: conclib.ActorMessage, timeout=None) -> int:
+            response = await client.ask_actor(
+                SlowActor.URN, contents, CallsResponse, timeout=timeout
+            )
+            return response.calls
+
+        try:
+            await client.ask_actor("no_such_actor", CallsQuery(), CallsResponse)
+            raise AssertionError("Expected ActorNotFoundError")
+        except ActorNotFoundError:
+            pass
+
+        calls = await ask(CallsQuery())
+        slow = asyncio.create_task(ask(SleepRequest(seconds=0.5)))
+        await asyncio.sleep(0.1)
+        try:
+            await ask(SleepRequest(seconds=0), timeout=0.1)
+            raise AssertionError("Expected AskTimeoutError")
+        except AskTimeoutError:
+            pass
+        assert await slow == calls + 1
+        assert await ask(CallsQuery()) == calls + 1
+
+
+def check_pubsub_not_found(config: conclib.ConclibConfig):
+    """With pubsub, a request for an unknown URN fails straight away if there is only one
+    proxy, or none at all"""
+    no_proxy_config = dataclasses.replace(config, inbound_channel_name="deadline_test")
+    for client_config in (config, no_proxy_config):
+        client = conclib.ProxyClient(config=client_config)
+        for ask in (
+            lambda: client.ask_actor("no_such_actor", CallsQuery(), CallsResponse),
+            lambda: client.ask_many([("no_such_actor", CallsQuery(), CallsResponse)])[
+                0
+            ],
+        ):
+            start = time.monotonic()
+            try:
+                result = ask()
+            except ActorNotFoundError as e:
+                result = e
+            assert isinstance(result, ActorNotFoundError), result
+            assert time.monotonic() - start < 1
+        client.close()
+
+    async def ask_async():
+        async with conclib.AsyncProxyClient(config=no_proxy_config) as client:
+            try:
+                await client.ask_actor("no_such_actor", CallsQuery(), CallsResponse)
+                raise AssertionError("Expected ActorNotFoundError")
+            except ActorNotFoundError as e:
+                assert "No proxy is subscribed" in str(e), e
+
+    asyncio.run(ask_async())
+
+
+def main():
+    # With the streams transport each request reaches exactly one proxy, which can answer
+    # for unknown actor URNs
+    config = conclib.DefaultConfig(transport="streams")
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        SlowActor.start()
+
+        # In-process and through redis
+        for force_redis in (False, True):
+            client = conclib.ProxyClient(config=config, force_redis=force_redis)
+            check_client(client)
+            client.close()
+
+        asyncio.run(check_async_client(config))
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+        redis_daemon.redis_proc.wait()
+
+    config = conclib.DefaultConfig()
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        check_pubsub_not_found(config)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
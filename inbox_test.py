@@ -0,0 +1,186 @@
+import concurrent.futures
+import threading
+import time
+
+import pykka
+
+import conclib
+from conclib import metrics
+
+TICK_INTERVAL = 0.01
+
+
+class SlowRequest(conclib.ActorMessage):
+    value: int
+
+
+class SlowResponse(conclib.ActorMessage):
+    value: int
+
+
+class SlowActor(conclib.Actor):
+    URN = "inbox_test_drop_newest"
+    INBOX_CAPACITY = 2
+    INBOX_OVERFLOW = "drop_newest"
+
+    def __init__(self, release: threading.Event, handling: threading.Event):
+        super().__init__()
+        self.release = release
+        self.handling = handling
+
+    @conclib.handles(SlowRequest)
+    def on_slow(self, message: SlowRequest) -> SlowResponse:
+        self.handling.set()
+        self.release.wait()
+        return SlowResponse(value=message.value)
+
+
+class RejectingActor(SlowActor):
+    URN = "inbox_test_reject"
+    INBOX_OVERFLOW = "reject"
+
+
+class BlockingActor(SlowActor):
+    URN = "inbox_test_block"
+    INBOX_OVERFLOW = "block"
+
+
+class DropOldestActor(SlowActor):
+    URN = "inbox_test_drop_oldest"
+    INBOX_OVERFLOW = "drop_oldest"
+
+
+class FullTickMessage(conclib.ActorMessage):
+    pass
+
+
+class StuckPeriodicActor(conclib.PeriodicActor):
+    """Ticks into an inbox of one that it doesn't take anything out of until released"""
+
+    INBOX_CAPACITY = 1
+    TICKS = {FullTickMessage: TICK_INTERVAL}
+
+    def __init__(self, release: threading.Event):
+        super().__init__()
+        self.release = release
+
+    @conclib.handles(FullTickMessage)
+    def on_tick(self, message: FullTickMessage):
+        self.release.wait()
+
+
+class RejectingPeriodicActor(StuckPeriodicActor):
+    INBOX_OVERFLOW = "reject"
+
+
+class BlockingPeriodicActor(StuckPeriodicActor):
+    INBOX_OVERFLOW = "block"
+
+
+class CountingTicker(conclib.Ticker):
+    def __init__(self):
+        super().__init__(interval=TICK_INTERVAL)
+        self.count = 0
+
+    def execute(self):
+        self.count += 1
+
+
+def check_full_inbox_ticks():
+    """Ticks to a full inbox are missed, without stopping the ticker or holding up the
+    scheduler's workers"""
+    release = threading.Event()
+    try:
+        rejecting_ref = RejectingPeriodicActor.start(release)
+        # More actors than the scheduler has workers
+        blocking_refs = [BlockingPeriodicActor.start(release) for _ in range(6)]
+        time.sleep(0.2)
+        counting = CountingTicker()
+        counting.start()
+        time.sleep(0.3)
+        counting.stop()
+        assert counting.count > 10, counting.count
+        for actor_class in (RejectingPeriodicActor, BlockingPeriodicActor):
+            missed = metrics.ticker_missed.labels(
+                f"{actor_class.__name__}-{TICK_INTERVAL}-FullTickMessage", "full"
+            )
+            assert missed.value > 10, (actor_class, missed.value)
+        release.set()
+        for actor_ref in [rejecting_ref] + blocking_refs:
+            tickers = actor_ref.proxy().tickers.get(timeout=5)
+            assert all(t.is_alive() for t in tickers)
+            actor_ref.stop()
+    finally:
+        release.set()
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    release = threading.Event()
+    handling = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        conclib.start_proxy(config=config)
+        SlowActor.start(release, handling)
+        RejectingActor.start(release, handling)
+        BlockingActor.start(release, handling)
+        drop_oldest_ref = DropOldestActor.start(release, handling)
+        client = conclib.ProxyClient(config=config, force_redis=True)
+
+        # One request is being handled and two are queued, the rest are shed through the
+        # proxy with an overloaded response instead of leaving the caller waiting. The
+        # proxy doesn't wait for space with the block policy either, it would hold up
+        # every other actor.
+        for urn in [SlowActor.URN, RejectingActor.URN, BlockingActor.URN]:
+            release.clear()
+            handling.clear()
+            threading.Timer(1.0, release.set).start()
+            first = executor.submit(
+                client.ask_actor, urn, SlowRequest(value=0), SlowResponse
+            )
+            assert handling.wait(timeout=5)
+            results = client.ask_many(
+                [(urn, SlowRequest(value=i), SlowResponse) for i in range(1, 8)],
+                timeout=10,
+            )
+            overloaded = [
+                r for r in results if isinstance(r, conclib.errors.ActorOverloadedError)
+            ]
+            handled = [r for r in results if isinstance(r, SlowResponse)]
+            print(f"[test] {urn}: {len(handled)} queued, {len(overloaded)} overloaded")
+            assert len(handled) == 2 and len(overloaded) == 5, results
+            assert first.result(timeout=5).value == 0
+
+        # Dropping the oldest queued message fails its ask
+        release.clear()
+        handling.clear()
+        futures = [drop_oldest_ref.ask(SlowRequest(value=0), block=False)]
+        # Wait for the first one to be taken out of the inbox by the actor
+        assert handling.wait(timeout=5)
+        futures += [
+            drop_oldest_ref.ask(SlowRequest(value=i), block=False) for i in range(1, 4)
+        ]
+        release.set()
+        try:
+            futures[1].get(timeout=5)
+            raise AssertionError("Expected InboxFullError")
+        except conclib.errors.InboxFullError:
+            pass
+        values = [f.get(timeout=5).value for f in (futures[0], futures[2], futures[3])]
+        assert values == [0, 2, 3], values
+
+        client.close()
+
+        check_full_inbox_ticks()
+    finally:
+        release.set()
+        executor.shutdown()
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
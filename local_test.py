@@ -0,0 +1,173 @@
+import asyncio
+import dataclasses
+
+import pykka
+
+import conclib
+from conclib.errors import ActorNotFoundError, RemoteActorError
+
+MISSING_URN = "local_test_missing"
+
+
+class NoteRequest(conclib.ActorMessage):
+    text: str
+
+
+class FailRequest(conclib.ActorMessage):
+    pass
+
+
+class NoteResponse(conclib.ActorMessage):
+    text: str
+
+
+class RecordingActor(conclib.Actor):
+    URN = "local_test"
+
+    def __init__(self):
+        super().__init__()
+        self.received = []
+        self.responses = []
+
+    @conclib.handles(NoteRequest)
+    def on_note(self, message: NoteRequest) -> NoteResponse:
+        self.received.append(message)
+        response = NoteResponse(text=message.text)
+        self.responses.append(response)
+        return response
+
+    @conclib.handles(FailRequest)
+    def on_fail(self, message: FailRequest) -> NoteResponse:
+        raise ValueError("boom")
+
+    def take(self) -> list[tuple[conclib.ActorMessage, conclib.ActorMessage]]:
+        """The requests handled so far, each with the response its handler returned"""
+        received, self.received = self.received, []
+        responses, self.responses = self.responses, []
+        return list(zip(received, responses))
+
+
+def check_sync(actor_ref: pykka.ActorRef, config: conclib.ConclibConfig):
+    """Without a proxy running, only requests that bypass redis can be answered"""
+    proxy = actor_ref.proxy()
+
+    client = conclib.ProxyClient(config=config)
+    sent = NoteRequest(text="local")
+    response = client.ask_actor(RecordingActor.URN, sent, NoteResponse, timeout=5)
+    # The actor gets the message object itself, and the caller the response object itself
+    [(received, returned)] = proxy.take().get()
+    assert received is sent and response is returned, (received, response)
+
+    try:
+        client.ask_actor(RecordingActor.URN, FailRequest(), NoteResponse, timeout=5)
+        raise AssertionError("Expected RemoteActorError")
+    except RemoteActorError as e:
+        assert "boom" in str(e), e
+
+    # Each request of a batch takes the fast path only if its actor is local
+    results = client.ask_many(
+        [
+            (RecordingActor.URN, sent, NoteResponse),
+            (MISSING_URN, sent, NoteResponse),
+        ],
+        timeout=5,
+    )
+    assert results[0] is proxy.take().get()[0][1], results
+    assert isinstance(results[1], ActorNotFoundError), results
+    client.tell_many([(RecordingActor.URN, sent)])
+    client.ask_actor(RecordingActor.URN, NoteRequest(text="sync"), NoteResponse)
+    assert proxy.take().get()[0][0] is sent
+
+    forced = conclib.ProxyClient(config=config, force_redis=True)
+    try:
+        forced.ask_actor(RecordingActor.URN, sent, NoteResponse, timeout=5)
+        raise AssertionError("Expected ActorNotFoundError")
+    except ActorNotFoundError:
+        pass
+    forced.close()
+    client.close()
+
+
+def check_async(actor_ref: pykka.ActorRef, config: conclib.ConclibConfig):
+    proxy = actor_ref.proxy()
+
+    async def ask():
+        async with conclib.AsyncProxyClient(config=config) as client:
+            sent = NoteRequest(text="local")
+            response = await client.ask_actor(
+                RecordingActor.URN, sent, NoteResponse, timeout=5
+            )
+            [(received, returned)] = proxy.take().get()
+            assert received is sent and response is returned, (received, response)
+
+            results = await client.ask_many(
+                [
+                    (RecordingActor.URN, sent, NoteResponse),
+                    (MISSING_URN, sent, NoteResponse),
+                ],
+                timeout=5,
+            )
+            assert results[0] is proxy.take().get()[0][1], results
+            assert isinstance(results[1], ActorNotFoundError), results
+
+        async with conclib.AsyncProxyClient(config=config, force_redis=True) as forced:
+            try:
+                await forced.ask_actor(
+                    RecordingActor.URN, NoteRequest(text="x"), NoteResponse, timeout=5
+                )
+                raise AssertionError("Expected ActorNotFoundError")
+            except ActorNotFoundError:
+                pass
+
+    asyncio.run(ask())
+
+
+def check_force_redis(actor_ref: pykka.ActorRef, config: conclib.ConclibConfig):
+    """Through the proxy, the actor and the caller get equal copies"""
+    proxy = actor_ref.proxy()
+    sent = NoteRequest(text="remote")
+
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    response = client.ask_actor(RecordingActor.URN, sent, NoteResponse, timeout=5)
+    [(received, returned)] = proxy.take().get()
+    assert received == sent and received is not sent, received
+    assert response == returned and response is not returned, response
+    client.close()
+
+    # As is a request sent with the bare class name, for actors older than type ids
+    bare = dataclasses.replace(config, bare_message_types=True)
+    client = conclib.ProxyClient(config=bare, force_redis=True)
+    response = client.ask_actor(RecordingActor.URN, sent, NoteResponse, timeout=5)
+    assert response == NoteResponse(text="remote"), response
+    proxy.take().get()
+    client.close()
+
+    async def ask():
+        async with conclib.AsyncProxyClient(config=config, force_redis=True) as client:
+            return await client.ask_actor(
+                RecordingActor.URN, sent, NoteResponse, timeout=5
+            )
+
+    response = asyncio.run(ask())
+    [(received, returned)] = proxy.take().get()
+    assert received is not sent and response is not returned
+    assert response == NoteResponse(text="remote"), response
+
+
+def main():
+    config = conclib.DefaultConfig()
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        actor_ref = RecordingActor.start()
+        check_sync(actor_ref, config)
+        check_async(actor_ref, config)
+        conclib.start_proxy(config=config)
+        check_force_redis(actor_ref, config)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import pykka
+
+import conclib
+from conclib import metrics
+
+
+class PingRequest(conclib.ActorMessage):
+    fail: bool = False
+
+
+class PingResponse(conclib.ActorMessage):
+    pass
+
+
+class PingActor(conclib.Actor):
+    URN = "metrics_test"
+    INBOX_CAPACITY = 1
+    INBOX_OVERFLOW = "reject"
+
+    @conclib.handles(PingRequest)
+    def on_ping(self, message: PingRequest) -> PingResponse:
+        if message.fail:
+            raise ValueError("Expected failure")
+        return PingResponse()
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        PingActor.start()
+        client = conclib.ProxyClient(config=config)
+        redis_client = conclib.ProxyClient(config=config, force_redis=True)
+        for _ in range(2):
+            client.ask_actor(PingActor.URN, PingRequest(), response_type=PingResponse)
+        redis_client.ask_actor(PingActor.URN, PingRequest(), response_type=PingResponse)
+        try:
+            pykka.ActorRegistry.get_by_urn(PingActor.URN).ask(PingRequest(fail=True))
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+
+        # Requests with made-up types share one series instead of adding one each
+        actor_ref = pykka.ActorRegistry.get_by_urn(PingActor.URN)
+        responses = []
+        for i in range(100):
+            envelope = conclib.RequestEnvelope(
+                message_id=str(i),
+                message_type=f"metrics_test.made_up_{i}",
+                actor_urn=PingActor.URN,
+                contents={},
+            )
+            envelope._reply_hook = responses.append
+            actor_ref.ask(envelope)
+        assert len(responses) == 100
+        series = [
+            values
+            for values in metrics.actor_messages._children
+            if values[0] == PingActor.URN
+        ]
+        assert sorted(series) == [
+            (PingActor.URN, PingRequest.type_id()),
+            (PingActor.URN, metrics.UNKNOWN_MESSAGE_TYPE),
+        ], series
+        assert (
+            metrics.actor_errors.labels(
+                PingActor.URN, metrics.UNKNOWN_MESSAGE_TYPE
+            ).value
+            == 100
+        )
+
+        labels = (PingActor.URN, PingRequest.type_id())
+        assert metrics.actor_messages.labels(*labels).value == 4
+        assert metrics.actor_errors.labels(*labels).value == 1
+        assert metrics.actor_handler_seconds.labels(*labels).counts[-1] == 0
+        assert sum(metrics.actor_handler_seconds.labels(*labels).counts) == 4
+
+        text = metrics.registry.render()
+        print(text)
+        assert "# TYPE conclib_actor_handler_seconds histogram" in text
+        assert (
+            f'conclib_actor_messages_total{{urn="{PingActor.URN}",'
+            f'message_type="{PingRequest.type_id()}"}} 4' in text
+        )
+        assert f'conclib_actor_inbox_depth{{urn="{PingActor.URN}"}} 0' in text
+        assert (
+            f'conclib_proxy_round_trip_seconds_count{{urn="{PingActor.URN}",'
+            f'path="local"}} 2' in text
+        )
+        assert (
+            f'conclib_proxy_round_trip_seconds_count{{urn="{PingActor.URN}",'
+            f'path="redis"}} 1' in text
+        )
+        client.close()
+        redis_client.close()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
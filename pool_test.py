@@ -0,0 +1,109 @@
+import collections
+import time
+
+import pykka
+
+import conclib
+
+
+class WorkRequest(conclib.ActorMessage):
+    key: str
+
+
+class WorkResponse(conclib.ActorMessage):
+    key: str
+    worker_urn: str
+
+
+class WorkerActor(conclib.Actor):
+    URN = "pool_test_worker"
+
+    @conclib.handles(WorkRequest)
+    def on_work(self, message: WorkRequest) -> WorkResponse:
+        time.sleep(0.01)
+        return WorkResponse(key=message.key, worker_urn=self.actor_urn)
+
+
+def ask_all(
+    client: conclib.ProxyClient, urn: str, keys: list[str]
+) -> list[WorkResponse]:
+    results = client.ask_many(
+        [(urn, WorkRequest(key=key), WorkResponse) for key in keys], timeout=10
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        conclib.Pool(WorkerActor, size=4).start()
+        conclib.Pool(
+            WorkerActor, size=4, urn="pool_test_least_busy", routing="least_busy"
+        ).start()
+        conclib.Pool(
+            WorkerActor,
+            size=4,
+            urn="pool_test_hashed",
+            routing="consistent_hash",
+            key=lambda message: message.key,
+        ).start()
+        client = conclib.ProxyClient(config=config, force_redis=True)
+
+        # Through the proxy, requests are spread over all the workers
+        for urn in [WorkerActor.URN, "pool_test_least_busy"]:
+            results = ask_all(client, urn, [str(i) for i in range(40)])
+            counts = collections.Counter(result.worker_urn for result in results)
+            print(f"[test] {urn}: {dict(counts)}")
+            assert len(counts) == 4, counts
+
+        # The same key always goes to the same worker
+        keys = [f"key-{i % 8}" for i in range(40)]
+        results = ask_all(client, "pool_test_hashed", keys)
+        workers_by_key = collections.defaultdict(set)
+        for result in results:
+            workers_by_key[result.key].add(result.worker_urn)
+        print(f"[test] pool_test_hashed: {dict(workers_by_key)}")
+        assert all(len(workers) == 1 for workers in workers_by_key.values())
+
+        # Actor-to-actor ask through the registry
+        pool_ref = pykka.ActorRegistry.get_by_urn(WorkerActor.URN)
+        response = pool_ref.ask(WorkRequest(key="direct"))
+        assert response.worker_urn.startswith(f"{WorkerActor.URN}/"), response
+
+        # A request whose message class isn't known here is answered with an error, the
+        # key function never sees the envelope
+        responses = []
+        envelope = conclib.RequestEnvelope(
+            message_id="unknown",
+            message_type="pool_test.UnknownRequest",
+            actor_urn="pool_test_hashed",
+            contents={},
+        )
+        envelope._reply_hook = responses.append
+        pykka.ActorRegistry.get_by_urn("pool_test_hashed").tell(envelope)
+        [response] = responses
+        assert response.status == "error", response
+        assert "pool_test.UnknownRequest" in response.error, response
+
+        try:
+            pool_ref.proxy()
+            raise AssertionError("Expected TypeError")
+        except TypeError:
+            pass
+
+        client.close()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    assert not pykka.ActorRegistry.get_all()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
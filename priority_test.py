@@ -0,0 +1,154 @@
+import concurrent.futures
+import threading
+import time
+
+import pykka
+
+import conclib
+from conclib import Priority
+
+
+class GateRequest(conclib.ActorMessage):
+    pass
+
+
+class HighRequest(conclib.ActorMessage):
+    PRIORITY = Priority.HIGH
+    name: str = "high"
+
+
+class NormalRequest(conclib.ActorMessage):
+    name: str = "normal"
+
+
+class LowRequest(conclib.ActorMessage):
+    PRIORITY = Priority.LOW
+    name: str = "low"
+
+
+class Handled(conclib.ActorMessage):
+    name: str
+
+
+class HandledQuery(conclib.ActorMessage):
+    # Queued behind everything else
+    PRIORITY = Priority.LOW
+
+
+class LanesActor(conclib.Actor):
+    URN = "priority_test"
+    PRIORITY_LANES = True
+
+    def __init__(self, release: threading.Event, handling: threading.Event):
+        super().__init__()
+        self.release = release
+        self.handling = handling
+        self.handled = []
+
+    @conclib.handles(GateRequest)
+    def on_gate(self, message: GateRequest):
+        self.handling.set()
+        self.release.wait()
+
+    @conclib.handles(HighRequest, NormalRequest, LowRequest)
+    def on_request(self, message) -> Handled:
+        self.handled.append(message.name)
+        return Handled(name=message.name)
+
+    @conclib.handles(HandledQuery)
+    def on_handled(self, message: HandledQuery) -> list[str]:
+        return self.handled
+
+
+class AgingActor(LanesActor):
+    URN = "priority_test_aging"
+    PRIORITY_AGING = 0.05
+
+
+class SheddingActor(LanesActor):
+    URN = "priority_test_shedding"
+    INBOX_CAPACITY = 2
+    INBOX_OVERFLOW = "drop_oldest"
+
+
+def wait_for_depth(actor_ref: pykka.ActorRef, depth: int):
+    deadline = time.monotonic() + 5
+    while actor_ref.actor_inbox.qsize() != depth:
+        assert time.monotonic() < deadline, f"Inbox depth didn't reach {depth}"
+        time.sleep(0.01)
+
+
+def handled(actor_ref: pykka.ActorRef) -> list[str]:
+    return actor_ref.ask(HandledQuery(), timeout=5)
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    release = threading.Event()
+    handling = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        conclib.start_proxy(config=config)
+        client = conclib.ProxyClient(config=config, force_redis=True)
+
+        # Queued messages are handled by priority, FIFO within a priority. A request from
+        # a client carries its priority in the envelope.
+        actor_ref = LanesActor.start(release, handling)
+        actor_ref.tell(GateRequest())
+        assert handling.wait(timeout=5)
+        urgent = executor.submit(
+            client.ask_actor,
+            LanesActor.URN,
+            LowRequest(name="urgent"),
+            Handled,
+            priority=Priority.HIGH,
+        )
+        wait_for_depth(actor_ref, 1)
+        for message in [LowRequest(), NormalRequest(), HighRequest()]:
+            actor_ref.tell(message)
+        release.set()
+        assert urgent.result(timeout=5).name == "urgent"
+        order = handled(actor_ref)
+        assert order == ["urgent", "high", "normal", "low"], order
+
+        # A message that waited long enough overtakes newer higher priority messages
+        release.clear()
+        handling.clear()
+        aging_ref = AgingActor.start(release, handling)
+        aging_ref.tell(GateRequest())
+        assert handling.wait(timeout=5)
+        aging_ref.tell(LowRequest())
+        time.sleep(AgingActor.PRIORITY_AGING * 4)
+        for _ in range(3):
+            aging_ref.tell(HighRequest())
+        release.set()
+        order = handled(aging_ref)
+        assert order == ["low", "high", "high", "high"], order
+
+        # A full inbox sheds the lowest priority first
+        release.clear()
+        handling.clear()
+        shedding_ref = SheddingActor.start(release, handling)
+        shedding_ref.tell(GateRequest())
+        assert handling.wait(timeout=5)
+        for message in [HighRequest(), LowRequest(), NormalRequest()]:
+            shedding_ref.tell(message)
+        release.set()
+        # A full inbox would shed the query
+        wait_for_depth(shedding_ref, 0)
+        order = handled(shedding_ref)
+        assert order == ["high", "normal"], order
+
+        client.close()
+    finally:
+        release.set()
+        executor.shutdown()
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+
+import pykka
+
+import conclib
+
+
+class PidRequest(conclib.ActorMessage):
+    pass
+
+
+class PidResponse(conclib.ActorMessage):
+    pid: int
+    handled: int
+
+
+class FailRequest(conclib.ActorMessage):
+    pass
+
+
+class PidActor(conclib.ProcessActor):
+    URN = "process_actor_test"
+
+    def __init__(self, start_count: int):
+        super().__init__()
+        self.handled = start_count
+
+    @conclib.handles(PidRequest)
+    def on_pid(self, message: PidRequest) -> PidResponse:
+        # State lives in the child process and persists between messages
+        self.handled += 1
+        return PidResponse(pid=os.getpid(), handled=self.handled)
+
+    @conclib.handles(FailRequest)
+    def on_fail(self, message: FailRequest):
+        raise ValueError("Expected failure")
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        actor_ref = PidActor.start(100)
+        conclib.Pool(PidActor, size=2, urn="process_actor_test_pool").start(0)
+        client = conclib.ProxyClient(config=config, force_redis=True)
+
+        # Through the proxy, the handler runs in a child process and respond() reaches us
+        first = client.ask_actor(PidActor.URN, PidRequest(), response_type=PidResponse)
+        second = client.ask_actor(PidActor.URN, PidRequest(), response_type=PidResponse)
+        print(f"[test] {first} {second}")
+        assert first.pid != os.getpid()
+        assert (first.handled, second.handled) == (101, 102)
+
+        # Direct ask returns the handler's return value, and raises its exceptions
+        assert actor_ref.ask(PidRequest()).handled == 103
+        try:
+            actor_ref.ask(FailRequest())
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+
+        # Pools of ProcessActors get a process per worker
+        results = client.ask_many(
+            [("process_actor_test_pool", PidRequest(), PidResponse)] * 4, timeout=10
+        )
+        pids = {result.pid for result in results}
+        print(f"[test] pool pids: {pids}")
+        assert len(pids) == 2
+
+        client.close()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import dataclasses
+import os
+import tempfile
+
+import pykka
+import redis
+
+import conclib
+from conclib.utils.redisd import redisclient
+from conclib.utils.redisd.redisclient import RedisClient
+
+
+class PingRequest(conclib.ActorMessage):
+    pass
+
+
+class PongResponse(conclib.ActorMessage):
+    pid: int
+
+
+class PingActor(conclib.Actor):
+    URN = "redis_pool_test"
+
+    @conclib.handles(PingRequest)
+    def on_ping(self, message: PingRequest) -> PongResponse:
+        return PongResponse(pid=os.getpid())
+
+
+def check_fork(config: conclib.ConclibConfig):
+    """A forked child gets pools of its own instead of the parent's connections"""
+    parent_pool = redisclient.connection_pool(config)
+    RedisClient(config).redis_client.ping()
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            ok = not redisclient._pools and (
+                redisclient.connection_pool(config) is not parent_pool
+            )
+            RedisClient(config).redis_client.ping()
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent's connections still work
+    RedisClient(config).redis_client.ping()
+
+
+async def check_async_client(config: conclib.ConclibConfig):
+    async with conclib.AsyncProxyClient(config=config, force_redis=True) as client:
+        response = await client.ask_actor(PingActor.URN, PingRequest(), PongResponse)
+        assert response.pid == os.getpid()
+
+
+def main():
+    socket_path = os.path.join(tempfile.mkdtemp(), "redis.sock")
+    config = conclib.DefaultConfig(redis_unix_socket=socket_path)
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        # Every client shares the process-wide pool
+        first, second = RedisClient(config), RedisClient(config)
+        pool = first.redis_client.connection_pool
+        assert pool is second.redis_client.connection_pool
+        assert pool.connection_class is redis.UnixDomainSocketConnection
+        first.redis_client.ping()
+
+        # The proxy and the clients talk to redis through the socket
+        conclib.start_proxy(config=config)
+        PingActor.start()
+        client = conclib.ProxyClient(config=config, force_redis=True)
+        response = client.ask_actor(PingActor.URN, PingRequest(), PongResponse)
+        assert response.pid == os.getpid()
+        client.close()
+        asyncio.run(check_async_client(config))
+
+        # redis still listens on its port
+        tcp_config = dataclasses.replace(config, redis_unix_socket=None)
+        tcp_pool = RedisClient(tcp_config).redis_client.connection_pool
+        assert tcp_pool is not pool
+        assert tcp_pool.connection_class is redis.Connection
+        RedisClient(tcp_config).redis_client.ping()
+
+        # A limited pool makes callers wait for a free connection, then raises
+        limited_config = dataclasses.replace(
+            config, redis_max_connections=2, redis_pool_timeout=0.1
+        )
+        limited_pool = redisclient.connection_pool(limited_config)
+        held = [limited_pool.get_connection("PING") for _ in range(2)]
+        try:
+            RedisClient(limited_config).redis_client.ping()
+            raise AssertionError("Expected ConnectionError")
+        except redis.ConnectionError:
+            pass
+        for connection in held:
+            limited_pool.release(connection)
+        RedisClient(limited_config).redis_client.ping()
+
+        check_fork(config)
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import pykka
+
+import conclib
+from conclib.errors import DuplicateMessageTypeError, UnexpectedMessageError
+from conclib.proxy.client import create_request_envelope
+from conclib.proxy.envelope import STATUS_ERROR
+from conclib.proxy.messages import MessageRegistry, message_registry
+
+
+class PingRequest(conclib.ActorMessage):
+    pass
+
+
+class NamedRequest(conclib.ActorMessage):
+    TYPE_ID = "registry_test.named"
+
+
+class Reply(conclib.ActorMessage):
+    handler: str
+
+
+class BaseEvent(conclib.ActorMessage):
+    pass
+
+
+class SubEvent(BaseEvent):
+    pass
+
+
+class First:
+    class Twin(conclib.ActorMessage):
+        pass
+
+
+class Second:
+    class Twin(conclib.ActorMessage):
+        pass
+
+
+class HandlingActor(conclib.Actor):
+    URN = "registry_test"
+
+    @conclib.handles(PingRequest, NamedRequest)
+    def on_ping(self, message: conclib.ActorMessage) -> Reply:
+        return Reply(handler="ping")
+
+    @conclib.handles(BaseEvent)
+    def on_event(self, message: BaseEvent) -> str:
+        return f"event {type(message).__name__}"
+
+
+class OverridingActor(HandlingActor):
+    URN = "registry_test_overriding"
+
+    @conclib.handles(PingRequest)
+    def on_ping_again(self, message: PingRequest) -> Reply:
+        return Reply(handler="overridden")
+
+
+def define_reloaded() -> type:
+    """The same class, defined again as a module reload would"""
+
+    class Reloaded(conclib.ActorMessage):
+        pass
+
+    return Reloaded
+
+
+def request(message_type: str, responses: list) -> conclib.RequestEnvelope:
+    envelope = conclib.RequestEnvelope(
+        message_id=message_type,
+        message_type=message_type,
+        actor_urn=HandlingActor.URN,
+        contents={},
+    )
+    envelope._reply_hook = responses.append
+    return envelope
+
+
+def check_registry():
+    assert PingRequest.type_id() == "__main__.PingRequest", PingRequest.type_id()
+    assert NamedRequest.type_id() == "registry_test.named"
+    assert message_registry.get("__main__.PingRequest") is PingRequest
+    assert message_registry.get("registry_test.named") is NamedRequest
+    assert message_registry.get("registry_test.missing") is None
+
+    # Older clients sent the bare class name, which resolves while it is unambiguous
+    assert message_registry.get("PingRequest") is PingRequest
+    assert First.Twin.type_id() != Second.Twin.type_id()
+    assert message_registry.get("Twin") is None
+
+    # So does the last component of a type id the other side imported from elsewhere
+    assert message_registry.get("pkg.mod.PingRequest") is PingRequest
+    assert message_registry.get("pkg.mod.Twin") is None
+    assert message_registry.get("pkg.mod.Missing") is None
+
+    # Clients can keep sending bare names while older actors are upgraded
+    envelope = create_request_envelope("urn", PingRequest(), None)
+    assert envelope.message_type == "__main__.PingRequest", envelope.message_type
+    envelope = create_request_envelope(
+        "urn", PingRequest(), None, bare_message_type=True
+    )
+    assert envelope.message_type == "PingRequest", envelope.message_type
+
+    # A spawned child process imports the main script as __mp_main__
+    spawned = type("Spawned", (), {"__module__": "__mp_main__"})
+    assert MessageRegistry.default_type_id(spawned) == "__main__.Spawned"
+
+    # Two different classes can't share a type id
+    try:
+
+        class Clash(conclib.ActorMessage):
+            TYPE_ID = "registry_test.named"
+
+        raise AssertionError("Expected DuplicateMessageTypeError")
+    except DuplicateMessageTypeError as e:
+        assert "registry_test.named" in str(e), e
+    assert message_registry.get("registry_test.named") is NamedRequest
+
+    # Defining the same class again replaces it
+    old, new = define_reloaded(), define_reloaded()
+    assert old.type_id() == new.type_id()
+    assert message_registry.get(new.type_id()) is new
+    assert message_registry.get("Reloaded") is new
+
+
+def check_dispatch():
+    actor_ref = HandlingActor.start()
+    overriding_ref = OverridingActor.start()
+    try:
+        assert actor_ref.ask(PingRequest()) == Reply(handler="ping")
+        assert actor_ref.ask(NamedRequest()) == Reply(handler="ping")
+        assert overriding_ref.ask(PingRequest()) == Reply(handler="overridden")
+        assert overriding_ref.ask(NamedRequest()) == Reply(handler="ping")
+
+        # A subclass of a handled message goes to the base class' handler, which is
+        # looked up once and cached
+        assert SubEvent not in HandlingActor._message_handlers
+        assert actor_ref.ask(SubEvent()) == "event SubEvent"
+        assert HandlingActor._message_handlers[SubEvent] == "on_event"
+
+        try:
+            actor_ref.ask(Reply(handler="none"))
+            raise AssertionError("Expected UnexpectedMessageError")
+        except UnexpectedMessageError:
+            pass
+
+        # Requests from outside are dispatched by type id, or by bare class name
+        responses = []
+        actor_ref.ask(request(PingRequest.type_id(), responses))
+        actor_ref.ask(request("PingRequest", responses))
+        actor_ref.ask(request("pkg.mod.PingRequest", responses))
+        assert [r.extract(Reply).handler for r in responses] == ["ping"] * 3
+        # Bare names are cached, made-up type ids aren't
+        assert "PingRequest" in HandlingActor._request_handlers
+        assert "pkg.mod.PingRequest" not in HandlingActor._request_handlers
+
+        # An unknown request is answered with an error, and the actor keeps running
+        responses = []
+        actor_ref.ask(request("registry_test.missing", responses))
+        assert responses[0].status == STATUS_ERROR, responses
+        assert responses[0].error == (
+            "UnexpectedMessageError: Received unexpected message type: "
+            "registry_test.missing"
+        ), responses[0].error
+        assert actor_ref.ask(PingRequest()) == Reply(handler="ping")
+    finally:
+        pykka.ActorRegistry.stop_all()
+
+
+def main():
+    check_registry()
+    check_dispatch()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
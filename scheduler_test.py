@@ -0,0 +1,184 @@
+import threading
+import time
+
+import conclib
+from conclib.pykka_extensions.scheduler import Scheduler, Timer
+
+INTERVAL = 0.05
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def check_order():
+    """Callbacks run in time order, and timers due at the same time in the order added"""
+    scheduler = Scheduler(workers=1, name="order")
+    ran = []
+    now = time.monotonic()
+    for i, when in enumerate([0.3, 0.1, 0.2, 0.1, 0.2]):
+        scheduler.call_at(now + when, lambda i=i: ran.append(i))
+    # An earlier timer added while the scheduling thread waits for a later one
+    scheduler.call_later(0.01, lambda: ran.append("early"))
+    wait_for(lambda: len(ran) == 6)
+    assert ran == ["early", 1, 3, 2, 4, 0], ran
+    assert len(scheduler) == 0
+
+
+def check_cancel():
+    scheduler = Scheduler(workers=1, name="cancel")
+    ran = []
+    timers = [scheduler.call_later(0.1, lambda i=i: ran.append(i)) for i in range(4)]
+    timers[1].cancel()
+    timers[1].cancel()  # Cancelling twice counts once
+    assert timers[1].cancelled and len(scheduler) == 3, len(scheduler)
+    wait_for(lambda: len(ran) == 3)
+    assert ran == [0, 2, 3], ran
+    # Too late to cancel one that already fired
+    timers[2].cancel()
+    assert not timers[2].cancelled and timers[2]._state == Timer.FIRED
+    assert len(scheduler) == 0 and scheduler._cancelled == 0
+
+    # Once cancelled timers are most of the heap, they are dropped from it
+    timers = [scheduler.call_later(60, lambda: None) for _ in range(200)]
+    for timer in timers[:64]:
+        timer.cancel()
+    assert len(scheduler._heap) == 200 and len(scheduler) == 136
+    for timer in timers[64:101]:
+        timer.cancel()
+    assert len(scheduler._heap) == 99 and len(scheduler) == 99, len(scheduler._heap)
+    assert not any(entry[2].cancelled for entry in scheduler._heap)
+    for timer in timers[101:]:
+        timer.cancel()
+    assert len(scheduler) == 0, len(scheduler)
+
+
+def check_workers():
+    """A slow or failing callback doesn't hold up the others while a worker is free"""
+    scheduler = Scheduler(workers=2, name="workers")
+    release = threading.Event()
+    ran = []
+
+    def fail():
+        raise ValueError("boom")
+
+    scheduler.call_later(0, release.wait)
+    scheduler.call_later(0, fail)
+    scheduler.call_later(0.05, lambda: ran.append(time.monotonic()))
+    start = time.monotonic()
+    wait_for(lambda: ran, timeout=1)
+    assert ran[0] - start < 0.5, ran[0] - start
+    release.set()
+
+
+class CountingTicker(conclib.Ticker):
+    def __init__(self, work: float = 0.0, fail_at: int | None = None, **kwargs):
+        super().__init__(interval=INTERVAL, **kwargs)
+        self.work = work
+        self.fail_at = fail_at
+        self.executions = 0
+        self.running = 0
+        self.overlapped = False
+        self.started = threading.Event()
+
+    def execute(self):
+        self.running += 1
+        self.overlapped |= self.running > 1
+        self.executions += 1
+        self.started.set()
+        time.sleep(self.work)
+        self.running -= 1
+        if self.executions == self.fail_at:
+            raise ValueError("boom")
+
+
+def check_ticker():
+    try:
+        conclib.Ticker(missed_ticks="sometimes")
+        raise AssertionError("Expected ValueError")
+    except ValueError as e:
+        assert "sometimes" in str(e), e
+
+    counting = CountingTicker()
+    try:
+        counting.join()
+        raise AssertionError("Expected RuntimeError")
+    except RuntimeError:
+        pass
+    assert not counting.is_alive()
+    counting.start()
+    assert counting.is_alive()
+    try:
+        counting.start()
+        raise AssertionError("Expected RuntimeError")
+    except RuntimeError:
+        pass
+    time.sleep(INTERVAL * 4.5)
+    counting.stop()
+    counting.join(timeout=1)
+    assert not counting.is_alive()
+    executions = counting.executions
+    assert 3 <= executions <= 6, executions
+    time.sleep(INTERVAL * 2)
+    assert counting.executions == executions
+
+    # Stopped before it started: starting it doesn't run it
+    stopped = CountingTicker()
+    stopped.stop()
+    stopped.start()
+    stopped.join(timeout=1)
+    assert not stopped.is_alive() and stopped.executions == 0
+
+    # join() waits for a running execute(), and executions never overlap even when one
+    # takes longer than the interval
+    slow = CountingTicker(work=INTERVAL * 3)
+    slow.start()
+    time.sleep(INTERVAL * 5)
+    slow.started.clear()
+    assert slow.started.wait(1)
+    slow.stop()
+    assert slow.is_alive() and slow.running == 1
+    slow.join(timeout=1)
+    assert not slow.is_alive() and slow.running == 0
+    assert not slow.overlapped
+
+    # An exception in execute() stops the ticker
+    failing = CountingTicker(fail_at=2)
+    failing.start()
+    failing.join(timeout=1)
+    assert not failing.is_alive() and failing.executions == 2, failing.executions
+
+
+def check_shared_scheduler():
+    """Every ticker runs on the one process-wide scheduler unless given its own"""
+    tickers = [CountingTicker() for _ in range(50)]
+    own = Scheduler(workers=1, name="own")
+    tickers.append(CountingTicker(scheduler=own))
+    threads = threading.active_count()
+    for counting in tickers:
+        counting.start()
+    assert all(counting.scheduler is tickers[0].scheduler for counting in tickers[:50])
+    assert tickers[-1].scheduler is own
+    assert threading.active_count() <= threads + 5
+    time.sleep(INTERVAL * 3)
+    for counting in tickers:
+        counting.stop()
+    for counting in tickers:
+        counting.join(timeout=1)
+        assert counting.executions >= 2 and not counting.is_alive()
+
+
+def main():
+    check_order()
+    check_cancel()
+    check_workers()
+    check_ticker()
+    check_shared_scheduler()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import dataclasses
+import os
+import subprocess
+import sys
+import time
+
+import pykka
+import redis
+
+import conclib
+from conclib.proxy import transport
+from conclib.proxy.envelope import RequestEnvelope
+
+SHARDS = 3
+MESSAGES_PER_ACTOR = 20
+
+
+class SeqRequest(conclib.ActorMessage):
+    seq: int
+
+
+class ShardResponse(conclib.ActorMessage):
+    shard: int
+    seqs: list[int]
+
+
+class ShardActor(conclib.Actor):
+    """Records the shard each request arrived on, which @handles methods can't see"""
+
+    def __init__(self, urn: str):
+        super().__init__(urn)
+        self.shards = set()
+        self.seqs = []
+
+    def on_receive(self, message):
+        if not isinstance(message, RequestEnvelope):
+            return super().on_receive(message)
+        self.shards.add(message.shard)
+        self.seqs.append(message.extract(SeqRequest).seq)
+        [shard] = self.shards
+        message.respond(ShardResponse(shard=shard, seqs=list(self.seqs)))
+
+
+def check_helpers():
+    config = conclib.DefaultConfig()
+    assert transport.shard_for(config, "anything") == 0
+    assert transport.inbound_name(config, 0) == config.inbound_channel_name
+    assert transport.responding_actor_urn(0) == conclib.constants.RESPONDING_ACTOR
+
+    sharded = conclib.DefaultConfig(inbound_shards=SHARDS)
+    assert transport.inbound_name(sharded, 2) == f"{config.inbound_channel_name}/2"
+    assert (
+        transport.responding_actor_urn(2) == f"{conclib.constants.RESPONDING_ACTOR}/2"
+    )
+    urns = [f"shard_test/{i}" for i in range(50)]
+    shards = [transport.shard_for(sharded, urn) for urn in urns]
+    assert set(shards) == set(range(SHARDS)), shards
+
+    # The shard of a URN is the same in every process, whatever its hash seed
+    script = (
+        "import sys, conclib; from conclib.proxy import transport; "
+        f"config = conclib.DefaultConfig(inbound_shards={SHARDS}); "
+        "print([transport.shard_for(config, urn) for urn in sys.argv[1:]])"
+    )
+    for seed in ("1", "2"):
+        output = subprocess.run(
+            [sys.executable, "-c", script, *urns],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        assert output.strip() == str(shards), output
+
+    for bad in (0, -1):
+        try:
+            transport.check_shards(conclib.DefaultConfig(inbound_shards=bad))
+            raise AssertionError("Expected ValueError")
+        except ValueError as e:
+            assert "inbound_shards" in str(e), e
+
+
+def check_proxy(config: conclib.ConclibConfig, redis_conn: redis.Redis):
+    """Requests for an actor arrive in order on its shard, and are answered from it"""
+    actor_refs = conclib.start_proxy(config, shards=SHARDS)
+    assert [actor_ref.actor_urn for actor_ref in actor_refs] == [
+        transport.responding_actor_urn(shard) for shard in range(SHARDS)
+    ]
+    # Clients must use the same number of shards as the proxy
+    config = dataclasses.replace(config, inbound_shards=SHARDS)
+    if config.transport == transport.PUBSUB:
+        names = [transport.inbound_name(config, shard) for shard in range(SHARDS)]
+        assert [count for _, count in redis_conn.pubsub_numsub(*names)] == [1] * SHARDS
+
+    urns = [f"shard_test/{i}" for i in range(2 * SHARDS)]
+    assert {transport.shard_for(config, urn) for urn in urns} == set(range(SHARDS))
+    for urn in urns:
+        ShardActor.start(urn)
+    client = conclib.ProxyClient(config=config, force_redis=True)
+    try:
+        for seq in range(MESSAGES_PER_ACTOR - 1):
+            client.tell_many([(urn, SeqRequest(seq=seq)) for urn in urns])
+        results = client.ask_many(
+            [
+                (urn, SeqRequest(seq=MESSAGES_PER_ACTOR - 1), ShardResponse)
+                for urn in urns
+            ],
+            timeout=10,
+        )
+    finally:
+        client.close()
+    for urn, result in zip(urns, results):
+        assert isinstance(result, ShardResponse), (urn, result)
+        assert result.shard == transport.shard_for(config, urn), (urn, result)
+        assert result.seqs == list(range(MESSAGES_PER_ACTOR)), (urn, result.seqs)
+
+    if config.transport == transport.STREAMS:
+        # Each response was acked on the stream its request came from, just after it
+        # was published
+        deadline = time.monotonic() + 5
+        for shard in range(SHARDS):
+            name = transport.inbound_name(config, shard)
+            while True:
+                pending = redis_conn.xpending(name, config.stream_consumer_group)
+                if pending["pending"] == 0:
+                    break
+                assert time.monotonic() < deadline, (name, pending)
+                time.sleep(0.05)
+
+
+def main():
+    check_helpers()
+
+    config = conclib.DefaultConfig()
+    redis_conn = redis.Redis(host=config.redis_host, port=config.redis_port)
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        for transport_name in transport.TRANSPORTS:
+            check_proxy(
+                dataclasses.replace(config, transport=transport_name), redis_conn
+            )
+            pykka.ActorRegistry.stop_all()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import time
+
+import pykka
+
+import conclib
+from conclib.utils.apid.apid import RestApiDidntStartError
+
+
+class PingRequest(conclib.ActorMessage):
+    pass
+
+
+class PongResponse(conclib.ActorMessage):
+    pass
+
+
+class PingActor(conclib.Actor):
+    URN = "startup_test"
+
+    @conclib.handles(PingRequest)
+    def on_ping(self, message: PingRequest) -> PongResponse:
+        return PongResponse()
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    start = time.monotonic()
+    redis_daemon = conclib.start_redis(config=config)
+    print(f"[test] redis ready after {time.monotonic() - start:.3f}s")
+    assert redis_daemon.ready.is_set()
+    try:
+        # A request sent as soon as start_proxy returns is received, even with pubsub
+        actor_refs = conclib.start_proxy(config=config)
+        assert all(ref.proxy().ready.get().is_set() for ref in actor_refs)
+        PingActor.start()
+        client = conclib.ProxyClient(config=config, force_redis=True)
+        client.ask_actor(PingActor.URN, PingRequest(), PongResponse, timeout=5)
+        client.close()
+
+        # So is a second redis-server that can't listen on the port
+        try:
+            conclib.start_redis(config=config)
+            raise AssertionError("Expected RedisDidntStartError")
+        except conclib.errors.RedisDidntStartError as e:
+            assert "exited" in str(e), e
+
+        # An API server that exits is reported straight away, not after the timeout
+        start = time.monotonic()
+        try:
+            conclib.start_api(
+                fast_api_command="exit 3",
+                healthcheck_url="http://localhost:8001/healthz",
+                startup_healthcheck_timeout=10,
+            )
+            raise AssertionError("Expected RestApiDidntStartError")
+        except RestApiDidntStartError as e:
+            assert "code 3" in str(e), e
+        assert time.monotonic() - start < 2
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pykka
+
+import conclib
+from conclib.errors import RemoteActorError
+
+
+class RangeRequest(conclib.ActorMessage):
+    count: int
+    fail_at: int = -1
+
+
+class RangeItem(conclib.ActorMessage):
+    value: int
+
+
+class SingleRequest(conclib.ActorMessage):
+    pass
+
+
+class StreamingActor(conclib.Actor):
+    URN = "streaming_test"
+
+    def __init__(self, produced: list[int]):
+        super().__init__()
+        # Shared with the test, which reads it while the handler is paused
+        self.produced = produced
+
+    @conclib.handles(RangeRequest)
+    def on_range(self, message: RangeRequest):
+        for i in range(message.count):
+            if i == message.fail_at:
+                raise ValueError(f"failed at {i}")
+            self.produced.append(i)
+            yield RangeItem(value=i)
+
+    @conclib.handles(SingleRequest)
+    def on_single(self, message: SingleRequest) -> RangeItem:
+        return RangeItem(value=-1)
+
+
+def values(stream) -> list[int]:
+    return [item.value for item in stream]
+
+
+def check_client(client: conclib.ProxyClient, produced: list[int]):
+    urn = StreamingActor.URN
+    stream = client.ask_stream(urn, RangeRequest(count=100), RangeItem, window=8)
+    assert values(stream) == list(range(100))
+
+    # The handler only runs ahead of the consumer by the window
+    produced.clear()
+    stream = client.ask_stream(urn, RangeRequest(count=100), RangeItem, window=4)
+    assert next(stream).value == 0
+    time.sleep(0.3)
+    assert len(produced) <= 5, produced
+    # Stopping early cancels the stream and frees the actor
+    stream.close()
+    assert values(client.ask_stream(urn, RangeRequest(count=3), RangeItem)) == [0, 1, 2]
+    assert len(produced) < 100
+
+    # A single response is a stream of one item
+    assert values(client.ask_stream(urn, SingleRequest(), RangeItem)) == [-1]
+
+    # An exception in the handler ends the stream
+    received = []
+    try:
+        for item in client.ask_stream(
+            urn, RangeRequest(count=10, fail_at=5), RangeItem
+        ):
+            received.append(item.value)
+        raise AssertionError("Expected RemoteActorError")
+    except RemoteActorError as e:
+        assert "failed at 5" in str(e), e
+    assert received == [0, 1, 2, 3, 4], received
+
+    # A streaming handler can't answer ask_actor
+    try:
+        client.ask_actor(urn, RangeRequest(count=3), RangeItem)
+        raise AssertionError("Expected RemoteActorError")
+    except RemoteActorError as e:
+        assert "ask_stream" in str(e), e
+
+
+async def check_async_client(config: conclib.ConclibConfig, force_redis: bool):
+    async with conclib.AsyncProxyClient(
+        config=config, force_redis=force_redis
+    ) as client:
+        stream = client.ask_stream(
+            StreamingActor.URN, RangeRequest(count=50), RangeItem, window=4
+        )
+        assert [item.value async for item in stream] == list(range(50))
+
+        stream = client.ask_stream(
+            StreamingActor.URN, RangeRequest(count=50), RangeItem, window=4
+        )
+        async for item in stream:
+            break
+        await stream.aclose()
+        response = await client.ask_actor(
+            StreamingActor.URN, SingleRequest(), RangeItem
+        )
+        assert response.value == -1
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        conclib.start_proxy(config=config)
+        produced = []
+        StreamingActor.start(produced)
+
+        # In-process and through redis
+        for force_redis in (False, True):
+            client = conclib.ProxyClient(config=config, force_redis=force_redis)
+            check_client(client, produced)
+            client.close()
+            asyncio.run(check_async_client(config, force_redis))
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import threading
+import time
+import uuid
+
+import pykka
+
+import conclib
+from conclib.proxy import codecs, transport
+from conclib.proxy.client import create_request_envelope
+
+
+class ExampleReqMessage(conclib.ActorMessage):
+    value: int
+
+
+class ExampleRespMessage(conclib.ActorMessage):
+    value: int
+
+
+class SilentReqMessage(conclib.ActorMessage):
+    pass
+
+
+class ExampleActor(conclib.Actor):
+    URN = "example_streams_actor"
+
+    def __init__(self):
+        super().__init__()
+        self.silent_deliveries = 0
+
+    def on_receive(self, message):
+        if isinstance(message, conclib.RequestEnvelope):
+            if message.matches(ExampleReqMessage):
+                request = message.extract(ExampleReqMessage)
+                message.respond(ExampleRespMessage(value=request.value * 2))
+                return
+            if message.matches(SilentReqMessage):
+                # Never responds, so the request is never acked
+                self.silent_deliveries += 1
+                return
+        raise conclib.errors.UnexpectedMessageError(message)
+
+
+def wait_until_acked(redis_conn, config: conclib.ConclibConfig, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = redis_conn.xpending(
+            config.inbound_channel_name, config.stream_consumer_group
+        )
+        if pending["pending"] == 0 or time.monotonic() >= deadline:
+            return pending
+        time.sleep(0.05)
+
+
+def main():
+    # Unique stream per run so leftovers from a previous run (redis persists to disk)
+    # can't interfere
+    config = conclib.DefaultConfig(
+        transport="streams",
+        inbound_channel_name=f"out2actor-streams-test-{uuid.uuid4().hex[:8]}",
+        stream_claim_idle_ms=300,
+        stream_max_deliveries=3,
+    )
+
+    redis_daemon = conclib.start_redis(config=config)
+    try:
+        client = conclib.ProxyClient(config=config)
+        redis_conn = client.redis_client.redis_client
+        results = {}
+
+        def ask(value: int):
+            results[value] = client.ask_actor(
+                ExampleActor.URN,
+                ExampleReqMessage(value=value),
+                response_type=ExampleRespMessage,
+            )
+
+        # Create the group up front, the same way the proxy would
+        redis_conn.xgroup_create(
+            config.inbound_channel_name,
+            config.stream_consumer_group,
+            id="0",
+            mkstream=True,
+        )
+
+        # (1) A request read by a proxy that then crashes without acking it
+        crashed_ask = threading.Thread(target=ask, args=(1,))
+        crashed_ask.start()
+        time.sleep(0.5)
+        stolen = redis_conn.xreadgroup(
+            config.stream_consumer_group,
+            "crashed-proxy",
+            {config.inbound_channel_name: ">"},
+        )
+        print(f"[test] Crashed proxy read {stolen}")
+        assert len(stolen[0][1]) == 1
+
+        # (2) A request sent while no proxy is running waits in the stream
+        early_ask = threading.Thread(target=ask, args=(2,))
+        early_ask.start()
+        time.sleep(0.5)
+
+        ExampleActor.start()
+        conclib.start_proxy(config=config)
+
+        # (3) A request sent while the proxy is running
+        ask(3)
+
+        crashed_ask.join(timeout=10)
+        early_ask.join(timeout=10)
+        print(f"[test] {results}")
+        assert results[1].value == 2, "request from the crashed proxy was not reclaimed"
+        assert results[2].value == 4, "request sent before the proxy started was lost"
+        assert results[3].value == 6
+
+        # Requests are acked right after their response is published
+        pending = wait_until_acked(redis_conn, config, timeout=2)
+        print(f"[test] Pending after responses: {pending}")
+        assert pending["pending"] == 0
+
+        # (4) An entry the proxy can't decode is acked and dropped, instead of stopping
+        # the proxy (and, once reclaimed, every other proxy)
+        redis_conn.xadd(
+            config.inbound_channel_name,
+            {transport.STREAM_ENVELOPE_FIELD: b"\x00zgarbage"},
+        )
+        assert wait_until_acked(redis_conn, config, timeout=2)["pending"] == 0
+        assert client.ask_actor(
+            ExampleActor.URN, ExampleReqMessage(value=4), ExampleRespMessage, timeout=5
+        ) == ExampleRespMessage(value=8)
+
+        # (5) A request that is never responded to is redelivered at most
+        # stream_max_deliveries times
+        silent = create_request_envelope(
+            ExampleActor.URN, SilentReqMessage(), reply_to=client.reply_channel
+        )
+        transport.send_request(
+            redis_conn, config, ExampleActor.URN, codecs.encode(silent, config.codec)
+        )
+        actor = pykka.ActorRegistry.get_by_urn(ExampleActor.URN).proxy()
+        deadline = time.monotonic() + 2
+        while actor.silent_deliveries.get() == 0:
+            assert time.monotonic() < deadline, "the request was never delivered"
+            time.sleep(0.05)
+        pending = wait_until_acked(redis_conn, config, timeout=5)
+        assert pending["pending"] == 0, pending
+        time.sleep(0.5)
+        assert actor.silent_deliveries.get() == 3, actor.silent_deliveries.get()
+        print("[test] 🎉 streams transport works")
+
+        redis_conn.delete(config.inbound_channel_name)
+        client.close()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import time
+
+import pykka
+
+import conclib
+from conclib import metrics
+from conclib.pykka_extensions import ticker
+
+INTERVAL = 0.05
+
+
+class RecordingTicker(conclib.Ticker):
+    """Records when each tick ran. The third tick overruns into the three after it."""
+
+    def __init__(self, missed_ticks: str, work: float = 0.0):
+        super().__init__(interval=INTERVAL, missed_ticks=missed_ticks)
+        self.work = work
+        self.times = []
+
+    def execute(self):
+        self.times.append(time.monotonic())
+        time.sleep(self.work)
+        if len(self.times) == 3:
+            time.sleep(INTERVAL * 3.5)
+
+
+def run(missed_ticks: str, work: float = 0.0) -> list[float]:
+    """When each tick ran, in intervals since the first one"""
+    recording = RecordingTicker(missed_ticks, work)
+    recording.start()
+    time.sleep(INTERVAL * 12.2)
+    recording.stop()
+    recording.join()
+    return [(t - recording.times[0]) / INTERVAL for t in recording.times]
+
+
+class SlowTickMessage(conclib.ActorMessage):
+    pass
+
+
+class SlowActor(conclib.PeriodicActor):
+    URN = "tick_policy_test"
+    TICKS = {SlowTickMessage: INTERVAL}
+    SKIP_PENDING_TICKS = True
+
+    def __init__(self):
+        super().__init__()
+        self.handled = 0
+
+    @conclib.handles(SlowTickMessage)
+    def on_tick(self, message: SlowTickMessage):
+        self.handled += 1
+        time.sleep(INTERVAL * 4)
+
+
+class BackloggedActor(SlowActor):
+    URN = "tick_policy_test_backlogged"
+    SKIP_PENDING_TICKS = False
+
+
+def main():
+    try:
+        # Fixed rate: execute() taking most of the interval doesn't delay the next ticks
+        ticks = run(ticker.COALESCE, work=INTERVAL * 0.6)
+        late = [t for i, t in enumerate(ticks) if i != 3 and abs(t - round(t)) > 0.3]
+        assert not late, ticks
+
+        # The third tick (at 2) runs until 5.5, while the ticks at 3, 4 and 5 are due
+        ticks = run(ticker.SKIP)
+        assert not [t for t in ticks if 2.5 < t < 5.9], ticks
+        assert any(5.9 < t < 6.3 for t in ticks), ticks
+        ticks = run(ticker.COALESCE)
+        assert len([t for t in ticks if 2.5 < t < 5.9]) == 1, ticks
+        ticks = run(ticker.CATCH_UP)
+        assert len([t for t in ticks if 2.5 < t < 5.9]) == 3, ticks
+
+        try:
+            conclib.Ticker(interval=1, missed_ticks="never")
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+
+        # A slow actor gets one tick at a time instead of a growing backlog
+        skipped = metrics.ticker_missed.labels(
+            f"SlowActor-{INTERVAL}-SlowTickMessage", "pending"
+        )
+        slow_ref = SlowActor.start()
+        backlogged_ref = BackloggedActor.start()
+        time.sleep(1)
+        assert slow_ref.actor_inbox.qsize() <= 1, slow_ref.actor_inbox.qsize()
+        assert backlogged_ref.actor_inbox.qsize() > 5
+        assert skipped.value > 5, skipped.value
+        handled = slow_ref.proxy().handled.get()
+        assert handled >= 3, handled
+    finally:
+        pykka.ActorRegistry.stop_all()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()
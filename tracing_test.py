@@ -0,0 +1,91 @@
+import asyncio
+
+import pykka
+
+import conclib
+from conclib.proxy import tracing
+
+
+class EchoRequest(conclib.ActorMessage):
+    value: int
+
+
+class EchoResponse(conclib.ActorMessage):
+    value: int
+
+
+class EchoActor(conclib.Actor):
+    URN = "tracing_test"
+
+    @conclib.handles(EchoRequest)
+    def on_echo(self, message: EchoRequest) -> EchoResponse:
+        return EchoResponse(value=message.value)
+
+
+def check_trace(trace: tracing.Trace, stages: tuple[str, ...]):
+    print(f"[test] {trace.trace_id}: {trace.hops()}")
+    assert tuple(trace.timings) == stages, trace.timings
+    assert all(seconds >= 0 for _, seconds in trace.hops())
+    assert len(trace.hops()) == len(stages) - 1
+
+
+def main():
+    config = conclib.DefaultConfig()
+
+    redis_daemon = conclib.start_redis(config=config)
+    traces: list[tracing.Trace] = []
+    try:
+        conclib.start_proxy(config=config)
+        EchoActor.start()
+
+        # Through redis, every stage is recorded
+        client = conclib.ProxyClient(
+            config=config, force_redis=True, on_trace=traces.append
+        )
+        response = client.ask_actor(
+            EchoActor.URN, EchoRequest(value=1), EchoResponse, trace_id="abc"
+        )
+        assert response.value == 1
+        assert len(traces) == 1 and traces[0].trace_id == "abc"
+        assert traces[0].actor_urn == EchoActor.URN
+        check_trace(traces[0], tracing.STAGES)
+        client.ask_many([(EchoActor.URN, EchoRequest(value=2), EchoResponse)] * 2)
+        assert len(traces) == 3 and traces[1].trace_id != traces[2].trace_id
+        client.close()
+
+        # Locally, the proxy stages are skipped
+        local_stages = (
+            tracing.STAGE_CLIENT_SENT,
+            tracing.STAGE_HANDLER_STARTED,
+            tracing.STAGE_HANDLER_FINISHED,
+            tracing.STAGE_CLIENT_RECEIVED,
+        )
+        client = conclib.ProxyClient(config=config, on_trace=traces.append)
+        client.ask_actor(EchoActor.URN, EchoRequest(value=3), EchoResponse)
+        check_trace(traces[-1], local_stages)
+        client.close()
+
+        async def ask_async():
+            async with conclib.AsyncProxyClient(
+                config=config, force_redis=True, on_trace=traces.append
+            ) as async_client:
+                await async_client.ask_actor(
+                    EchoActor.URN, EchoRequest(value=4), EchoResponse
+                )
+
+        asyncio.run(ask_async())
+        check_trace(traces[-1], tracing.STAGES)
+
+        # Without a hook, nothing is recorded or sent
+        client = conclib.ProxyClient(config=config, force_redis=True)
+        client.ask_actor(EchoActor.URN, EchoRequest(value=5), EchoResponse)
+        assert len(traces) == 5
+        client.close()
+    finally:
+        pykka.ActorRegistry.stop_all()
+        redis_daemon.shutdown()
+    print("[test] Passed")
+
+
+if __name__ == "__main__":
+    main()